@@ -4,9 +4,8 @@ const BACKEND_URL = window.location.origin;
 // const BACKEND_URL = "http://127.0.0.1:8000";
 // Global loader state
 let globalLoaderActive = false;
-let loaderCheckInterval = null;
-let globalLoaderCheckCount = 0;
-const MAX_GLOBAL_LOADER_CHECKS = 100; // Maksimalno 100 provera (10 sekundi sa 100ms intervalom)
+let loaderCheckInterval = null; // fallback polling (samo ako EventSource nije dostupan)
+let loaderEventSource = null;   // SSE: /api/prepare-day/events
 // ====== SMALL UTILS ======
 const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
 const fmt = (v, suffix = "") =>
@@ -167,44 +166,49 @@ function hideLoader() {
   // Re-enable all buttons after loading
   disableAllButtons(false);
   // Stop global loader checking
-  if (loaderCheckInterval) {
-    clearInterval(loaderCheckInterval);
-    loaderCheckInterval = null;
-  }
+  stopGlobalLoaderPolling();
   globalLoaderActive = false;
 }
 // Global loader functions
-async function checkGlobalLoaderStatus() {
-  try {
-    globalLoaderCheckCount++;
-    // Zaustavi provere ako je prekoračio limit
-    if (globalLoaderCheckCount > MAX_GLOBAL_LOADER_CHECKS) {
+// SSE stream statusa prepare job-a; jobId=null → globalni loader (bilo koji job)
+function openPrepareEvents(jobId, onStatus, onError) {
+  const url = jobId
+    ? `/api/prepare-day/events?job_id=${encodeURIComponent(jobId)}`
+    : '/api/prepare-day/events';
+  const es = new EventSource(url);
+  es.addEventListener("status", (ev) => {
+    try { onStatus(JSON.parse(ev.data)); } catch (e) { /* ignoriši neispravan event */ }
+  });
+  es.addEventListener("missing", () => onError && onError());
+  es.onerror = () => onError && onError();
+  return es;
+}
+function applyGlobalLoaderStatus(data) {
+  // Proveri da li je job zastareo (stariji od 5 minuta)
+  if (data.active && data.started_at) {
+    const startTime = new Date(data.started_at);
+    const now = new Date();
+    const diffMinutes = (now - startTime) / (1000 * 60);
+    if (diffMinutes > 5) {
       stopGlobalLoaderPolling();
       hideGlobalLoader();
       return;
     }
+  }
+  if (data.active && !globalLoaderActive) {
+    showGlobalLoader(data.detail || "Preparing analysis...", data.progress || 0);
+  } else if (!data.active && globalLoaderActive) {
+    hideGlobalLoader();
+    stopGlobalLoaderPolling();
+  } else if (data.active && globalLoaderActive) {
+    // Ažuriraj postojeći loader
+    updateGlobalLoader(data.detail || "Preparing analysis...", data.progress || 0);
+  }
+}
+async function checkGlobalLoaderStatus() {
+  try {
     const response = await fetch('/api/global-loader-status');
-    const data = await response.json();
-    // Proveri da li je job zastareo (stariji od 5 minuta)
-    if (data.active && data.started_at) {
-      const startTime = new Date(data.started_at);
-      const now = new Date();
-      const diffMinutes = (now - startTime) / (1000 * 60);
-      if (diffMinutes > 5) {
-        stopGlobalLoaderPolling();
-        hideGlobalLoader();
-        return;
-      }
-    }
-    if (data.active && !globalLoaderActive) {
-      showGlobalLoader(data.detail || "Preparing analysis...", data.progress || 0);
-    } else if (!data.active && globalLoaderActive) {
-      hideGlobalLoader();
-      stopGlobalLoaderPolling();
-    } else if (data.active && globalLoaderActive) {
-      // Ažuriraj postojeći loader
-      updateGlobalLoader(data.detail || "Preparing analysis...", data.progress || 0);
-    }
+    applyGlobalLoaderStatus(await response.json());
   } catch (error) {
     // Ako ima grešku, zaustavi polling
     stopGlobalLoaderPolling();
@@ -244,8 +248,19 @@ async function isPrepareDayRunning() {
     return false;
   }
 }
-// Funkcija za čekanje da se Prepare Day završi
+// Funkcija za čekanje da se Prepare Day završi (SSE; polling samo kao rezerva)
 async function waitForPrepareDayToComplete() {
+  if (!(await isPrepareDayRunning())) {
+    return true;
+  }
+  if (window.EventSource) {
+    const done = await new Promise((resolve) => {
+      const es = openPrepareEvents(null, (data) => {
+        if (!data.active) { es.close(); resolve(true); }
+      }, () => { es.close(); resolve(false); });
+    });
+    if (done) return true;
+  }
   while (true) {
     const isRunning = await isPrepareDayRunning();
     if (!isRunning) {
@@ -254,6 +269,42 @@ async function waitForPrepareDayToComplete() {
     await sleep(2000); // Čekaj 2 sekunde pre sledeće provere
   }
 }
+// Čeka kraj konkretnog prepare job-a i vraća finalni status (done/error/skipped)
+async function waitForPrepareJob(jobId) {
+  let lastProgress = -1;
+  const onProgress = (s) => {
+    if (s.progress !== lastProgress) {
+      lastProgress = s.progress;
+      updateLoader(s.detail || "");
+    }
+  };
+  if (window.EventSource) {
+    const finalStatus = await new Promise((resolve) => {
+      const es = openPrepareEvents(jobId, (s) => {
+        if (s.status === "queued" || s.status === "running") {
+          onProgress(s);
+          return;
+        }
+        es.close();
+        resolve(s);
+      }, () => { es.close(); resolve(null); });
+    });
+    if (finalStatus) return finalStatus;
+  }
+  // rezerva: stari polling /api/prepare-day/status
+  while (true) {
+    await sleep(3000);
+    const sResp = await fetch(`/api/prepare-day/status?job_id=${encodeURIComponent(jobId)}`, {
+      headers: { "Accept": "application/json" }
+    });
+    const sData = await parseJsonSafe(sResp);
+    if (sData.status === "queued" || sData.status === "running") {
+      onProgress(sData);
+      continue;
+    }
+    return sData;
+  }
+}
 function showGlobalLoader(title, progress = 0, detail = "Please wait...") {
   globalLoaderActive = true;
   showLoader(title);
@@ -272,13 +323,16 @@ function hideGlobalLoader() {
   stopGlobalLoaderPolling();
 }
 function startGlobalLoaderPolling() {
-  if (loaderCheckInterval) {
-    clearInterval(loaderCheckInterval);
+  stopGlobalLoaderPolling();
+  if (window.EventSource) {
+    loaderEventSource = openPrepareEvents(null, applyGlobalLoaderStatus, () => {
+      // SSE pukao → pređi na retki polling
+      stopGlobalLoaderPolling();
+      loaderCheckInterval = setInterval(checkGlobalLoaderStatus, 2000);
+    });
+  } else {
+    loaderCheckInterval = setInterval(checkGlobalLoaderStatus, 2000);
   }
-  // Resetuj brojač
-  globalLoaderCheckCount = 0;
-  // Pokreni polling svakih 100ms
-  loaderCheckInterval = setInterval(checkGlobalLoaderStatus, 100);
   // Dodaj timeout kao sigurnosnu mrežu - uvek sakrij loader nakon 30 sekundi
   setTimeout(() => {
     if (globalLoaderActive) {
@@ -288,6 +342,10 @@ function startGlobalLoaderPolling() {
   }, 30000); // 30 sekundi
   }
 function stopGlobalLoaderPolling() {
+  if (loaderEventSource) {
+    loaderEventSource.close();
+    loaderEventSource = null;
+  }
   if (loaderCheckInterval) {
     clearInterval(loaderCheckInterval);
     loaderCheckInterval = null;
@@ -887,41 +945,26 @@ async function prepareDay() {
     updateLoader("queued");
     // 2) Pokreni globalni loader polling
     // startGlobalLoaderPolling(); // DISABLED - was hiding our loader
-    // 3) poll status
-    let lastProgress = -1;
-    while (true) {
-      await sleep(3000);
-      const sResp = await fetch(`/api/prepare-day/status?job_id=${encodeURIComponent(jobId)}`, {
-        headers: { "Accept": "application/json" }
-      });
-      const sData = await parseJsonSafe(sResp);
-      if (sData.status === "queued" || sData.status === "running") {
-        if (sData.progress !== lastProgress) {
-          lastProgress = sData.progress;
-          updateLoader(sData.detail || "");
-        }
-        continue;
-      }
-      if (sData.status === "done") {
-        updateLoader("finished");
-        const r = sData.result || {};
-        const s = [
-          `Dan: ${r.day}`,
-          `Fixtures u DB: ${r.fixtures_in_db}`,
-          `Timova: ${r.teams} | Parova: ${r.pairs}`,
-          `Seeded fixtures: ${r.seeded ? "DA" : "NE"}`,
-          `Nedostajalo prije: history=${r.history_missing_before}, h2h=${r.h2h_missing_before}`,
-          `Stats missing prije: ${r.stats_missing_before}`,
-          r.computed ? `Computed: ${Object.entries(r.computed).map(([k,v]) => `${k}: ${v}`).join(", ")}` : ""
-        ].filter(Boolean).join("\n");
-        showNotification("Prepare Day Complete", s);
-        hideLoader();
-        break;
-      }
-      if (sData.status === "error") {
-        throw new Error(`Prepare-day greška: ${sData.detail || "nepoznato"}`);
-      }
-      await sleep(1500);
+    // 3) status preko SSE (/api/prepare-day/events), polling samo kao rezerva
+    const sData = await waitForPrepareJob(jobId);
+    if (sData.status === "done") {
+      updateLoader("finished");
+      const r = sData.result || {};
+      const s = [
+        `Dan: ${r.day}`,
+        `Fixtures u DB: ${r.fixtures_in_db}`,
+        `Timova: ${r.teams} | Parova: ${r.pairs}`,
+        `Seeded fixtures: ${r.seeded ? "DA" : "NE"}`,
+        `Nedostajalo prije: history=${r.history_missing_before}, h2h=${r.h2h_missing_before}`,
+        `Stats missing prije: ${r.stats_missing_before}`,
+        r.computed ? `Computed: ${Object.entries(r.computed).map(([k,v]) => `${k}: ${v}`).join(", ")}` : ""
+      ].filter(Boolean).join("\n");
+      showNotification("Prepare Day Complete", s);
+      hideLoader();
+    } else if (sData.status === "error") {
+      throw new Error(`Prepare-day greška: ${sData.detail || "nepoznato"}`);
+    } else {
+      hideLoader();
     }
   } catch (err) {
     showError("Prepare Day Error", `Prepare day error: ${err}`);
@@ -12,21 +12,36 @@ import json
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 import unicodedata
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import traceback
 import re
 import math
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import lru_cache
+from collections import OrderedDict
 import threading
+import multiprocessing
+import asyncio
+import anyio
+from starlette.concurrency import run_in_threadpool
 from services.data_repo import DataRepo
 from services.scheduler import start_scheduler
 from typing import Iterable, Set
 from pydantic import BaseModel
 from models.dixon_coles import fit_dc, score_matrix, probs_from_matrix, prob_over_under, prob_asian_handicap, DCParams
-from services.data_repo import gather_dc_training_data, get_fixture_by_id
+from models import batch_scoring
+import numpy as np
+from services.data_repo import gather_dc_training_data, get_fixture_by_id, upsert_dimensions, backfill_dimensions
+from services.data_repo import get_team_history_rolling, teams_with_fresh_history
+from services.retention import run_retention, is_fresh, policy_fresh_hours, policy_for
+from services.schema import register_migration, apply_migrations
+from services.write_behind import (
+    register_write, enqueue_write, flush_writes, write_behind_stats,
+    enqueue_match_facts, enqueue_match_statistics, enqueue_h2h_cache, await_match_statistics,
+)
 import os
 import hashlib
+import gzip
 from fastapi import BackgroundTasks
 import secrets
 from datetime import datetime, timedelta
@@ -41,18 +56,17 @@ def _select_existing_fixture_ids(fixture_ids: Iterable[int]) -> Set[int]:
         return set()
 
     existing: Set[int] = set()
-    with DB_WRITE_LOCK:  # držimo isti lock stil kao ostatak koda
-        conn = get_db_connection()
-        cur = conn.cursor()
-        chunk = 900  # rezerva za SQLite var limit
-        for i in range(0, len(ids), chunk):
-            part = ids[i:i+chunk]
-            placeholders = ",".join(["%s"] * len(part))
-            cur.execute(f"SELECT fixture_id FROM match_statistics WHERE fixture_id IN ({placeholders})", part)
-            rows = cur.fetchall()
-            for (fid,) in rows:
-                existing.add(int(fid))
-        conn.close()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    chunk = 900  # rezerva za SQLite var limit
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i+chunk]
+        placeholders = ",".join(["%s"] * len(part))
+        cur.execute(f"SELECT fixture_id FROM match_statistics WHERE fixture_id IN ({placeholders})", part)
+        rows = cur.fetchall()
+        for (fid,) in rows:
+            existing.add(int(fid))
+    conn.close()
     return existing
 
 
@@ -60,7 +74,7 @@ def prewarm_statistics_cache(team_last_matches: dict[int, list], max_workers: in
     """
     Za sve istorijske mečeve koji se pominju u team_last_matches:
       - pronađi koje statistike fale u match_statistics
-      - povuci ih paralelno preko get_or_fetch_fixture_statistics (koji upisuje pod DB lock-om)
+      - povuci ih paralelno preko get_or_fetch_fixture_statistics (upis ide kroz write-behind red)
     Vraća mali rezime.
     """
     # 1) skupi sve fixture id-jeve
@@ -98,6 +112,8 @@ def prewarm_statistics_cache(team_last_matches: dict[int, list], max_workers: in
         for _ in as_completed(futures):
             pass
 
+    # barijera: sve povučene statistike su u match_statistics pre nego što ih analiza čita
+    flush_writes("stats")
     return {"queued": len(missing), "fetched": fetched, "errors": errors}
 
 def ensure_model_params_dc_table():
@@ -114,7 +130,7 @@ def ensure_model_params_dc_table():
     conn.commit()
     conn.close()
 
-ensure_model_params_dc_table()
+register_migration(5, "model_params_dc", ensure_model_params_dc_table)
 
 def _serialize_dc_params(p: DCParams) -> dict:
     return {
@@ -193,12 +209,15 @@ async def admin_set_league_whitelist(payload: LeagueWhitelistPayload):
     LEAGUE_NAME_WHITELIST = {
         _comp_key(item.country, item.league) for item in (payload.names or [])
     }
+    resolved = _resolve_league_whitelist_ids()
 
     return {
         "ok": True,
         "strict": STRICT_LEAGUE_FILTER,
         "name_whitelist_count": len(LEAGUE_NAME_WHITELIST),
         "id_whitelist_count": len(LEAGUE_ID_WHITELIST),
+        "resolved_league_ids": resolved["ids"],
+        "unresolved_names": resolved["unresolved_names"],
     }
 
 @app.post("/admin/load-league-whitelist-from-file")
@@ -229,6 +248,7 @@ def admin_load_league_whitelist_from_file(path: str = Body(..., embed=True)):
 
     LEAGUE_NAME_WHITELIST |= names_set
     LEAGUE_ID_WHITELIST   |= ids_set
+    resolved = _resolve_league_whitelist_ids()
 
     return {
         "ok": True,
@@ -236,19 +256,26 @@ def admin_load_league_whitelist_from_file(path: str = Body(..., embed=True)):
         "added_ids": len(ids_set),
         "tot_name_pairs": len(LEAGUE_NAME_WHITELIST),
         "tot_ids": len(LEAGUE_ID_WHITELIST),
+        "resolved_league_ids": resolved["ids"],
+        "unresolved_names": resolved["unresolved_names"],
     }
 
-@app.on_event("startup")
-def _init_on_startup():
-    # -- tabele
-    create_all_tables()
-    ensure_model_outputs_table()
-    ensure_analysis_cache_table()
-    ensure_prepare_jobs_table()
+def init_process():
+    """
+    Inicijalizacija koja treba SVAKOM procesu koji radi prepare/analizu: uvicorn worker (startup hook),
+    prepare_worker.py i njegovi spawn child-ovi (oni ne prolaze kroz FastAPI startup).
+    Bez whitelist-e STRICT_LEAGUE_FILTER odbacuje sve fixtures.
+    """
+    # -- šema: registrovane migracije (jednom, pod GET_LOCK-om; ostali workeri samo pročitaju verziju)
+    apply_migrations()
 
     # -- whitelist sa diska (strogo)
     _load_strict_whitelist_from_file(WHITELIST_FILE)
 
+@app.on_event("startup")
+def _init_on_startup():
+    init_process()
+
     # -- odmah očisti stare analize (72h)
     try:
         purge_old_analyses()
@@ -281,75 +308,149 @@ def _init_on_startup():
         else:
             print("[startup] scheduler already running in another worker")
 
-    # -- TTL sweeper: pokreni jednom (sa DB lock-om), radi na 60min
+    # -- TTL sweeper: pokreni jednom (sa DB lock-om); stale prepare jobovi na 1min, purge analiza na 60min
     if acquire_db_lock("ttl_sweeper_runner", 0):
         start_ttl_sweeper_thread()
     else:
         print("[startup] ttl sweeper already running in another worker")
 
+    # -- global loader snapshot: u svakom workeru, da /api/global-loader-status ne ide u DB
+    start_prepare_status_refresher()
+
+    # -- team leaderboard: ako team_leaderboard još nije izgrađen, izgradi ga u pozadini (ne na request-u)
+    threading.Thread(target=bootstrap_team_leaderboards, name="leaderboard-bootstrap", daemon=True).start()
+
+# ---------- blokirajući rad iz handlera (MySQL, PBKDF2, DC fit, JSON) → ograničen threadpool ----------
+# Sync (def) handleri i run_blocking() dele isti anyio limiter; veličina ispod STATSFK_POOL_SIZE,
+# tako da serving nikad ne iscrpi MySQL pool koji koriste i pozadinski poslovi.
+SERVING_THREADPOOL_SIZE = int(os.getenv("SERVING_THREADPOOL_SIZE", "24"))
+
+@app.on_event("startup")
+async def _size_serving_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = SERVING_THREADPOOL_SIZE
+
+async def run_blocking(fn, *args, **kwargs):
+    """Pozovi blokirajuću funkciju iz async handlera bez blokiranja event loop-a."""
+    return await run_in_threadpool(fn, *args, **kwargs)
+
 ACTIVE_MARKETS = {"1h_over05", "gg1h", "1h_over15", "ft_over15"}  # + FT market
 
 def ensure_model_outputs_table():
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS model_outputs (
-                fixture_id BIGINT NOT NULL,
-                market     VARCHAR(64) NOT NULL,
-                prob       DOUBLE NOT NULL,
-                debug_json JSON NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                PRIMARY KEY (fixture_id, market)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-        """)
-        conn.commit()
-        conn.close()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS model_outputs (
+            fixture_id BIGINT NOT NULL,
+            market     VARCHAR(64) NOT NULL,
+            prob       DOUBLE NOT NULL,
+            debug_json JSON NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (fixture_id, market)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    conn.commit()
+    conn.close()
 
 # ADD: tabela za cache kompletnih analiza
 def ensure_analysis_cache_table():
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS analysis_cache (
-                cache_key VARCHAR(128) PRIMARY KEY,
-                params_json JSON NOT NULL,
-                results_json JSON NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NULL
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-        """)
-        conn.commit()
-        conn.close()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            cache_key VARCHAR(128) PRIMARY KEY,
+            params_json JSON NOT NULL,
+            results_json JSON NULL,
+            results_gz LONGBLOB NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    # stare instalacije: dodaj results_gz (gzip-ovan, već serijalizovan payload) ako fali
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'analysis_cache' AND COLUMN_NAME = 'results_gz'
+    """)
+    if (cur.fetchone() or [0])[0] == 0:
+        cur.execute("ALTER TABLE analysis_cache ADD COLUMN results_gz LONGBLOB NULL AFTER results_json")
+        cur.execute("ALTER TABLE analysis_cache MODIFY results_json JSON NULL")
+    conn.commit()
+    conn.close()
 
 # ADD: jobs tabela za prepare
 def ensure_prepare_jobs_table():
-    with DB_WRITE_LOCK:
-        conn = get_mysql_connection()
-        cur = conn.cursor()
+    conn = get_mysql_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS prepare_jobs (
+            job_id CHAR(36) PRIMARY KEY,
+            day DATE NOT NULL,
+            status ENUM('queued','running','done','error','skipped') NOT NULL DEFAULT 'queued',
+            progress TINYINT UNSIGNED NOT NULL DEFAULT 0,
+            detail VARCHAR(255) NULL,
+            result_json JSON NULL,
+            prewarm TINYINT(1) NOT NULL DEFAULT 1,
+            attempts INT NOT NULL DEFAULT 0,
+            claimed_by VARCHAR(64) NULL,
+            heartbeat_at TIMESTAMP NULL,
+            next_attempt_at TIMESTAMP NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_prepare_jobs_status (status, created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    # stare instalacije: kolone za durable queue (prepare_worker.py)
+    for col, ddl in (
+        ("prewarm",         "ADD COLUMN prewarm TINYINT(1) NOT NULL DEFAULT 1"),
+        ("attempts",        "ADD COLUMN attempts INT NOT NULL DEFAULT 0"),
+        ("claimed_by",      "ADD COLUMN claimed_by VARCHAR(64) NULL"),
+        ("heartbeat_at",    "ADD COLUMN heartbeat_at TIMESTAMP NULL"),
+        ("next_attempt_at", "ADD COLUMN next_attempt_at TIMESTAMP NULL"),
+    ):
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS prepare_jobs (
-                job_id CHAR(36) PRIMARY KEY,
-                day DATE NOT NULL,
-                status ENUM('queued','running','done','error','skipped') NOT NULL DEFAULT 'queued',
-                progress TINYINT UNSIGNED NOT NULL DEFAULT 0,
-                detail VARCHAR(255) NULL,
-                result_json JSON NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-        """)
-        conn.commit()
-        conn.close()
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'prepare_jobs' AND COLUMN_NAME = %s
+        """, (col,))
+        if (cur.fetchone() or [0])[0] == 0:
+            cur.execute(f"ALTER TABLE prepare_jobs {ddl}")
+    conn.commit()
+    conn.close()
+
+# generacija pripremljenih podataka: jedan red, prepare job ga povećava na kraju (i iz prepare_worker procesa),
+# web workeri ga prate u refresher-u i tada prazne lokalne keševe
+def ensure_prepare_generation_table():
+    conn = get_mysql_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS prepare_generation (
+            id TINYINT UNSIGNED PRIMARY KEY,
+            generation BIGINT UNSIGNED NOT NULL DEFAULT 0,
+            job_id CHAR(36) NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    conn.commit()
+    conn.close()
 
-def create_prepare_job(day_date):
+# registar migracija (services/schema.py) – primenjuje se jednom na startup-u / u prepare_worker-u
+register_migration(2, "model_outputs", ensure_model_outputs_table)
+register_migration(3, "analysis_cache", ensure_analysis_cache_table)
+register_migration(4, "prepare_jobs", ensure_prepare_jobs_table)
+register_migration(7, "prepare_generation", ensure_prepare_generation_table)
+
+def create_prepare_job(day_date, prewarm: bool = True, claimed_by: str | None = None):
+    """claimed_by=None → job čeka prepare_worker; inline dispatch ga odmah "rezerviše" da ga worker ne uzme."""
     job_id = str(uuid.uuid4())
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("INSERT INTO prepare_jobs (job_id, day, status, progress) VALUES (%s, %s, 'queued', 0)", (job_id, day_date))
+    cur.execute("""
+        INSERT INTO prepare_jobs (job_id, day, status, progress, prewarm, claimed_by)
+        VALUES (%s, %s, 'queued', 0, %s, %s)
+    """, (job_id, day_date, 1 if prewarm else 0, claimed_by))
     conn.commit()
     conn.close()
+    publish_prepare_event(job_id, status="queued", progress=0, detail="queued",
+                          day=day_date.isoformat() if hasattr(day_date, "isoformat") else str(day_date),
+                          started_at=datetime.now(timezone.utc).isoformat())
     return job_id
 
 def update_prepare_job(job_id, *, status=None, progress=None, detail=None, result=None):
@@ -372,6 +473,7 @@ def update_prepare_job(job_id, *, status=None, progress=None, detail=None, resul
     cur.execute(q, tuple(vals))
     conn.commit()
     conn.close()
+    publish_prepare_event(job_id, status=status, progress=progress, detail=detail, result=result)
 
 def read_prepare_job(job_id):
     conn = get_mysql_connection()
@@ -395,6 +497,327 @@ def read_prepare_job(job_id):
         job["result"] = None
     return job
 
+# ---------- durable queue za prepare_worker.py (SELECT ... FOR UPDATE SKIP LOCKED) ----------
+# "worker" (default): API samo upisuje job, izvršava ga prepare_worker.py (docker-compose.yml: servis "worker")
+# "inline": eksplicitni opt-in – BackgroundTasks u web procesu (jedan proces, bez worker-a)
+PREPARE_DISPATCH = os.getenv("PREPARE_DISPATCH", "worker").strip().lower()
+PREPARE_MAX_ATTEMPTS = int(os.getenv("PREPARE_MAX_ATTEMPTS", "3"))
+PREPARE_HEARTBEAT_SEC = int(os.getenv("PREPARE_HEARTBEAT_SEC", "15"))
+PREPARE_HEARTBEAT_TIMEOUT_SEC = int(os.getenv("PREPARE_HEARTBEAT_TIMEOUT_SEC", "120"))
+PREPARE_RETRY_BACKOFF_SEC = 30      # × broj pokušaja
+PREPARE_QUEUED_MAX_MINUTES = 30     # queued job koji niko nije uzeo → error (sweeper)
+
+def claim_prepare_job(worker_id: str):
+    """
+    Atomski uzmi sledeći job: queued (bez vlasnika, backoff istekao) ili running čiji je worker umro
+    (heartbeat stariji od PREPARE_HEARTBEAT_TIMEOUT_SEC). SKIP LOCKED → više workera ne čeka jedan drugog.
+    """
+    conn = get_mysql_connection()
+    try:
+        conn.start_transaction()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT job_id, day, prewarm, attempts
+            FROM prepare_jobs
+            WHERE ((status = 'queued' AND claimed_by IS NULL
+                    AND (next_attempt_at IS NULL OR next_attempt_at <= NOW()))
+               OR (status = 'running' AND heartbeat_at IS NOT NULL
+                    AND heartbeat_at < DATE_SUB(NOW(), INTERVAL %s SECOND)))
+              AND attempts < %s
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, (PREPARE_HEARTBEAT_TIMEOUT_SEC, PREPARE_MAX_ATTEMPTS))
+        job = cur.fetchone()
+        if not job:
+            conn.rollback()
+            return None
+        cur.execute("""
+            UPDATE prepare_jobs
+            SET status = 'running', attempts = attempts + 1, claimed_by = %s,
+                heartbeat_at = NOW(), next_attempt_at = NULL, detail = 'claimed'
+            WHERE job_id = %s
+        """, (worker_id, job["job_id"]))
+        conn.commit()
+        job["attempts"] = int(job["attempts"] or 0) + 1
+        job["day"] = job["day"].isoformat() if hasattr(job["day"], "isoformat") else str(job["day"])
+        job["prewarm"] = bool(job["prewarm"])
+        return job
+    except Exception:
+        try: conn.rollback()
+        except Exception: pass
+        raise
+    finally:
+        conn.close()
+
+def heartbeat_prepare_jobs(worker_id: str, job_ids) -> None:
+    ids = list(job_ids or [])
+    if not ids:
+        return
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        marks = ",".join(["%s"] * len(ids))
+        cur.execute(f"""
+            UPDATE prepare_jobs SET heartbeat_at = NOW()
+            WHERE claimed_by = %s AND status = 'running' AND job_id IN ({marks})
+        """, (worker_id, *ids))
+        conn.commit()
+    finally:
+        conn.close()
+
+def finalize_prepare_attempt(job_id: str, attempts: int, exitcode, reason: str | None = None,
+                             refund_attempt: bool = False) -> str:
+    """
+    Posle izlaska child procesa: error (ili crash koji je ostavio 'running') → ponovo u red sa backoff-om
+    dok ima pokušaja; inače konačni error. refund_attempt=True (gašenje workera) ne troši pokušaj.
+    Vraća konačni status.
+    """
+    if refund_attempt:
+        attempts -= 1
+    job = read_prepare_job(job_id) or {}
+    status = job.get("status")
+    if status in ("done", "skipped"):
+        return status
+    detail = reason or job.get("detail") or f"worker exit code {exitcode}"
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        if attempts < PREPARE_MAX_ATTEMPTS:
+            cur.execute("""
+                UPDATE prepare_jobs
+                SET status = 'queued', claimed_by = NULL, heartbeat_at = NULL, attempts = %s,
+                    next_attempt_at = DATE_ADD(NOW(), INTERVAL %s SECOND), detail = %s
+                WHERE job_id = %s
+            """, (attempts, PREPARE_RETRY_BACKOFF_SEC * attempts,
+                  f"retry {attempts}/{PREPARE_MAX_ATTEMPTS}: {detail}"[:255], job_id))
+            final = "queued"
+        else:
+            cur.execute("""
+                UPDATE prepare_jobs SET status = 'error', heartbeat_at = NULL, detail = %s WHERE job_id = %s
+            """, (f"failed after {attempts} attempts: {detail}"[:255], job_id))
+            final = "error"
+        conn.commit()
+    finally:
+        conn.close()
+    publish_prepare_event(job_id, status=final)
+    return final
+
+# ---------- prepare job eventi: jedan in-process publisher → SSE pretplatnici ----------
+# update_prepare_job/create_prepare_job objavljuju stanje; svaki SSE klijent ima svoj asyncio.Queue.
+# Job koji radi u drugom uvicorn workeru se vidi kroz povremeni DB re-read u samom stream-u.
+PREPARE_EVENTS_HEARTBEAT_SEC = 15
+PREPARE_EVENTS_DB_RECHECK_SEC = 5
+PREPARE_TERMINAL_STATUSES = ("done", "error", "skipped")
+
+_PREPARE_JOB_STATE: dict = {}        # job_id -> poslednje poznato stanje (merge parcijalnih update-a)
+_PREPARE_SUBSCRIBERS: set = set()    # {(loop, queue)}
+_PREPARE_EVENTS_LOCK = threading.Lock()
+
+# najnoviji aktivni job (queued/running) u ovom procesu; osvežava ga update_prepare_job i refresher iz MySQL-a
+PREPARE_STATUS_REFRESH_SEC = float(os.getenv("PREPARE_STATUS_REFRESH_SEC", "2"))
+PREPARE_STALE_JOB_MINUTES = 10
+_ACTIVE_PREPARE_SNAPSHOT: dict = {"job": None, "refreshed_at": 0.0}
+
+def publish_prepare_event(job_id, **fields):
+    """Spoji parcijalni update u stanje joba i razašalji ga svim pretplatnicima (thread-safe)."""
+    with _PREPARE_EVENTS_LOCK:
+        state = _PREPARE_JOB_STATE.setdefault(job_id, {"job_id": job_id, "status": None, "progress": 0, "detail": None})
+        for k, v in fields.items():
+            if v is not None:
+                state[k] = int(v) if k == "progress" else v
+        state["ts"] = time.time()
+        event = dict(state)
+        subscribers = list(_PREPARE_SUBSCRIBERS)
+        # globalni loader snapshot (čita ga /api/global-loader-status bez DB-a)
+        if event.get("status") in ("queued", "running"):
+            _ACTIVE_PREPARE_SNAPSHOT["job"] = event
+        elif (_ACTIVE_PREPARE_SNAPSHOT.get("job") or {}).get("job_id") == job_id:
+            _ACTIVE_PREPARE_SNAPSHOT["job"] = None
+        # završeni jobovi ne treba da žive zauvek u memoriji
+        if len(_PREPARE_JOB_STATE) > 200:
+            for jid in [j for j, st in _PREPARE_JOB_STATE.items() if st.get("status") in PREPARE_TERMINAL_STATUSES][:100]:
+                _PREPARE_JOB_STATE.pop(jid, None)
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:
+            pass  # loop zatvoren – pretplatnik će se sam odjaviti
+
+def subscribe_prepare_events():
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    with _PREPARE_EVENTS_LOCK:
+        _PREPARE_SUBSCRIBERS.add((loop, queue))
+    return loop, queue
+
+def unsubscribe_prepare_events(sub):
+    with _PREPARE_EVENTS_LOCK:
+        _PREPARE_SUBSCRIBERS.discard(sub)
+
+def read_active_prepare_job():
+    """Najnoviji queued/running job (ne stariji od 1h) ili None – samo SELECT."""
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT job_id, status, progress, detail, created_at
+        FROM prepare_jobs
+        WHERE status IN ('running', 'queued')
+        AND created_at > DATE_SUB(NOW(), INTERVAL 1 HOUR)
+        ORDER BY created_at DESC
+        LIMIT 1
+    """)
+    job = cur.fetchone()
+    conn.close()
+    if job and job.get("created_at") is not None:
+        job["started_at"] = job.pop("created_at").isoformat()
+    return job
+
+def get_active_prepare_snapshot():
+    """Čisto čitanje iz memorije – bez DB-a."""
+    with _PREPARE_EVENTS_LOCK:
+        job = _ACTIVE_PREPARE_SNAPSHOT.get("job")
+        return dict(job) if job else None
+
+def refresh_active_prepare_snapshot():
+    """Jedan SELECT: pokupi i jobove koje vodi drugi worker/proces (promena → SSE pretplatnicima ovog workera)."""
+    job = read_active_prepare_job()
+    changed = False
+    with _PREPARE_EVENTS_LOCK:
+        if job:
+            # zadrži bogatije lokalno stanje (started_at, ts) ako je isti job
+            local = _PREPARE_JOB_STATE.get(job["job_id"]) or {}
+            changed = any(local.get(k) != job.get(k) for k in ("status", "progress", "detail"))
+            _ACTIVE_PREPARE_SNAPSHOT["job"] = {**local, **job}
+        else:
+            _ACTIVE_PREPARE_SNAPSHOT["job"] = None
+        _ACTIVE_PREPARE_SNAPSHOT["refreshed_at"] = time.time()
+    if changed:
+        publish_prepare_event(job["job_id"], status=job.get("status"), progress=job.get("progress"),
+                              detail=job.get("detail"))
+
+_PREPARE_GENERATION_SEEN = None   # poslednja generacija koju je ovaj worker obradio (None = još nije pročitana)
+
+def bump_prepare_generation(job_id):
+    """Kraj prepare job-a (bilo koji proces): signal svim web workerima da su podaci novi."""
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO prepare_generation (id, generation, job_id) VALUES (1, 1, %s)
+            ON DUPLICATE KEY UPDATE generation = generation + 1, job_id = VALUES(job_id)
+        """, (job_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def read_prepare_generation():
+    """(generation, job_id) ili (0, None) ako prepare još nije završen nijednom."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT generation, job_id FROM prepare_generation WHERE id = 1")
+        row = cur.fetchone()
+        return (int(row[0] or 0), row[1]) if row else (0, None)
+    finally:
+        conn.close()
+
+def check_prepare_generation():
+    """
+    Nova generacija (prepare završen u drugom workeru/procesu) → isprazni analyze response keš,
+    ponovo učitaj leaderboard i javi završetak job-a lokalnim SSE pretplatnicima.
+    """
+    global _PREPARE_GENERATION_SEEN
+    generation, job_id = read_prepare_generation()
+    prev, _PREPARE_GENERATION_SEEN = _PREPARE_GENERATION_SEEN, generation
+    if prev is None or generation == prev:
+        return False
+    invalidate_analyze_response_cache()
+    try:
+        reload_team_leaderboards()
+    except Exception as e:
+        print(f"[prepare-generation] leaderboard reload failed: {e}")
+    if job_id:
+        job = read_prepare_job(job_id)
+        if job:
+            publish_prepare_event(job_id, status=job.get("status"), progress=job.get("progress"),
+                                  detail=job.get("detail"), result=job.get("result"))
+    print(f"[prepare-generation] {prev} → {generation} (job {job_id})")
+    return True
+
+def start_prepare_status_refresher():
+    """Pokreće se u SVAKOM workeru (za razliku od sweeper-a) – drži snapshot i generaciju svežim."""
+    def _loop():
+        while True:
+            try:
+                refresh_active_prepare_snapshot()
+            except Exception as e:
+                try: print("prepare status refresh error:", e)
+                except: pass
+            try:
+                check_prepare_generation()
+            except Exception as e:
+                try: print("prepare generation check error:", e)
+                except: pass
+            time.sleep(PREPARE_STATUS_REFRESH_SEC)
+    t = threading.Thread(target=_loop, daemon=True)
+    t.start()
+
+def expire_stale_prepare_jobs() -> int:
+    """
+    Sweeper (svaki minut):
+      - inline job (bez heartbeat-a) zaglavljen duže od PREPARE_STALE_JOB_MINUTES → error
+      - worker job čiji je heartbeat mrtav a pokušaji potrošeni → error (ostale reclaim-uje worker)
+      - queued job koji nijedan worker nije uzeo PREPARE_QUEUED_MAX_MINUTES → error
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE prepare_jobs
+        SET status = 'error', detail = 'Job timeout - automatically cancelled'
+        WHERE status IN ('running', 'queued')
+        AND heartbeat_at IS NULL AND (claimed_by IS NOT NULL OR status = 'running')
+        AND created_at < DATE_SUB(NOW(), INTERVAL %s MINUTE)
+    """, (PREPARE_STALE_JOB_MINUTES,))
+    n = cur.rowcount
+    cur.execute("""
+        UPDATE prepare_jobs
+        SET status = 'error', detail = 'Worker lost - no attempts left'
+        WHERE status = 'running' AND heartbeat_at IS NOT NULL
+        AND heartbeat_at < DATE_SUB(NOW(), INTERVAL %s SECOND)
+        AND attempts >= %s
+    """, (PREPARE_HEARTBEAT_TIMEOUT_SEC, PREPARE_MAX_ATTEMPTS))
+    n += cur.rowcount
+    cur.execute("""
+        UPDATE prepare_jobs
+        SET status = 'error', detail = 'No prepare worker picked up the job'
+        WHERE status = 'queued' AND claimed_by IS NULL
+        AND COALESCE(next_attempt_at, created_at) < DATE_SUB(NOW(), INTERVAL %s MINUTE)
+    """, (PREPARE_QUEUED_MAX_MINUTES,))
+    n += cur.rowcount
+    conn.commit()
+    conn.close()
+    if n > 0:
+        print(f"🧹 [TTL SWEEPER] Cleaned up {n} stale prepare jobs")
+    return n
+
+def _prepare_event_payload(job) -> dict:
+    """Oblik koji frontend već razume (global-loader-status + prepare-day/status)."""
+    job = job or {}
+    status = job.get("status")
+    return {
+        "job_id": job.get("job_id"),
+        "active": status in ("queued", "running"),
+        "status": status,
+        "progress": int(job.get("progress") or 0),
+        "detail": job.get("detail"),
+        "started_at": job.get("started_at"),
+        "result": job.get("result") if status in PREPARE_TERMINAL_STATUSES else None,
+    }
+
+def _sse_format(event: dict, name: str = "status") -> str:
+    return f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
 # Opcioni distribuirani lok preko MySQL-a: da ne trče 2 prepare-a za isti dan u različitim procesima
 def acquire_db_lock(lock_name: str, timeout_sec: int = 1) -> bool:
     conn = get_db_connection()
@@ -415,11 +838,16 @@ def _build_cache_key(params: dict) -> str:
     base = json.dumps({"v": ANALYSIS_VERSION, **(params or {})}, sort_keys=True, ensure_ascii=False)
     return hashlib.sha256(base.encode("utf-8")).hexdigest()
 
-def read_analysis_cache(cache_key: str):
+def _encode_analysis_payload(content) -> bytes:
+    """Serijalizuj tačno kao JSONResponse i gzip-uj (mtime=0 → isti ulaz daje iste bajtove)."""
+    return gzip.compress(JSONResponse(content=content).body, compresslevel=ANALYSIS_GZIP_LEVEL, mtime=0)
+
+def read_analysis_cache_raw(cache_key: str) -> bytes | None:
+    """Vrati gzip-ovan JSON payload bez parsiranja (stari redovi sa results_json se gzip-uju u letu)."""
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("""
-        SELECT results_json, expires_at
+        SELECT results_gz, results_json, expires_at
         FROM analysis_cache
         WHERE cache_key = %s
           AND (expires_at IS NULL OR expires_at > NOW())
@@ -429,9 +857,22 @@ def read_analysis_cache(cache_key: str):
     conn.close()
     if not row:
         return None
-    # row[0] je JSON (MySQL JSON -> driver vraća str/dict zavisno od konektora)
+    if row[0] is not None:
+        return bytes(row[0])
+    if row[1] is None:
+        return None
+    # row[1] je JSON (MySQL JSON -> driver vraća str/dict zavisno od konektora)
+    try:
+        return _encode_analysis_payload(row[1] if isinstance(row[1], list) else json.loads(row[1]))
+    except Exception:
+        return None
+
+def read_analysis_cache(cache_key: str):
+    raw = read_analysis_cache_raw(cache_key)
+    if raw is None:
+        return None
     try:
-        return row[0] if isinstance(row[0], list) else json.loads(row[0])
+        return json.loads(gzip.decompress(raw))
     except Exception:
         return None
 
@@ -440,35 +881,114 @@ def write_analysis_cache(cache_key: str, params: dict, results: list, ttl_hours:
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("""
-        INSERT INTO analysis_cache (cache_key, params_json, results_json, created_at, expires_at)
-        VALUES (%s, %s, %s, NOW(), DATE_ADD(NOW(), INTERVAL %s HOUR))
+        INSERT INTO analysis_cache (cache_key, params_json, results_json, results_gz, created_at, expires_at)
+        VALUES (%s, %s, NULL, %s, NOW(), DATE_ADD(NOW(), INTERVAL %s HOUR))
         ON DUPLICATE KEY UPDATE
             params_json=VALUES(params_json),
-            results_json=VALUES(results_json),
+            results_json=NULL,
+            results_gz=VALUES(results_gz),
             expires_at=VALUES(expires_at)
     """, (
         cache_key,
         json.dumps(params, ensure_ascii=False),
-        json.dumps(results, ensure_ascii=False),
+        _encode_analysis_payload(results),
         ttl
     ))
     conn.commit()
     conn.close()
+    invalidate_analyze_response_cache(cache_key)
+
+# ---------- in-process keš već enkodovanih /api/analyze odgovora (ETag / 304) ----------
+# Vrući čitaoci (isti dan + market) dobijaju gotove bajtove iz memorije, bez MySQL-a i bez re-serijalizacije.
+# Invalidira ga write_analysis_cache (po ključu) i run_prepare_job (ceo keš); TTL pokriva ostale workere.
+ANALYZE_RESPONSE_CACHE_MAX = int(os.getenv("ANALYZE_RESPONSE_CACHE_MAX", "64"))
+ANALYZE_RESPONSE_CACHE_TTL = int(os.getenv("ANALYZE_RESPONSE_CACHE_TTL", "120"))  # sekundi
+
+_ANALYZE_RESPONSE_CACHE: "OrderedDict[str, tuple]" = OrderedDict()  # cache_key -> (expires_ts, etag, body)
+_ANALYZE_RESPONSE_CACHE_LOCK = threading.Lock()
+
+def get_cached_analyze_response(cache_key: str):
+    """Vrati (etag, body) ili None (nema / isteklo)."""
+    now = time.time()
+    with _ANALYZE_RESPONSE_CACHE_LOCK:
+        hit = _ANALYZE_RESPONSE_CACHE.get(cache_key)
+        if not hit:
+            return None
+        if hit[0] < now:
+            _ANALYZE_RESPONSE_CACHE.pop(cache_key, None)
+            return None
+        _ANALYZE_RESPONSE_CACHE.move_to_end(cache_key)
+        return hit[1], hit[2]
+
+def put_cached_analyze_response(cache_key: str, content=None, gz: bytes | None = None) -> tuple:
+    """Upiše gzip-ovan payload u LRU (iz DB-a stiže već gzip-ovan; inače se enkoduje); vrati (etag, gz)."""
+    if gz is None:
+        gz = _encode_analysis_payload(content)
+    # weak ETag: isti sadržaj, a reprezentacija može biti gzip ili identity
+    etag = 'W/"' + hashlib.sha1(gz).hexdigest() + '"'
+    with _ANALYZE_RESPONSE_CACHE_LOCK:
+        _ANALYZE_RESPONSE_CACHE[cache_key] = (time.time() + ANALYZE_RESPONSE_CACHE_TTL, etag, gz)
+        _ANALYZE_RESPONSE_CACHE.move_to_end(cache_key)
+        while len(_ANALYZE_RESPONSE_CACHE) > ANALYZE_RESPONSE_CACHE_MAX:
+            _ANALYZE_RESPONSE_CACHE.popitem(last=False)
+    return etag, gz
+
+def invalidate_analyze_response_cache(cache_key: str | None = None):
+    with _ANALYZE_RESPONSE_CACHE_LOCK:
+        if cache_key is None:
+            _ANALYZE_RESPONSE_CACHE.clear()
+        else:
+            _ANALYZE_RESPONSE_CACHE.pop(cache_key, None)
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match koristi weak poređenje: W/"x" == "x"
+    bare = etag[2:] if etag.startswith("W/") else etag
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any((t[2:] if t.startswith("W/") else t) == bare for t in tags)
+
+def _accepts_gzip(request: Request) -> bool:
+    # eksplicitni "gzip" ima prednost nad "*"; q=0 znači "ne prihvatam"
+    qs = {}
+    for part in (request.headers.get("accept-encoding") or "").lower().split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if name in ("gzip", "*"):
+            qs.setdefault(name, q)
+    q = qs.get("gzip", qs.get("*", 0.0))
+    return q > 0.0
+
+def _analyze_bytes_response(request: Request, etag: str, gz: bytes):
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if _accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gz, status_code=200, media_type="application/json", headers=headers)
+    # klijent bez gzip-a: raspakuj samo za njega
+    return Response(content=gzip.decompress(gz), status_code=200, media_type="application/json", headers=headers)
+
+# write-behind upisi (services/write_behind.py): grupa po tabelama, batch + spajanje istog ključa
+register_write("model_outputs", "analysis", """
+    INSERT INTO model_outputs (fixture_id, market, prob, debug_json, updated_at)
+    VALUES (%s, %s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE
+        prob=VALUES(prob),
+        debug_json=VALUES(debug_json),
+        updated_at=NOW()
+""")
 
 def upsert_model_output(fixture_id: int, market: str, prob: float, debug: dict):
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO model_outputs (fixture_id, market, prob, debug_json, updated_at)
-            VALUES (%s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE
-                prob=VALUES(prob),
-                debug_json=VALUES(debug_json),
-                updated_at=NOW()
-        """, (int(fixture_id), str(market), float(prob), json.dumps(debug, ensure_ascii=False)))
-        conn.commit()
-        conn.close()
+    """Ide u write-behind red; pozivalac koji odmah čita model_outputs radi flush_writes("analysis")."""
+    enqueue_write("model_outputs", (int(fixture_id), str(market)),
+                  (int(fixture_id), str(market), float(prob), json.dumps(debug, ensure_ascii=False)))
 
 # Koliko istorije i H2H nam treba da bi analize radile bez API-ja
 DAY_PREFETCH_LAST_N = 15
@@ -481,16 +1001,20 @@ ANALYSIS_VERSION = "v2025-08-29-01"
 
 # koliko traje cache rezultata (u satima)
 CACHE_TTL_HOURS_TODAY = 6
+ANALYSIS_GZIP_LEVEL = int(os.getenv("ANALYSIS_GZIP_LEVEL", "6"))
 CACHE_TTL_HOURS_PAST  = 48
 
 
-CACHE_TTL_HOURS = 48
+# history/h2h TTL iz registra politika (services/retention.py)
+CACHE_TTL_HOURS = policy_fresh_hours("team_history_store")
 # === HARD MOD ===
 # Analiza na /api/analyze NIKADA ne računa niti zove API; samo čita prekomputovane rezultate
 ANALYZE_PRECOMPUTED_ONLY = True
 
 # TTL brisanje analiza (strogo) – u satima
 ANALYSIS_TTL_HOURS = 72
+# hourly sweeper: 1 → sve keš tabele iz retention registra (ne samo model_outputs/analysis_cache)
+RETENTION_SWEEP_ALL = os.getenv("RETENTION_SWEEP_ALL", "0") == "1"
 
 
 
@@ -640,19 +1164,20 @@ from fastapi import Response
 from dataclasses import dataclass
 
 def _read_model_output_row(fixture_id: int, market: str) -> dict | None:
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT prob, debug_json, updated_at
-            FROM model_outputs
-            WHERE fixture_id=%s AND market=%s
-        """, (int(fixture_id), str(market)))
-        row = cur.fetchone()
-        conn.close()
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("""
+        SELECT prob, debug_json, updated_at
+        FROM model_outputs
+        WHERE fixture_id=%s AND market=%s
+    """, (int(fixture_id), str(market)))
+    row = cur.fetchone()
+    conn.close()
     if not row:
         return None
+    return _decode_model_output_row(row)
 
+def _decode_model_output_row(row: dict) -> dict:
     val = row.get("debug_json")
     if isinstance(val, (dict, list)):
         dbg = val
@@ -665,16 +1190,16 @@ def _read_model_output_row(fixture_id: int, market: str) -> dict | None:
 
 
 def _read_fixture_json(fixture_id: int) -> dict | None:
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT fixture_json FROM fixtures WHERE id=%s", (int(fixture_id),))
-        row = cur.fetchone()
-        conn.close()
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    cur.execute("SELECT fixture_json FROM fixtures WHERE id=%s", (int(fixture_id),))
+    row = cur.fetchone()
+    conn.close()
     if not row:
         return None
+    return _decode_fixture_json(row.get("fixture_json"))
 
-    val = row.get("fixture_json")
+def _decode_fixture_json(val) -> dict | None:
     if isinstance(val, (dict, list)):
         return val
     try:
@@ -682,6 +1207,44 @@ def _read_fixture_json(fixture_id: int) -> dict | None:
     except Exception:
         return None
 
+# Bulk varijante za /explain/batch: sve tražene fiksture u dva IN (...) upita (jedna konekcija),
+# umesto 2 konekcije + 2 upita po fiksturi.
+EXPLAIN_BATCH_CHUNK = int(os.getenv("EXPLAIN_BATCH_CHUNK", "500"))
+
+def _read_explain_inputs(fixture_ids: list[int], market: str) -> tuple[dict, dict]:
+    """Vraća ({fid: model_output_row}, {fid: fixture_dict}) za sve fid-ove (nedostajući se preskaču)."""
+    fids = list(dict.fromkeys(int(f) for f in fixture_ids))
+    rows_by_fid, fixtures_by_fid = {}, {}
+    if not fids:
+        return rows_by_fid, fixtures_by_fid
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        for i in range(0, len(fids), EXPLAIN_BATCH_CHUNK):
+            chunk = fids[i:i + EXPLAIN_BATCH_CHUNK]
+            ph = ",".join(["%s"] * len(chunk))
+            cur.execute(f"""
+                SELECT fixture_id, prob, debug_json, updated_at
+                FROM model_outputs
+                WHERE market=%s AND fixture_id IN ({ph})
+            """, (str(market), *chunk))
+            for r in cur.fetchall():
+                rows_by_fid[int(r["fixture_id"])] = r
+            have = [f for f in chunk if f in rows_by_fid]
+            if not have:
+                continue
+            ph = ",".join(["%s"] * len(have))
+            cur.execute(f"SELECT id, fixture_json FROM fixtures WHERE id IN ({ph})", tuple(have))
+            for r in cur.fetchall():
+                fixtures_by_fid[int(r["id"])] = r.get("fixture_json")
+    finally:
+        conn.close()
+    # dekodiranje posle zatvaranja konekcije, jednom po fiksturi
+    rows_by_fid = {fid: _decode_model_output_row(r) for fid, r in rows_by_fid.items()}
+    fixtures_by_fid = {fid: fx for fid, fx in
+                       ((fid, _decode_fixture_json(v)) for fid, v in fixtures_by_fid.items()) if fx}
+    return rows_by_fid, fixtures_by_fid
+
 def _odds_from_prob(p: float) -> float | None:
     try:
         p = max(1e-6, min(0.999999, float(p)))
@@ -828,6 +1391,10 @@ def _build_explanation_for_market(fixture_id: int, market: str, lang="sr") -> di
     fixture = _read_fixture_json(fixture_id)
     if not fixture:
         raise HTTPException(status_code=404, detail=f"Nema fixture zapisa u bazi (id={fixture_id}).")
+    return _build_explanation_from(fixture_id, market, fixture, row, lang=lang)
+
+def _build_explanation_from(fixture_id: int, market: str, fixture: dict, row: dict, lang="sr") -> dict:
+    """Isto kao _build_explanation_for_market, ali nad već učitanim (row, fixture) – bez DB poziva."""
     if market == "ft_over15":
         return _explain_ft_over15(fixture, row, lang=lang)
     # fallback — generički header ako dodaš druge markete
@@ -866,20 +1433,22 @@ def explain_batch(
     lang: str = "sr",
     format: str = "json"
 ):
-    out = []
+    fids = []
     for s in str(fixture_ids).split(","):
         s = s.strip()
         if not s: 
             continue
         try:
-            fid = int(s)
+            fids.append(int(s))
         except:
             continue
-        try:
-            pack = _build_explanation_for_market(fid, market, lang=lang)
-            out.append(pack)
-        except HTTPException:
+    rows_by_fid, fixtures_by_fid = _read_explain_inputs(fids, market)
+    out = []
+    for fid in fids:
+        row, fixture = rows_by_fid.get(fid), fixtures_by_fid.get(fid)
+        if not row or not fixture:
             continue
+        out.append(_build_explanation_from(fid, market, fixture, row, lang=lang))
     if format == "markdown":
         # spakuj u jedan markdown
         md_parts = []
@@ -1089,29 +1658,41 @@ def _aggregate_team_micro_ft(team_id, matches, get_stats_fn, context="all"):
     }
 
 def purge_old_analyses():
-    """Brisanje analiza starijih od ANALYSIS_TTL_HOURS iz model_outputs i analysis_cache."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM model_outputs WHERE updated_at < DATE_SUB(NOW(), INTERVAL %s HOUR)", (ANALYSIS_TTL_HOURS,))
-    # analysis_cache: brišemo po created_at i/ili expires_at
-    cur.execute("""
-        DELETE FROM analysis_cache
-        WHERE created_at < DATE_SUB(NOW(), INTERVAL %s HOUR)
-           OR (expires_at IS NOT NULL AND expires_at < NOW())
-    """, (ANALYSIS_TTL_HOURS,))
-    conn.commit()
-    conn.close()
+    """Brisanje analiza starijih od ANALYSIS_TTL_HOURS iz model_outputs i analysis_cache (batch DELETE)."""
+    return run_retention([
+        ("model_outputs", "updated_at", ANALYSIS_TTL_HOURS),
+        ("analysis_cache", "created_at", ANALYSIS_TTL_HOURS),
+        ("analysis_cache", "expires_at", 0),
+    ])
+
+def purge_league_baseline_seen():
+    """Stari league_baseline_seen redovi (fold ionako preskače mečeve starije od retention-a)."""
+    return run_retention([("league_baseline_seen", "created_at", LEAGUE_BASELINE_SEEN_KEEP_HOURS)])
 
 def start_ttl_sweeper_thread():
     def _loop():
+        last_purge = 0.0
         while True:
             try:
-                purge_old_analyses()
+                expire_stale_prepare_jobs()
             except Exception as e:
-                try: print("TTL sweeper error:", e)
+                try: print("TTL sweeper (stale jobs) error:", e)
                 except: pass
-            # spavaj 1h
-            time.sleep(3600)
+            # purge analiza jednom na 1h (batch-evi sa pauzama); ostale keš tabele samo uz
+            # RETENTION_SWEEP_ALL=1, primarni podaci (fixtures, ...) nikad bez RETENTION_PURGE_PRIMARY=1
+            if time.time() - last_purge >= 3600:
+                try:
+                    if RETENTION_SWEEP_ALL:
+                        run_retention()
+                    else:
+                        purge_old_analyses()
+                        purge_league_baseline_seen()
+                except Exception as e:
+                    try: print("TTL sweeper error:", e)
+                    except: pass
+                last_purge = time.time()
+            # spavaj 1min (stale job expiry)
+            time.sleep(60)
     t = threading.Thread(target=_loop, daemon=True)
     t.start()
 
@@ -1339,33 +1920,21 @@ def run_prepare_job(job_id: str, day_iso: str, prewarm: bool = True, *_args, **_
             except Exception as e:
                 print("prewarm_extras failed:", e)
         
-        # Populate stats_json for fixtures
-        update_prepare_job(job_id, progress=14, detail="populating stats_json")
+        # stats_json je legacy duplikat match_statistics (veza je fixture_id) – jedan UPDATE … JOIN za dan
+        update_prepare_job(job_id, progress=14, detail="linking stats_json")
         try:
-            print(f"DEBUG: Populating stats_json for {len(fixtures)} fixtures")
-            updated_count = 0
-            for fixture in fixtures:
-                fixture_id = ((fixture.get("fixture") or {}).get("id"))
-                if fixture_id:
-                    # Get fixture statistics and update stats_json
-                    stats = repo.get_fixture_stats(fixture_id, no_api=False)
-                    if stats:
-                        # Update fixtures table with stats_json
-                        conn = get_mysql_connection()
-                        cur = conn.cursor()
-                        cur.execute("""
-                            UPDATE fixtures 
-                            SET stats_json = %s 
-                            WHERE id = %s
-                        """, (json.dumps(stats, ensure_ascii=False), fixture_id))
-                        conn.commit()
-                        conn.close()
-                        updated_count += 1
-            print(f"DEBUG: Finished populating stats_json. Updated {updated_count} fixtures.")
+            fids = [((f.get("fixture") or {}).get("id")) for f in fixtures]
+            flush_writes("stats")
+            conn = get_mysql_connection()
+            try:
+                cur = conn.cursor()
+                updated_count = sync_fixture_stats_json(cur, fids)
+                conn.commit()
+            finally:
+                conn.close()
+            print(f"DEBUG: stats_json linked for {updated_count}/{len(fids)} fixtures")
         except Exception as e:
-            print("populating stats_json failed:", e)
-            import traceback
-            traceback.print_exc()
+            print("linking stats_json failed:", e)
 
         # Update team stats table with latest data
         update_prepare_job(job_id, progress=18, detail="team stats update")
@@ -1377,6 +1946,8 @@ def run_prepare_job(job_id: str, day_iso: str, prewarm: bool = True, *_args, **_
             # Then update stats for teams playing today
             update_team_stats_for_teams(team_ids, fixtures)
             print("DEBUG: update_team_stats_for_teams completed")
+            leaderboard = build_team_leaderboards()
+            print(f"DEBUG: team leaderboards rebuilt: {leaderboard}")
         except Exception as e:
             print("team stats update failed:", e)
             import traceback
@@ -1384,8 +1955,9 @@ def run_prepare_job(job_id: str, day_iso: str, prewarm: bool = True, *_args, **_
 
         # 3) History/H2H – dopuni samo nedostajuće
         update_prepare_job(job_id, progress=15, detail="history/h2h")
+        h2h_before = dict(H2H_SOURCE_STATS)
         hist_missing = _history_missing(team_ids, DAY_PREFETCH_LAST_N, CACHE_TTL_HOURS)
-        h2h_missing  = _h2h_missing(pairs,  DAY_PREFETCH_H2H_N,  CACHE_TTL_HOURS)
+        h2h_missing  = _h2h_missing(pairs,  DAY_PREFETCH_H2H_N,  policy_fresh_hours("h2h_cache"))
         if hist_missing or h2h_missing:
             fetch_and_store_all_historical_data(fixtures, no_api=False)
 
@@ -1417,10 +1989,21 @@ def run_prepare_job(job_id: str, day_iso: str, prewarm: bool = True, *_args, **_
         pre_h2h = preload["h2h"]
         pre_ex  = preload["extras"]
 
+        # novi mečevi ulaze u perzistentne league baselines (samo delta, ne ceo history)
+        try:
+            update_league_baselines_incremental(pre_tl, get_fixture_statistics_cached_only)
+        except Exception as e:
+            print("league baselines fold failed:", e)
+
+        # feature vektori se računaju jednom po meču i dele između svih marketa (keš samo ovog job-a)
+        feature_cache = FeatureCache()
+        ta_before = dict(TEAM_ARTIFACT_STATS)
+
         update_prepare_job(job_id, progress=45, detail="ft_over15 compute")
         rows_ft = compute_ft_over15_for_range(
             start_dt, end_dt, no_api=True,
-            preloaded_team_last=pre_tl, preloaded_h2h=pre_h2h, preloaded_extras=pre_ex
+            preloaded_team_last=pre_tl, preloaded_h2h=pre_h2h, preloaded_extras=pre_ex,
+            feature_cache=feature_cache
         )
         persist_ft_over15(rows_ft)
         market_summaries["ft_over15"] = len(rows_ft or [])
@@ -1431,12 +2014,19 @@ def run_prepare_job(job_id: str, day_iso: str, prewarm: bool = True, *_args, **_
             rows = analyze_fixtures(
                 start_dt, end_dt, None, None, mk,
                 no_api=True,  # DB-only
-                preloaded_team_last=pre_tl, preloaded_h2h=pre_h2h, preloaded_extras=pre_ex
+                preloaded_team_last=pre_tl, preloaded_h2h=pre_h2h, preloaded_extras=pre_ex,
+                feature_cache=feature_cache
             ) or []
             persist_market_outputs_from_results(mk, rows)
             market_summaries[mk] = len(rows)
             rows_by_market[mk] = rows
 
+        feature_cache_stats = feature_cache.stats()
+        print(f"ℹ️ feature cache: {feature_cache_stats}")
+        team_artifacts = {k: TEAM_ARTIFACT_STATS[k] - ta_before.get(k, 0) for k in TEAM_ARTIFACT_STATS}
+        h2h_sources = h2h_local_ratio(h2h_before)
+        print(f"ℹ️ h2h sources: {h2h_sources}")
+
         # 6) analysis_cache za ceo dan (po marketu)
         update_prepare_job(job_id, progress=95, detail="cache build")
         for mk in markets:
@@ -1449,6 +2039,9 @@ def run_prepare_job(job_id: str, day_iso: str, prewarm: bool = True, *_args, **_
             }
             key = _build_cache_key(params)
             write_analysis_cache(key, params, rows_by_market.get(mk, []), ttl_hours=CACHE_TTL_HOURS_TODAY)
+        # novi model_outputs → i fallback odgovori (read_precomputed_results) su zastareli
+        flush_writes()
+        invalidate_analyze_response_cache()
 
         # 7) Rezultat
         out = {
@@ -1462,8 +2055,18 @@ def run_prepare_job(job_id: str, day_iso: str, prewarm: bool = True, *_args, **_
             "h2h_missing_before": len(h2h_missing),
             "stats_missing_before": stats_missing_before,
             "computed": market_summaries,
+            "feature_cache": feature_cache_stats,
+            "team_artifacts": team_artifacts,
+            "h2h_sources": h2h_sources,
+            "scoring": dict(LAST_SCORING_TIMINGS),
+            "write_behind": write_behind_stats(),
         }
         update_prepare_job(job_id, status="done", progress=100, detail="finished", result=out)
+        # ostali web workeri (i web proces kad job radi prepare_worker) ovo vide u refresher-u
+        try:
+            bump_prepare_generation(job_id)
+        except Exception as e:
+            print("bump_prepare_generation failed:", e)
 
     except Exception as e:
         update_prepare_job(job_id, status="error", detail=str(e)[:255])
@@ -1491,10 +2094,62 @@ def build_micro_db_ft(team_last_matches, stats_fn):
 
 # ---------- FT Over 1.5: batch compute + persist ----------
 
+def _score_fixture_ft(ctx: dict, fx):
+    """Jedan meč za compute_ft_over15_for_range. Top-level (picklable za spawn pool); ulazi su u ctx."""
+    no_api, team_last, h2h_all = ctx["no_api"], ctx["team_last"], ctx["h2h"]
+    micro_db_ft, league_bases_ft = ctx["micro_db"], ctx["baselines"]
+    team_strengths_ft, team_profiles_ft = ctx["strengths"], ctx["profiles"]
+
+    fid = None
+    try:
+        if not isinstance(fx, dict):
+            print(f"🔍 [DEBUG] Fixture is not dict, type: {type(fx)}")
+            # pokušaj da ga "coerce-uješ" (ako je zalutao tuple/list)
+            fx = _coerce_fixture_row_to_api_dict(fx) or {}
+            print(f"🔍 [DEBUG] After coercion, type: {type(fx)}")
+        fid = int(((fx.get('fixture') or {}).get('id') or 0))
+        if not fid:
+            print(f"🔍 [DEBUG] Fixture has no valid ID, skipping")
+            return None
+        print(f"🔍 [DEBUG] Fixture ID: {fid}")
+        
+        print(f"🔍 [DEBUG] build_extras_for_fixture START for fixture {fid}")
+        extras = build_extras_for_fixture(fx, no_api=True)
+        print(f"🔍 [DEBUG] build_extras_for_fixture COMPLETED for fixture {fid}")
+        
+        print(f"🔍 [DEBUG] calculate_final_probability_ft_over15 START for fixture {fid}")
+        p2p, dbg = calculate_final_probability_ft_over15(
+            fx, team_last, h2h_all,
+            micro_db_ft, league_bases_ft, team_strengths_ft, team_profiles_ft,
+            extras=extras, no_api=no_api, market_odds_over15_ft=None,
+            feature_cache=ctx.get("feature_cache")
+        )
+        print(f"🔍 [DEBUG] calculate_final_probability_ft_over15 COMPLETED for fixture {fid}")
+        
+        row = {
+            "fixture_id": ((fx.get("fixture") or {}).get("id")),
+            "ft_over15_prob": float(round(p2p, 4)),
+            "ft_over15_dbg": dbg,
+            "kickoff": (fx.get("fixture") or {}).get("date"),
+            "league": (fx.get("league") or {}).get("name"),
+            "team1": (fx.get("teams") or {}).get("home", {}).get("name"),
+            "team2": (fx.get("teams") or {}).get("away", {}).get("name"),
+            "final_percent": round(p2p * 100, 2),
+        }
+        print(f"🔍 [DEBUG] Fixture {fid} processed successfully")
+        return row
+    except Exception as e:
+        print(f"❌ [ERROR] Exception in fixture {fid or '?'}: {str(e)}")
+        print(f"❌ [ERROR] Exception type: {type(e)}")
+        import traceback
+        print(f"❌ [ERROR] Traceback: {traceback.format_exc()}")
+        raise e
+
 def compute_ft_over15_for_range(start_dt: datetime, end_dt: datetime, no_api: bool = True,
                                 preloaded_team_last: dict[int, list] | None = None,
                                 preloaded_h2h: dict[str, list] | None = None,
-                                preloaded_extras: dict[int, dict] | None = None):
+                                preloaded_extras: dict[int, dict] | None = None,
+                                feature_cache: "FeatureCache | None" = None):
     print(f"🔍 [DEBUG] compute_ft_over15_for_range START", flush=True)
     fixtures = get_fixtures_in_time_range(start_dt, end_dt, no_api=no_api)
     print(f"🔍 [DEBUG] get_fixtures_in_time_range returned {len(fixtures or [])} fixtures", flush=True)
@@ -1506,19 +2161,24 @@ def compute_ft_over15_for_range(start_dt: datetime, end_dt: datetime, no_api: bo
     print(f"🔍 [DEBUG] fetch_last_matches_for_teams returned {len(team_last or {})} teams", flush=True)
 
     print(f"🔍 [DEBUG] compute_league_baselines_ft START", flush=True)
-    league_bases_ft = compute_league_baselines_ft(team_last, stats_fn=get_fixture_statistics_cached_only)
+    league_bases_ft = get_league_baselines(team_last, get_fixture_statistics_cached_only, scope="ft")
     print(f"🔍 [DEBUG] compute_league_baselines_ft COMPLETED", flush=True)
     
     print(f"🔍 [DEBUG] compute_team_profiles_ft START", flush=True)
-    team_profiles_ft = compute_team_profiles_ft(team_last, stats_fn=get_fixture_statistics_cached_only)
+    team_profiles_ft = materialize_team_artifacts(
+        "profiles_ft", team_last, lambda tl: compute_team_profiles_ft(tl, stats_fn=get_fixture_statistics_cached_only))
     print(f"🔍 [DEBUG] compute_team_profiles_ft COMPLETED", flush=True)
     
     print(f"🔍 [DEBUG] compute_team_strengths_ft START", flush=True)
-    team_strengths_ft = compute_team_strengths_ft(team_last, m_global=(league_bases_ft["global"]["m2p"]*0.9 + 0.25))
+    m_global_ft = league_bases_ft["global"]["m2p"]*0.9 + 0.25
+    team_strengths_ft = materialize_team_artifacts(
+        "strengths_ft", team_last, lambda tl: compute_team_strengths_ft(tl, m_global=m_global_ft),
+        params=f"m={m_global_ft:.4f}", uses_stats=False)
     print(f"🔍 [DEBUG] compute_team_strengths_ft COMPLETED", flush=True)
     
     print(f"🔍 [DEBUG] build_micro_db_ft START", flush=True)
-    micro_db_ft = build_micro_db_ft(team_last, stats_fn=get_fixture_statistics_cached_only)
+    micro_db_ft = materialize_team_artifacts(
+        "micro_ft", team_last, lambda tl: build_micro_db_ft(tl, stats_fn=get_fixture_statistics_cached_only))
     print(f"🔍 [DEBUG] build_micro_db_ft COMPLETED", flush=True)
 
     print(f"🔍 [DEBUG] fetch_h2h_matches START", flush=True)
@@ -1526,50 +2186,12 @@ def compute_ft_over15_for_range(start_dt: datetime, end_dt: datetime, no_api: bo
     print(f"🔍 [DEBUG] fetch_h2h_matches returned {len(h2h_all or {})} h2h pairs", flush=True)
 
     print(f"🔍 [DEBUG] Processing {len(fixtures or [])} fixtures START", flush=True)
-    rows = []
-    for i, fx in enumerate(fixtures or []):
-        try:
-            print(f"🔍 [DEBUG] Processing fixture {i+1}/{len(fixtures or [])}")
-            if not isinstance(fx, dict):
-                print(f"🔍 [DEBUG] Fixture {i+1} is not dict, type: {type(fx)}")
-                # pokušaj da ga "coerce-uješ" (ako je zalutao tuple/list)
-                fx = _coerce_fixture_row_to_api_dict(fx) or {}
-                print(f"🔍 [DEBUG] After coercion, type: {type(fx)}")
-            fid = int(((fx.get('fixture') or {}).get('id') or 0))
-            if not fid:
-                print(f"🔍 [DEBUG] Fixture {i+1} has no valid ID, skipping")
-                continue
-            print(f"🔍 [DEBUG] Fixture {i+1} ID: {fid}")
-            
-            print(f"🔍 [DEBUG] build_extras_for_fixture START for fixture {fid}")
-            extras = build_extras_for_fixture(fx, no_api=True)
-            print(f"🔍 [DEBUG] build_extras_for_fixture COMPLETED for fixture {fid}")
-            
-            print(f"🔍 [DEBUG] calculate_final_probability_ft_over15 START for fixture {fid}")
-            p2p, dbg = calculate_final_probability_ft_over15(
-                fx, team_last, h2h_all,
-                micro_db_ft, league_bases_ft, team_strengths_ft, team_profiles_ft,
-                extras=extras, no_api=no_api, market_odds_over15_ft=None
-            )
-            print(f"🔍 [DEBUG] calculate_final_probability_ft_over15 COMPLETED for fixture {fid}")
-            
-            rows.append({
-                "fixture_id": ((fx.get("fixture") or {}).get("id")),
-                "ft_over15_prob": float(round(p2p, 4)),
-                "ft_over15_dbg": dbg,
-                "kickoff": (fx.get("fixture") or {}).get("date"),
-                "league": (fx.get("league") or {}).get("name"),
-                "team1": (fx.get("teams") or {}).get("home", {}).get("name"),
-                "team2": (fx.get("teams") or {}).get("away", {}).get("name"),
-                "final_percent": round(p2p * 100, 2),
-            })
-            print(f"🔍 [DEBUG] Fixture {i+1} processed successfully")
-        except Exception as e:
-            print(f"❌ [ERROR] Exception in fixture {i+1}: {str(e)}")
-            print(f"❌ [ERROR] Exception type: {type(e)}")
-            import traceback
-            print(f"❌ [ERROR] Traceback: {traceback.format_exc()}")
-            raise e
+    ctx = {
+        "no_api": no_api, "team_last": team_last, "h2h": h2h_all, "micro_db": micro_db_ft,
+        "baselines": league_bases_ft, "strengths": team_strengths_ft, "profiles": team_profiles_ft,
+        "feature_cache": feature_cache,
+    }
+    rows = score_fixtures_parallel("ft_over15", fixtures or [], _score_fixture_ft, ctx)
     print(f"🔍 [DEBUG] compute_ft_over15_for_range COMPLETED, returning {len(rows)} rows")
     return rows
 
@@ -1604,6 +2226,7 @@ def persist_ft_over15(rows: list[dict]):
             prob=float(r["ft_over15_prob"]),
             debug=dbg
         )
+    flush_writes("analysis")
 
 # ADD: generički upis u model_outputs za bilo koji market iz analyze_fixtures rezultata
 def persist_market_outputs_from_results(market: str, results: list[dict]):
@@ -1649,28 +2272,29 @@ def persist_market_outputs_from_results(market: str, results: list[dict]):
             prob=float(r.get("final_percent", 0)) / 100.0,  # final_percent = 0–100
             debug=dbg
         )
+    flush_writes("analysis")
 
 # ---------- league baselines (FT totals) ----------
+def _extract_ft_totals_both(stats):
+    if not stats or len(stats) < 2:
+        return (None, None)
+    b0, b1 = stats[0], stats[1]
+    def full(block, names):
+        return _stat_from_block(block, [n.lower() for n in names])
+    s0 = full(b0, ["shots on goal","shots on target"])
+    s1 = full(b1, ["shots on goal","shots on target"])
+    d0 = full(b0, ["dangerous attacks"])
+    d1 = full(b1, ["dangerous attacks"])
+    sot = (s0 if s0 is not None else 0.0) + (s1 if s1 is not None else 0.0) if (s0 is not None or s1 is not None) else None
+    da  = (d0 if d0 is not None else 0.0) + (d1 if d1 is not None else 0.0) if (d0 is not None or d1 is not None) else None
+    return (sot, da)
+
 def compute_league_baselines_ft(team_last_matches, stats_fn):
     seen = set()
     by_lid = {}
     global_sot = []; global_da = []
     g_hits2p = 0.0; g_tot = 0.0
 
-    def _extract_ft_totals_both(stats):
-        if not stats or len(stats) < 2:
-            return (None, None)
-        b0, b1 = stats[0], stats[1]
-        def full(block, names):
-            return _stat_from_block(block, [n.lower() for n in names])
-        s0 = full(b0, ["shots on goal","shots on target"])
-        s1 = full(b1, ["shots on goal","shots on target"])
-        d0 = full(b0, ["dangerous attacks"])
-        d1 = full(b1, ["dangerous attacks"])
-        sot = (s0 if s0 is not None else 0.0) + (s1 if s1 is not None else 0.0) if (s0 is not None or s1 is not None) else None
-        da  = (d0 if d0 is not None else 0.0) + (d1 if d1 is not None else 0.0) if (d0 is not None or d1 is not None) else None
-        return (sot, da)
-
     for team_id, matches in (team_last_matches or {}).items():
         # ISPRAVKA: Bezbedno rukovanje sa podacima koji mogu biti tuple-ovi ili dict-ovi
         safe_matches = []
@@ -2204,11 +2828,91 @@ def _minute_bucket_prior_ft(repo, fixture, no_api=False):
     effn = 4.0  # blaga preciznost
     return (p2p, effn)
 
+# ---------- per-fixture feature keš (deli se između svih marketa u jednom run-u) ----------
+# matchup_features_enhanced(_ft) je skup (lineups/referee/importance) i ranije se zvao
+# 2x po kalkulatoru + jednom po 1H marketu. Keš je objekat JEDNOG run-a (prepare job, parity
+# provera) koji se eksplicitno prosleđuje niz lanac (analyze_fixtures/compute_ft_over15_for_range →
+# ctx → calculate_final_probability* → get_matchup_features_*); bez njega (feature_cache=None) se
+# uvek računa. Ključ je (vrsta, fixture_id, otisak ulaza) – profili/micro oba tima, league baseline
+# i extras – pa ni u okviru run-a nema zastarelih vektora ako se ulazi promene.
+class FeatureCache:
+    def __init__(self):
+        self._entries: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # spawn pool: svaki child dobija prazan keš (lock i vektori se ne serijalizuju)
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, _state):
+        self.__init__()
+
+    def get_or_compute(self, key: tuple, compute_fn):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self.hits += 1
+                return hit
+        feats = compute_fn()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = feats
+        return feats
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            }
+
+def _feature_inputs_digest(*parts) -> str:
+    try:
+        blob = json.dumps(parts, sort_keys=True, default=str)
+    except TypeError:   # mešoviti tipovi ključeva (int/str) – repr je stabilan za iste ulaze
+        blob = repr(parts)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def _cached_matchup_features(kind: str, fixture, feature_cache, base, team_profiles, micro_db, extras, compute_fn):
+    """kind: '1h' ili 'ft'. compute_fn() se zove samo na promašaj (ili bez keša)."""
+    fid = ((fixture.get('fixture') or {}).get('id'))
+    if feature_cache is None or not fid:
+        return compute_fn()
+    home_id = ((fixture.get('teams') or {}).get('home') or {}).get('id')
+    away_id = ((fixture.get('teams') or {}).get('away') or {}).get('id')
+    digest = _feature_inputs_digest(
+        (fixture.get('fixture') or {}).get('date'), home_id, away_id, base,
+        (team_profiles or {}).get(home_id), (team_profiles or {}).get(away_id),
+        (micro_db or {}).get(home_id), (micro_db or {}).get(away_id), extras,
+    )
+    return feature_cache.get_or_compute((kind, int(fid), digest), compute_fn)
+
+def get_matchup_features_1h(fixture, team_profiles, league_baselines, micro_db=None, extras: dict | None = None,
+                            feature_cache: FeatureCache | None = None):
+    return _cached_matchup_features(
+        "1h", fixture, feature_cache, _league_base_for_fixture(fixture, league_baselines),
+        team_profiles, micro_db, extras,
+        lambda: matchup_features_enhanced(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras))
+
+def get_matchup_features_ft(fixture, team_profiles_ft, league_baselines_ft, micro_db_ft=None, extras: dict | None = None,
+                            feature_cache: FeatureCache | None = None):
+    return _cached_matchup_features(
+        "ft", fixture, feature_cache, _league_base_ft_for_fixture(fixture, league_baselines_ft),
+        team_profiles_ft, micro_db_ft, extras,
+        lambda: matchup_features_enhanced_ft(fixture, team_profiles_ft, league_baselines_ft,
+                                             micro_db_ft=micro_db_ft, extras=extras))
+
 # ---------- glavna FT funkcija: 2+ ----------
 def calculate_final_probability_ft_over15(
     fixture, team_last_matches, h2h_results, micro_db_ft,
     league_baselines_ft, team_strengths_ft, team_profiles_ft,
-    extras: dict|None=None, no_api: bool=False, market_odds_over15_ft: Optional[float]=None
+    extras: dict|None=None, no_api: bool=False, market_odds_over15_ft: Optional[float]=None,
+    feature_cache: FeatureCache | None = None
 ):
     base = _league_base_ft_for_fixture(fixture, league_baselines_ft)
     m2p = base["m2p"]
@@ -2270,7 +2974,8 @@ def calculate_final_probability_ft_over15(
     
     # --- KRITIČNI FEATURE-I ---
     # Treba da uključimo 4 kritična feature-a u p_prior kalkulaciju
-    feats_temp = matchup_features_enhanced_ft(fixture, team_profiles_ft, league_baselines_ft, micro_db_ft=micro_db_ft, extras=extras)
+    feats_temp = get_matchup_features_ft(fixture, team_profiles_ft, league_baselines_ft, micro_db_ft=micro_db_ft, extras=extras,
+                                        feature_cache=feature_cache)
     
     # 1. pace_da_total - tempo dangerous attacks (FT verzija)
     pace_da_total = feats_temp.get("pace_da_total", 0.0)
@@ -2303,7 +3008,7 @@ def calculate_final_probability_ft_over15(
         p_prior = _inv_logit(_logit(p_prior) + inj_count_adj)
 
     # MICRO -> λ_home, λ_away -> P(Total≥2)
-    feats = matchup_features_enhanced_ft(fixture, team_profiles_ft, league_baselines_ft, micro_db_ft=micro_db_ft, extras=extras)
+    feats = feats_temp  # isti ulazi → isti vektor, ne računaj ponovo
     lam_h, dbg_h = predict_team_scores_ft_enhanced(fixture, feats, league_baselines_ft, team_strengths_ft, side='home')
     lam_a, dbg_a = predict_team_scores_ft_enhanced(fixture, feats, league_baselines_ft, team_strengths_ft, side='away')
     lam_total = max(0.0, lam_h + lam_a)
@@ -2561,9 +3266,7 @@ from db_backend import (
     get_connection as get_db_connection,
     insert_team_matches,
     insert_h2h_matches,
-    DB_WRITE_LOCK,
     try_read_fixture_statistics,
-    create_all_tables,
 )
 from mysql_database import (
     create_user,
@@ -2573,6 +3276,13 @@ from mysql_database import (
     delete_session,
     cleanup_expired_sessions,
     get_mysql_connection,
+    read_team_history_facts,
+    read_h2h_facts,
+    note_h2h_source,
+    read_fixture_statistics_meta,
+    sync_fixture_stats_json,
+    h2h_local_ratio,
+    H2H_SOURCE_STATS,
 )
 
 
@@ -2597,7 +3307,7 @@ class AuthResponse(BaseModel):
 # ====== AUTHENTICATION ENDPOINTS ======
 
 @app.post("/api/auth/register", response_model=AuthResponse)
-async def register_user(request: RegisterRequest):
+def register_user(request: RegisterRequest):
     """Register a new user."""
     try:
         # Validate email format
@@ -2631,7 +3341,7 @@ async def register_user(request: RegisterRequest):
         return AuthResponse(success=False, message="Registration failed")
 
 @app.post("/api/auth/login", response_model=AuthResponse)
-async def login_user(request: LoginRequest):
+def login_user(request: LoginRequest):
     """Login user and create session."""
     try:
         # Authenticate user
@@ -2645,7 +3355,7 @@ async def login_user(request: LoginRequest):
         # Create session
         session_id = secrets.token_urlsafe(32)
         expires_hours = 24 * 30 if request.remember_me else 24  # 30 days or 1 day
-        expires_at = (datetime.now() + timedelta(hours=expires_hours)).isoformat()
+        expires_at = (datetime.utcnow() + timedelta(hours=expires_hours)).isoformat()   # DB sesija je UTC
         
         session_created = create_session(
             user_id=user["id"],
@@ -2668,7 +3378,7 @@ async def login_user(request: LoginRequest):
         return AuthResponse(success=False, message="Login failed")
 
 @app.post("/api/auth/logout")
-async def logout_user(session_id: str = None):
+def logout_user(session_id: str = None):
     """Logout user and delete session."""
     try:
         if session_id:
@@ -2685,7 +3395,7 @@ async def logout_user(session_id: str = None):
         return {"success": False, "message": "Logout failed"}
 
 @app.get("/api/auth/me")
-async def get_current_user(session_id: str = None):
+def get_current_user(session_id: str = None):
     """Get current user from session."""
     try:
         if not session_id:
@@ -2767,7 +3477,7 @@ def seed_day_into_db(d: date):
     """
     1) Povuci sve fixtures za dan d sa API-ja i upiši u DB (RAW).
     2) Iz tih fixtures izračunaj skup timova/parova i popuni:
-       - last matches (DAY_PREFETCH_LAST_N) + upis u team_history_cache i team_matches tabelu
+       - last matches (DAY_PREFETCH_LAST_N) + upis u team_history_store i team_matches tabelu
        - H2H (DAY_PREFETCH_H2H_N) + upis u h2h_cache i h2h tabelu
        - prewarm stats (match_statistics) za ISTORIJSKE mečeve
     """
@@ -2804,12 +3514,11 @@ def seed_day_into_db(d: date):
 
 def purge_fixtures_for_day(d: date):
     s, e = _day_bounds_utc(d)
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM fixtures WHERE `date` >= %s AND `date` <= %s", (s, e))
-        conn.commit()
-        conn.close()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM fixtures WHERE `date` >= %s AND `date` <= %s", (s, e))
+    conn.commit()
+    conn.close()
     print(f"🧹 purged fixtures for {d}")
 
 # def daily_maintenance_and_seed():
@@ -3163,8 +3872,58 @@ def _load_strict_whitelist_from_file(path: str) -> dict:
             continue
 
     print(f"✅ WHITELIST učitan: ids={len(LEAGUE_ID_WHITELIST)}, names={len(LEAGUE_NAME_WHITELIST)} iz {path}")
+    _resolve_league_whitelist_ids()
     return {"ids": len(LEAGUE_ID_WHITELIST), "names": len(LEAGUE_NAME_WHITELIST), "path": path, "ok": True}
 
+# --- whitelist materijalizovan kao skup league_id → ide direktno u SQL (`league_id IN (...)`) ---
+# (country, league) imena se razrešavaju preko leagues tabele jednom po učitavanju whitelist-e;
+# imena koja još nemaju red u leagues (nova liga) se ponovo razrešavaju posle upisa dimenzija
+# (store_fixture_data_in_db) ili najkasnije posle LEAGUE_WL_RESOLVE_RETRY_SEC, a do tada
+# get_fixtures_in_time_range za njih radi po imenu iz fixture_json (kao stari is_valid_competition).
+LEAGUE_ALLOWED_IDS: set[int] = set()
+LEAGUE_WL_RESOLVE_RETRY_SEC = int(os.getenv("LEAGUE_WL_RESOLVE_RETRY_SEC", "600"))
+_LEAGUE_WL_UNRESOLVED: set[tuple[str, str]] = set()
+_LEAGUE_WL_RESOLVED_AT = 0.0
+_LEAGUE_WL_LOCK = threading.Lock()
+
+def _resolve_league_whitelist_ids() -> dict:
+    global LEAGUE_ALLOWED_IDS, _LEAGUE_WL_UNRESOLVED, _LEAGUE_WL_RESOLVED_AT
+    ids = set(LEAGUE_ID_WHITELIST)
+    names = set(LEAGUE_NAME_WHITELIST)
+    matched = set()
+    if names:
+        try:
+            conn = get_mysql_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT id, country, name FROM leagues")
+                for lid, country, name in cur.fetchall():
+                    key = _comp_key(country, name)
+                    if key in names:
+                        ids.add(int(lid))
+                        matched.add(key)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ Whitelist: razrešavanje imena u league_id nije uspelo: {e}")
+    with _LEAGUE_WL_LOCK:
+        LEAGUE_ALLOWED_IDS = ids
+        _LEAGUE_WL_UNRESOLVED = names - matched
+        _LEAGUE_WL_RESOLVED_AT = time.time()
+    print(f"✅ WHITELIST razrešen: {len(ids)} league_id, nerazrešenih imena={len(names - matched)}")
+    return {"ids": sorted(ids), "unresolved_names": sorted(f"{c}|{n}" for c, n in names - matched)}
+
+def league_whitelist_ids() -> set[int]:
+    """Skup dozvoljenih league_id (id whitelist ∪ razrešena imena) za SQL filter."""
+    if (_LEAGUE_WL_RESOLVED_AT == 0.0
+            or (_LEAGUE_WL_UNRESOLVED and time.time() - _LEAGUE_WL_RESOLVED_AT > LEAGUE_WL_RESOLVE_RETRY_SEC)):
+        _resolve_league_whitelist_ids()
+    return LEAGUE_ALLOWED_IDS
+
+def league_whitelist_unresolved() -> set[tuple[str, str]]:
+    """(country, league) imena sa whitelist-e koja još nemaju league_id u leagues tabeli."""
+    return _LEAGUE_WL_UNRESOLVED
+
 LEAGUE_WHITELIST_IDS = set()   # id-jevi liga (tier 1 i 2)
 LEAGUE_WHITELIST_UPDATED = None
 LEAGUE_WHITELIST_TTL_H = 168   # 7 dana
@@ -3926,141 +4685,77 @@ def predict_team_scores1h_enhanced(fixture, feats, league_baselines, team_streng
     }
     return p, dbg
 
-def get_or_fetch_team_history(team_id: int, last_n: int = 30, force_refresh: bool = False, no_api: bool = False):
-    conn = get_db_connection()
-    cur = conn.cursor(dictionary=True)
-
-    now = datetime.utcnow()
-    if not force_refresh:
-        cur.execute("SELECT data, updated_at FROM team_history_cache WHERE team_id=%s AND last_n=%s", (team_id, last_n))
-        row = cur.fetchone()
-        if row:
-            updated_at = row["updated_at"]
-            if isinstance(updated_at, str):
-                try: updated_at = datetime.fromisoformat(updated_at)
-                except: updated_at = now - timedelta(hours=CACHE_TTL_HOURS+1)
-            if (now - updated_at) <= timedelta(hours=CACHE_TTL_HOURS) or no_api:
-                conn.close()
-                raw_data = json.loads(row["data"])[:last_n]
-                # ISPRAVKA: Osiguraj da su svi elementi dict-ovi
-                safe_data = []
-                for item in raw_data:
-                    if isinstance(item, dict):
-                        safe_data.append(item)
-                    elif isinstance(item, (list, tuple)):
-                        converted = _coerce_fixture_row_to_api_dict(item)
-                        if converted:
-                            safe_data.append(converted)
-                return safe_data
-
-        cur.execute("""
-            SELECT data, updated_at, last_n FROM team_history_cache
-            WHERE team_id=%s ORDER BY last_n DESC LIMIT 1
-        """, (team_id,))
-        row2 = cur.fetchone()
-        if row2:
-            updated_at2 = row2["updated_at"]
-            if isinstance(updated_at2, str):
-                try: updated_at2 = datetime.fromisoformat(updated_at2)
-                except: updated_at2 = now - timedelta(hours=CACHE_TTL_HOURS+1)
-            have_n = row2.get("last_n") or 0
-            if have_n >= last_n and ((now - updated_at2) <= timedelta(hours=CACHE_TTL_HOURS) or no_api):
-                conn.close()
-                raw_data = json.loads(row2["data"])[:last_n]
-                # ISPRAVKA: Osiguraj da su svi elementi dict-ovi
-                safe_data = []
-                for item in raw_data:
-                    if isinstance(item, dict):
-                        safe_data.append(item)
-                    elif isinstance(item, (list, tuple)):
-                        converted = _coerce_fixture_row_to_api_dict(item)
-                        if converted:
-                            safe_data.append(converted)
-                return safe_data
-
-    if no_api:
-        conn.close()
-        return []
-
-    resp = rate_limited_request(f"{BASE_URL}/fixtures",
-                                params={'team': team_id, 'last': last_n, 'timezone': 'UTC'})
-    data = resp.get('response', []) if resp else []
-
-    with DB_WRITE_LOCK:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO team_history_cache(team_id,last_n,data,updated_at)
-            VALUES(%s,%s,%s,NOW())
-            ON DUPLICATE KEY UPDATE data=VALUES(data), updated_at=NOW()
-        """, (team_id, last_n, json.dumps(data, ensure_ascii=False)))
-        conn.commit()
+# history/h2h čitaj iz match_facts (tipizovane kolone) kad ima dovoljno svežih završenih mečeva
+HISTORY_FROM_MATCH_FACTS = os.getenv("HISTORY_FROM_MATCH_FACTS", "1") == "1"
 
-    conn.close()
-    return data
+def get_or_fetch_team_history(team_id: int, last_n: int = 30, force_refresh: bool = False, no_api: bool = False):
+    """Rolling istorija (team_history_store, jedan red po timu) – svaki last_n je slice; vidi get_team_history_rolling."""
+    raw_data = get_team_history_rolling(team_id, last_n, no_api=no_api, force_refresh=force_refresh,
+                                        ttl_hours=CACHE_TTL_HOURS)
+    # ISPRAVKA: Osiguraj da su svi elementi dict-ovi
+    safe_data = []
+    for item in raw_data:
+        if isinstance(item, dict):
+            safe_data.append(item)
+        elif isinstance(item, (list, tuple)):
+            converted = _coerce_fixture_row_to_api_dict(item)
+            if converted:
+                safe_data.append(converted)
+    return safe_data
 
 
 def get_or_fetch_h2h(team_a: int, team_b: int, last_n: int = 10, no_api: bool = False):
     a, b = sorted([team_a, team_b])
+    if HISTORY_FROM_MATCH_FACTS:
+        facts = read_h2h_facts(a, b, last_n, None if no_api else policy_fresh_hours("h2h_cache"))
+        if facts is not None:
+            note_h2h_source("local")
+            return facts
     conn = get_db_connection()
     cur = conn.cursor(dictionary=True)
 
-    now = datetime.utcnow()
     cur.execute("SELECT data, updated_at FROM h2h_cache WHERE team1_id=%s AND team2_id=%s AND last_n=%s", (a,b,last_n))
     row = cur.fetchone()
     if row:
-        updated_at = row["updated_at"]
-        if isinstance(updated_at, str):
-            try: updated_at = datetime.fromisoformat(updated_at)
-            except: updated_at = now - timedelta(hours=CACHE_TTL_HOURS+1)
-        if (now - updated_at) <= timedelta(hours=CACHE_TTL_HOURS) or no_api:
+        if is_fresh("h2h_cache", row["updated_at"]) or no_api:
             conn.close()
+            note_h2h_source("cache")
             return json.loads(row["data"])
 
     if no_api:
         conn.close()
         return []
 
+    note_h2h_source("api")
     h2h_key = f"{a}-{b}"
     resp = rate_limited_request(f"{BASE_URL}/fixtures/headtohead", params={'h2h': h2h_key, 'last': last_n})
     data = resp.get('response', []) if resp else []
 
-    with DB_WRITE_LOCK:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO h2h_cache(team1_id,team2_id,last_n,data,updated_at)
-            VALUES(%s,%s,%s,%s,NOW())
-            ON DUPLICATE KEY UPDATE data=VALUES(data), updated_at=NOW()
-        """, (a,b,last_n,json.dumps(data, ensure_ascii=False)))
-        conn.commit()
-
     conn.close()
+    # write-behind (grupa "history"); fetch_and_store_all_historical_data radi flush na kraju
+    enqueue_h2h_cache(a, b, last_n, json.dumps(data, ensure_ascii=False))
+    enqueue_match_facts(data)
     return data
 
 def get_or_fetch_fixture_statistics(fixture_id: int):
-    existing = try_read_fixture_statistics(fixture_id)
-    if existing is not None:
-        return existing
+    # završen meč → statistika je konačna; nezavršen (live/odložen) → osvežavanje po politici match_statistics
+    await_match_statistics(fixture_id)
+    meta = read_fixture_statistics_meta(fixture_id)
+    if meta is not None:
+        existing, updated_at, final = meta
+        if existing is not None and is_fresh("match_statistics", updated_at, final=final):
+            return existing
 
     response = rate_limited_request(f"{BASE_URL}/fixtures/statistics", params={"fixture": fixture_id})
     stats = (response or {}).get('response') or None
 
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO match_statistics (fixture_id, data, updated_at)
-            VALUES (%s, %s, NOW())
-            ON DUPLICATE KEY UPDATE
-                data=VALUES(data),
-                updated_at=NOW()
-        """, (fixture_id, json.dumps(stats, ensure_ascii=False, default=str)))
-        conn.commit()
-        conn.close()
-
+    # write-behind; čitaoci match_statistics čekaju ovaj ključ (await_match_statistics / flush "stats")
+    enqueue_match_statistics(fixture_id, json.dumps(stats, ensure_ascii=False, default=str))
     return stats
 
 def get_fixture_statistics_cached_only(fixture_id: int):
     """Vrati statistiku iz lokalnog keša ili None. Nikad ne zove API."""
+    await_match_statistics(fixture_id)
     return try_read_fixture_statistics(fixture_id)
 
 # --- Parametri / kapovi (po poluvremenu) ---
@@ -4814,6 +5509,34 @@ def _percentile(arr, q):
     if f == c: return float(arr2[int(k)])
     return float(arr2[f] * (c - k) + arr2[c] * (k - f))
 
+def _extract_1h_totals_both(stats):
+    if not stats or len(stats) < 2:
+        return (None, None)
+    blocks = stats
+
+    def _get_1h(block, full_names, half_names):
+        names_full = [n.lower() for n in (full_names + ["shots on target"])]
+        names_half = [n.lower() for n in (half_names + [
+            "1st half shots on target", "shots on target 1st half", "first half shots on target"
+        ])]
+        v1 = _stat_from_block(block, names_half)
+        if v1 is not None:
+            return float(v1)
+        vfull = _stat_from_block(block, names_full)
+        if vfull is None:
+            return None
+        return float(vfull) / 2.0
+
+    b0, b1 = blocks[0], blocks[1]
+    s0 = _get_1h(b0, ["shots on goal"], ["1st half shots on goal","shots on goal 1st half","first half shots on goal"])
+    s1 = _get_1h(b1, ["shots on goal"], ["1st half shots on goal","shots on goal 1st half","first half shots on goal"])
+    d0 = _get_1h(b0, ["dangerous attacks"], ["1st half dangerous attacks","dangerous attacks 1st half","first half dangerous attacks"])
+    d1 = _get_1h(b1, ["dangerous attacks"], ["1st half dangerous attacks","dangerous attacks 1st half","first half dangerous attacks"])
+
+    sot = (s0 if s0 is not None else 0.0) + (s1 if s1 is not None else 0.0) if (s0 is not None or s1 is not None) else None
+    da  = (d0 if d0 is not None else 0.0) + (d1 if d1 is not None else 0.0) if (d0 is not None or d1 is not None) else None
+    return (sot, da)
+
 def compute_league_baselines(team_last_matches, stats_fn, max_scan_per_league=1500):
     """
     Skenira dostupne mečeve iz history-ja i gradi baseline po (league_id) i global:
@@ -4827,34 +5550,6 @@ def compute_league_baselines(team_last_matches, stats_fn, max_scan_per_league=15
     global_da = []
     g_hits = 0.0; g_tot = 0.0
 
-    def _extract_1h_totals_both(stats):
-        if not stats or len(stats) < 2:
-            return (None, None)
-        blocks = stats
-
-        def _get_1h(block, full_names, half_names):
-            names_full = [n.lower() for n in (full_names + ["shots on target"])]
-            names_half = [n.lower() for n in (half_names + [
-                "1st half shots on target", "shots on target 1st half", "first half shots on target"
-            ])]
-            v1 = _stat_from_block(block, names_half)
-            if v1 is not None:
-                return float(v1)
-            vfull = _stat_from_block(block, names_full)
-            if vfull is None:
-                return None
-            return float(vfull) / 2.0
-
-        b0, b1 = blocks[0], blocks[1]
-        s0 = _get_1h(b0, ["shots on goal"], ["1st half shots on goal","shots on goal 1st half","first half shots on goal"])
-        s1 = _get_1h(b1, ["shots on goal"], ["1st half shots on goal","shots on goal 1st half","first half shots on goal"])
-        d0 = _get_1h(b0, ["dangerous attacks"], ["1st half dangerous attacks","dangerous attacks 1st half","first half dangerous attacks"])
-        d1 = _get_1h(b1, ["dangerous attacks"], ["1st half dangerous attacks","dangerous attacks 1st half","first half dangerous attacks"])
-
-        sot = (s0 if s0 is not None else 0.0) + (s1 if s1 is not None else 0.0) if (s0 is not None or s1 is not None) else None
-        da  = (d0 if d0 is not None else 0.0) + (d1 if d1 is not None else 0.0) if (d0 is not None or d1 is not None) else None
-        return (sot, da)
-
     for team_id, matches in (team_last_matches or {}).items():
         for m in matches or []:
             # ISPRAVKA: Bezbedno rukovanje sa podacima koji mogu biti tuple-ovi ili dict-ovi
@@ -4928,6 +5623,256 @@ def compute_league_baselines(team_last_matches, stats_fn, max_scan_per_league=15
     return {"global": global_base, "leagues": leagues}
 
 
+# ---------- perzistentni (inkrementalni) league baselines ----------
+# Umesto da se svaki run ponovo skenira ceo history, momenti (Welford + q95 sketch) po ligi
+# žive u league_baseline_moments i dopunjuju se samo novim mečevima; skoreri ih čitaju u O(1).
+LEAGUE_BASELINES_FROM_STORE = os.getenv("LEAGUE_BASELINES_FROM_STORE", "1") == "1"
+LEAGUE_BASELINES_STORE_TTL = int(os.getenv("LEAGUE_BASELINES_STORE_TTL", "300"))  # sekundi (in-process keš)
+LEAGUE_BASELINES_MIN_GLOBAL_N = 50  # ispod ovoga store još nije "zreo" → fallback na skeniranje
+
+_LEAGUE_BASELINES_STORE_CACHE: dict = {}  # scope -> (ts, baselines)
+_LEAGUE_BASELINES_STORE_LOCK = threading.Lock()
+
+_BASELINE_SCOPES = {
+    # scope: (extract_fn, hit_fn, sufiks ključa, ključ stope, default stopa)
+    "1h": (_extract_1h_totals_both, _ht_total_ge1, "1h", "m1h", 0.55),
+    "ft": (_extract_ft_totals_both, _ft_total_ge2, "FT", "m2p", 0.62),
+}
+
+def _iter_unique_history_matches(team_last_matches):
+    seen = set()
+    for _tid, matches in (team_last_matches or {}).items():
+        for m in matches or []:
+            if not isinstance(m, dict):
+                if not isinstance(m, (list, tuple)):
+                    continue
+                try:
+                    m = _coerce_fixture_row_to_api_dict(m)
+                except Exception:
+                    continue
+                if not m or not isinstance(m, dict):
+                    continue
+            fid = ((m.get('fixture') or {}).get('id'))
+            if not fid or fid in seen:
+                continue
+            seen.add(fid)
+            yield fid, m
+
+# fold je read-modify-write nad momentima po ligi → serijalizuj samo fold-ove (ne sve upise u procesu)
+_LEAGUE_BASELINE_FOLD_LOCK = threading.Lock()
+LEAGUE_BASELINE_SEEN_KEEP_HOURS = int(policy_for("league_baseline_seen")["keep_hours"])
+
+def _parse_iso_utc_naive(s):
+    if not s:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(s).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo is not None else dt
+
+def update_league_baselines_incremental(team_last_matches, stats_fn) -> dict:
+    """
+    Dopuni perzistentne momente mečevima iz history-ja koji još nisu ušli.
+    Mečevi bez statistike se preskaču (ulaze u nekom od sledećih run-ova kad stats stigne).
+    stats_fn se zove samo za mečeve kojima fali bar jedan scope u league_baseline_seen.
+    """
+    from services.data_repo import fold_league_baseline_samples, league_baseline_seen_scopes
+    matches = list(_iter_unique_history_matches(team_last_matches))
+    # već fold-ovani mečevi (jedan upit) ne traže statistiku ponovo
+    seen = league_baseline_seen_scopes(fid for fid, _m in matches)
+    # stariji od seen retention-a: njihov seen red je možda obrisan → ne fold-uj (bez duplog brojanja)
+    horizon = datetime.utcnow() - timedelta(hours=LEAGUE_BASELINE_SEEN_KEEP_HOURS)
+    samples = {"1h": [], "ft": []}
+    for fid, m in matches:
+        todo = [sc for sc in _BASELINE_SCOPES if sc not in seen.get(int(fid), ())]
+        if not todo:
+            continue
+        kick = _parse_iso_utc_naive((m.get('fixture') or {}).get('date'))
+        if kick is None or kick < horizon:
+            continue
+        stats = stats_fn(fid)
+        if not stats:
+            continue
+        lid = ((m.get('league') or {}).get('id'))
+        if lid is None:
+            lid = -1
+        for scope in todo:
+            extract_fn, hit_fn, _sfx, _rk, _rd = _BASELINE_SCOPES[scope]
+            sot, da = extract_fn(stats)
+            samples[scope].append({
+                "fixture_id": int(fid), "league_id": int(lid),
+                "sot": float(sot) if sot is not None else None,
+                "da": float(da) if da is not None else None,
+                "hit": bool(hit_fn(m)),
+            })
+    out = {}
+    with _LEAGUE_BASELINE_FOLD_LOCK:
+        for scope, rows in samples.items():
+            out[scope] = fold_league_baseline_samples(scope, rows)
+    if any(out.values()):
+        with _LEAGUE_BASELINES_STORE_LOCK:
+            _LEAGUE_BASELINES_STORE_CACHE.clear()
+    print(f"[league_baselines] incremental fold: {out}")
+    return out
+
+def _pack_baseline_accumulator(acc, sfx, rate_key, rate_default):
+    return {f"mu_sot{sfx}": acc.sot.mu(), f"sd_sot{sfx}": acc.sot.sd(), f"q95_sot{sfx}": acc.sot_q.quantile(0.95),
+            f"mu_da{sfx}":  acc.da.mu(),  f"sd_da{sfx}":  acc.da.sd(),  f"q95_da{sfx}":  acc.da_q.quantile(0.95),
+            rate_key: float(acc.hits / acc.tot) if acc.tot > 0 else rate_default}
+
+def load_league_baselines_from_store(scope: str = "1h"):
+    """Isti oblik kao compute_league_baselines(_ft): {"global", "leagues"}; None ako store nije spreman."""
+    from services.data_repo import load_league_baseline_moments, BASELINE_GLOBAL_LID
+    from models.streaming_stats import BaselineAccumulator
+    now = time.time()
+    with _LEAGUE_BASELINES_STORE_LOCK:
+        hit = _LEAGUE_BASELINES_STORE_CACHE.get(scope)
+        if hit and now - hit[0] < LEAGUE_BASELINES_STORE_TTL:
+            return hit[1]
+    try:
+        rows = load_league_baseline_moments(scope)
+    except Exception as e:
+        print(f"[league_baselines] store read failed ({scope}): {e}")
+        return None
+    _extract, _hit, sfx, rate_key, rate_default = _BASELINE_SCOPES[scope]
+    g_acc = BaselineAccumulator.from_dict(rows.pop(BASELINE_GLOBAL_LID, None))
+    if g_acc.tot < LEAGUE_BASELINES_MIN_GLOBAL_N:
+        return None
+    global_base = _pack_baseline_accumulator(g_acc, sfx, rate_key, rate_default)
+    leagues = {}
+    for lid, d in rows.items():
+        base = _pack_baseline_accumulator(BaselineAccumulator.from_dict(d), sfx, rate_key, rate_default)
+        for k, v in base.items():
+            if v is None:
+                base[k] = global_base.get(k)
+        leagues[lid] = base
+    out = {"global": global_base, "leagues": leagues}
+    with _LEAGUE_BASELINES_STORE_LOCK:
+        _LEAGUE_BASELINES_STORE_CACHE[scope] = (now, out)
+    return out
+
+def get_league_baselines(team_last_matches, stats_fn, scope: str = "1h"):
+    """Store (O(1)) ako je uključen i popunjen, inače staro skeniranje history-ja."""
+    if LEAGUE_BASELINES_FROM_STORE:
+        lb = load_league_baselines_from_store(scope)
+        if lb is not None:
+            if scope == "1h":
+                compute_league_baselines._last_global_m1h = float(lb["global"].get("m1h") or 0.55)
+            return lb
+    if scope == "ft":
+        return compute_league_baselines_ft(team_last_matches, stats_fn)
+    return compute_league_baselines(team_last_matches, stats_fn)
+
+# ---------- materijalizovani po-timski artefakti (profiles / strengths / micro) ----------
+# Artefakt tima zavisi od njegovog history-ja i (profiles/micro) od statistike tih mečeva → ključ je
+# najnoviji uključeni fixture_id + dubina history-ja + hash pokrivenosti statistikom (params kolona).
+# Ako se ništa od toga nije promenilo, artefakt se čita iz team_artifacts_store umesto da se računa.
+TEAM_ARTIFACTS_FROM_STORE = os.getenv("TEAM_ARTIFACTS_FROM_STORE", "1") == "1"
+TEAM_ARTIFACT_STATS = {"hits": 0, "computed": 0}
+_TEAM_ARTIFACT_STATS_LOCK = threading.Lock()
+
+def _team_history_head(matches) -> int:
+    """fixture_id najnovijeg meča u history-ju tima (0 ako nema)."""
+    best_dt, best_fid = "", 0
+    for m in matches or []:
+        if not isinstance(m, dict):
+            continue
+        fix = m.get('fixture') or {}
+        fid = fix.get('id')
+        if fid and (fix.get('date') or '') >= best_dt:
+            best_dt, best_fid = (fix.get('date') or ''), int(fid)
+    return best_fid
+
+def _artifact_encode(obj):
+    if isinstance(obj, datetime):
+        return {"__dt__": obj.isoformat()}
+    if isinstance(obj, dict):
+        return {k: _artifact_encode(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_artifact_encode(v) for v in obj]
+    return obj
+
+def _artifact_decode(obj):
+    if isinstance(obj, dict):
+        if len(obj) == 1 and "__dt__" in obj:
+            try:
+                return datetime.fromisoformat(obj["__dt__"])
+            except Exception:
+                return None
+        return {k: _artifact_decode(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_artifact_decode(v) for v in obj]
+    return obj
+
+def _history_fixture_ids(matches) -> list:
+    return [int((m.get('fixture') or {}).get('id')) for m in matches or []
+            if isinstance(m, dict) and (m.get('fixture') or {}).get('id')]
+
+def _team_artifact_keys(team_last_matches, params: str, uses_stats: bool) -> dict:
+    """{team_id: "params|n<dubina>|s<hash pokrivenosti>"} – menja se i kad stigne/osveži se statistika
+    nekog meča iz history-ja (ne samo kad tim dobije novi meč)."""
+    stats_ver = {}
+    if uses_stats:
+        from services.data_repo import fixture_stats_versions
+        stats_ver = fixture_stats_versions(
+            fid for ms in team_last_matches.values() for fid in _history_fixture_ids(ms))
+    keys = {}
+    for tid, ms in team_last_matches.items():
+        fids = _history_fixture_ids(ms)
+        cov = ""
+        if uses_stats:
+            cov = hashlib.sha1(",".join(f"{f}:{stats_ver[f]}" for f in sorted(fids) if f in stats_ver)
+                               .encode()).hexdigest()[:12]
+        keys[tid] = f"{params}|n{len(fids)}|s{cov}"
+    return keys
+
+def materialize_team_artifacts(kind: str, team_last_matches, compute_fn, params: str = "",
+                               uses_stats: bool = True) -> dict:
+    """
+    kind: npr. "profiles_1h" / "strengths_ft" / "micro_1h"
+    compute_fn(team_last_subset) -> {team_id: artefakt}; zove se samo za timove čiji se history
+    (najnoviji meč, dubina) ili – za uses_stats – pokrivenost statistikom promenila.
+    """
+    team_last_matches = team_last_matches or {}
+    if not TEAM_ARTIFACTS_FROM_STORE or not team_last_matches:
+        return compute_fn(team_last_matches)
+    from services.data_repo import load_team_artifacts, save_team_artifacts
+
+    heads = {tid: _team_history_head(ms) for tid, ms in team_last_matches.items()}
+    try:
+        keys = _team_artifact_keys(team_last_matches, params, uses_stats)
+        stored = load_team_artifacts(kind, heads.keys())
+    except Exception as e:
+        print(f"[team_artifacts] load failed ({kind}): {e}")
+        return compute_fn(team_last_matches)
+
+    out, stale = {}, {}
+    for tid, ms in team_last_matches.items():
+        hit = stored.get(int(tid))
+        if hit and hit[0] == heads[tid] and hit[1] == keys[tid]:
+            out[tid] = _artifact_decode(hit[2])
+        else:
+            stale[tid] = ms
+
+    if stale:
+        fresh = compute_fn(stale)
+        out.update(fresh)
+        try:
+            # compute_fn je možda povukao novu statistiku → ključ po stanju POSLE računanja
+            if uses_stats:
+                keys.update(_team_artifact_keys(stale, params, uses_stats))
+            save_team_artifacts(kind, [(tid, heads.get(tid, 0), keys[tid], _artifact_encode(obj))
+                                       for tid, obj in fresh.items() if tid in heads])
+        except Exception as e:
+            print(f"[team_artifacts] save failed ({kind}): {e}")
+
+    with _TEAM_ARTIFACT_STATS_LOCK:
+        TEAM_ARTIFACT_STATS["hits"] += len(team_last_matches) - len(stale)
+        TEAM_ARTIFACT_STATS["computed"] += len(stale)
+    print(f"[team_artifacts] {kind}: {len(team_last_matches) - len(stale)} iz store-a, {len(stale)} računato")
+    return out
+
 def compute_team_strengths(team_last_matches, lam=5.0, max_n=15, m_global=0.55):
     """Napad (1H score >=1) i def_allow (1H conceded >=1) po timu, EB shrink na m_global."""
     strengths = {}
@@ -5297,30 +6242,41 @@ def get_fixtures_in_time_range(start_dt, end_dt, from_hour=None, to_hour=None, n
     """
     Vraća listu API-like dict-ova (ne tuple/list redova), tako da ostatak koda
     (compute_* i analyze_*) bezbedno radi .get i ['fixture']['id'] itd.
-    DODANO: Filtrira po satima i liga whitelist-u.
+    Liga whitelist ide u SQL (`league_id IN (...)`, vidi league_whitelist_ids), satni filter radi nad
+    kickoff-om izvučenim u SQL-u – fixture_json se dekodira samo za redove koji prođu oba filtera.
     """
+    sql = ("SELECT id, league_id, JSON_UNQUOTE(JSON_EXTRACT(fixture_json, '$.fixture.date')) AS kickoff, "
+           "JSON_UNQUOTE(JSON_EXTRACT(fixture_json, '$.league.country')) AS league_country, "
+           "JSON_UNQUOTE(JSON_EXTRACT(fixture_json, '$.league.name')) AS league_name, fixture_json "
+           "FROM fixtures WHERE date BETWEEN %s AND %s")
+    params = [start_dt, end_dt]
+    allowed, unresolved = set(), set()
+    if STRICT_LEAGUE_FILTER:
+        allowed = league_whitelist_ids()
+        unresolved = league_whitelist_unresolved()
+        if not allowed and not unresolved:
+            return []
+        # nerazrešena imena (nova liga još nije u leagues) → bez SQL filtera, poređenje po imenu ispod
+        if not unresolved:
+            sql += f" AND league_id IN ({','.join(['%s'] * len(allowed))})"
+            params.extend(sorted(allowed))
+
     conn = get_db_connection()
     try:
         cur = conn.cursor(dictionary=True)  # dict cursor
-        cur.execute(
-            "SELECT id, date, league_id, team_home_id, team_away_id, stats_json, fixture_json "
-            "FROM fixtures WHERE date BETWEEN %s AND %s",
-            (start_dt, end_dt)
-        )
+        cur.execute(sql, tuple(params))
         fixtures: list[dict] = []
         for row in cur:
+            if unresolved and row.get("league_id") not in allowed \
+                    and _comp_key(row.get("league_country"), row.get("league_name")) not in unresolved:
+                continue
+            # Primeni time filtering ako je zadat (pre dekodiranja JSON-a)
+            if from_hour is not None or to_hour is not None:
+                kickoff = row.get("kickoff")
+                if kickoff and kickoff != "null" and not is_fixture_in_range(kickoff, start_dt, end_dt, from_hour, to_hour):
+                    continue
             fx = _coerce_fixture_row_to_api_dict(row)
             if fx and isinstance(fx, dict) and fx.get("fixture"):
-                # Primeni league filtering pre dodavanja u rezultat
-                if not is_valid_competition(fx):
-                    continue
-                
-                # Primeni time filtering ako je zadat
-                if from_hour is not None or to_hour is not None:
-                    fixture_date = (fx.get('fixture') or {}).get('date')
-                    if fixture_date and not is_fixture_in_range(fixture_date, start_dt, end_dt, from_hour, to_hour):
-                        continue
-                
                 fixtures.append(fx)
         return fixtures
     finally:
@@ -5549,78 +6505,90 @@ def store_fixture_data_in_db(fixtures):
     fixtures = valid_fixtures
 
     affected = 0
-    with DB_WRITE_LOCK:  # jedan “bulk” upis
-        conn = get_db_connection()
-        cur = None
-        try:
-            # START TRANSACTION umesto SQLite BEGIN IMMEDIATE
-            conn.start_transaction()  # MySQL-safe
+    conn = get_db_connection()
+    cur = None
+    try:
+        # START TRANSACTION umesto SQLite BEGIN IMMEDIATE
+        conn.start_transaction()  # MySQL-safe
 
-            cur = conn.cursor()
+        cur = conn.cursor()
 
-            sql = """
-                INSERT INTO fixtures
-                    (id, date, league_id, team_home_id, team_away_id, stats_json, fixture_json, updated_at)
-                VALUES
-                    (%s, %s, %s, %s, %s, %s, %s, NOW())
-                ON DUPLICATE KEY UPDATE
-                    date        = VALUES(date),
-                    league_id   = VALUES(league_id),
-                    team_home_id= VALUES(team_home_id),
-                    team_away_id= VALUES(team_away_id),
-                    stats_json  = VALUES(stats_json),
-                    fixture_json= VALUES(fixture_json),
-                    updated_at  = NOW()
-            """
-
-            rows = []
-            for fixture in fixtures:
-                # Bezbedna ekstrakcija
-                fx  = fixture.get('fixture') or {}
-                lg  = fixture.get('league')  or {}
-                tms = fixture.get('teams')   or {}
-                th  = (tms.get('home') or {})
-                ta  = (tms.get('away') or {})
-
-                fixture_id   = fx.get('id')
-                fixture_date = fx.get('date')  # očekuje se ISO string; MySQL ga prihvata kao DATETIME/VARCHAR po šemi
-                league_id    = lg.get('id')
-                team_home_id = th.get('id')
-                team_away_id = ta.get('id')
-
-                # NON-WRITE: čitanje statistika ako postoje u DB/kešu
-                stats = try_read_fixture_statistics(fixture_id)
-                stats_json   = json.dumps(stats, ensure_ascii=False, default=str) if stats else None
-                fixture_json = json.dumps(fixture, ensure_ascii=False, default=str)
-
-                rows.append((
-                    fixture_id, fixture_date, league_id, team_home_id, team_away_id,
-                    stats_json, fixture_json
-                ))
-
-            if rows:
-                cur.executemany(sql, rows)
-                affected = cur.rowcount or 0
+        # stats_json se ovde ne dira – puni ga sync_fixture_stats_json iz match_statistics (po fixture_id)
+        sql = """
+            INSERT INTO fixtures
+                (id, date, league_id, team_home_id, team_away_id, fixture_json, updated_at)
+            VALUES
+                (%s, %s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                date        = VALUES(date),
+                league_id   = VALUES(league_id),
+                team_home_id= VALUES(team_home_id),
+                team_away_id= VALUES(team_away_id),
+                fixture_json= VALUES(fixture_json),
+                updated_at  = NOW()
+        """
 
-            conn.commit()
+        rows = []
+        for fixture in fixtures:
+            # Bezbedna ekstrakcija
+            fx  = fixture.get('fixture') or {}
+            lg  = fixture.get('league')  or {}
+            tms = fixture.get('teams')   or {}
+            th  = (tms.get('home') or {})
+            ta  = (tms.get('away') or {})
+
+            fixture_id   = fx.get('id')
+            fixture_date = fx.get('date')  # očekuje se ISO string; MySQL ga prihvata kao DATETIME/VARCHAR po šemi
+            league_id    = lg.get('id')
+            team_home_id = th.get('id')
+            team_away_id = ta.get('id')
+
+            fixture_json = json.dumps(fixture, ensure_ascii=False, default=str)
+
+            rows.append((
+                fixture_id, fixture_date, league_id, team_home_id, team_away_id,
+                fixture_json
+            ))
+
+        if rows:
+            cur.executemany(sql, rows)
+            affected = cur.rowcount or 0
+
+        # teams/leagues dimenzije + stats_json (jedan JOIN) u istoj transakciji;
+        # dimenzije su pomoćne → njihova greška ne sme da obori upis fixtures
+        try:
+            upsert_dimensions(cur, fixtures)
         except Exception as e:
-            # Rolbek da ne ostavimo polu-upisane redove
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            # Propusti dalje – gornji sloj neka zaloguje
-            raise
-        finally:
-            try:
-                if cur is not None:
-                    cur.close()
-            except Exception:
-                pass
-            try:
-                conn.close()
-            except Exception:
-                pass
+            print(f"[store_fixture_data] dimension upsert failed: {e}")
+        sync_fixture_stats_json(cur, [r[0] for r in rows])
+
+        conn.commit()
+    except Exception as e:
+        # Rolbek da ne ostavimo polu-upisane redove
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        # Propusti dalje – gornji sloj neka zaloguje
+        raise
+    finally:
+        try:
+            if cur is not None:
+                cur.close()
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # match_facts samo kroz write-behind grupu "history"; flush → pozivalac ih odmah vidi u bazi
+    enqueue_match_facts(fixtures)
+    flush_writes("history")
+
+    # upsert_dimensions je možda upisao novu ligu → razreši whitelist imena odmah, ne posle retry-a
+    if league_whitelist_unresolved():
+        _resolve_league_whitelist_ids()
 
     # Opcionalno: log
     print(f"✅ Stored/updated {len(rows) if 'rows' in locals() else 0} fixtures in DB.")
@@ -5637,36 +6605,16 @@ def _fresh_cutoff_iso(hours: int) -> str:
     return (datetime.utcnow() - timedelta(hours=hours)).isoformat()
 
 def _history_missing(team_ids, last_n: int, ttl_h: int):
-    """vrati listu timova kojima fali friška istorija (team_history_cache)"""
-    cutoff = _fresh_cutoff_iso(ttl_h)
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # tabela možda ne postoji – napravi je benigno (kao u get_or_fetch_team_history)
-    with DB_WRITE_LOCK:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS team_history_cache (
-                team_id INTEGER,
-                last_n INTEGER,
-                data TEXT,
-                updated_at TEXT,
-                PRIMARY KEY (team_id, last_n)
-            )
-        """)
-        conn.commit()
-
+    """vrati listu timova kojima fali friška istorija (team_history_store ili match_facts)"""
+    team_ids = [t for t in team_ids if t]
+    fresh = teams_with_fresh_history(team_ids, last_n, ttl_h)
     missing = []
     for tid in team_ids:
-        cur.execute("SELECT updated_at FROM team_history_cache WHERE team_id=%s AND last_n=%s", (tid, last_n))
-        row = cur.fetchone()
-        if not row: 
-            missing.append(tid); 
+        if tid in fresh:
             continue
-        try:
-            if row["updated_at"] < cutoff:
-                missing.append(tid)
-        except Exception:
-            missing.append(tid)
-    conn.close()
+        if HISTORY_FROM_MATCH_FACTS and read_team_history_facts(tid, last_n, ttl_h) is not None:
+            continue
+        missing.append(tid)
     return missing
 
 def _h2h_missing(pairs, last_n: int, ttl_h: int):
@@ -5674,22 +6622,13 @@ def _h2h_missing(pairs, last_n: int, ttl_h: int):
     cutoff = _fresh_cutoff_iso(ttl_h)
     conn = get_db_connection()
     cur = conn.cursor()
-    with DB_WRITE_LOCK:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS h2h_cache (
-                team1_id INTEGER,
-                team2_id INTEGER,
-                last_n INTEGER,
-                data TEXT,
-                updated_at TEXT,
-                PRIMARY KEY (team1_id, team2_id, last_n)
-            )
-        """)
-        conn.commit()
 
     missing = []
     for a, b in pairs:
         x, y = sorted([a, b])
+        # lokalna arhiva (match_facts) pokriva par → API nije potreban
+        if HISTORY_FROM_MATCH_FACTS and read_h2h_facts(x, y, last_n, ttl_h) is not None:
+            continue
         cur.execute("SELECT updated_at FROM h2h_cache WHERE team1_id=%s AND team2_id=%s AND last_n=%s", (x, y, last_n))
         row = cur.fetchone()
         if not row:
@@ -5722,7 +6661,7 @@ async def api_prepare_day(request: Request, background_tasks: BackgroundTasks):
             session_id = payload.get('session_id', '')
         
         if session_id:
-            session_data = get_session(session_id)
+            session_data = await run_blocking(get_session, session_id)
             if session_data:
                 # Email is stored directly in session_data, not in session_data['user']
                 user_email = session_data.get('email')
@@ -5740,20 +6679,15 @@ async def api_prepare_day(request: Request, background_tasks: BackgroundTasks):
         else:
             d_local = date.fromisoformat(date_str)
 
-        # 0) sigurnosno: obezbedi šemu/tabele (idempotentno)
-        try:
-            create_all_tables()
-            ensure_model_outputs_table()
-            ensure_analysis_cache_table()
-            ensure_prepare_jobs_table()
-        except Exception as _schema_err:
-            print("schema ensure failed:", _schema_err)
-
+        # šema je primenjena na startup-u (services/schema.py) – ovde nema DDL-a
         # 1) napravi job u DB
-        job_id = create_prepare_job(d_local)
-
-        # 2) pokreni u pozadini preko FastAPI background task-a (pouzdanije od ručnog threada)
-        background_tasks.add_task(run_prepare_job, job_id, d_local.isoformat(), prewarm)
+        if PREPARE_DISPATCH == "inline":
+            job_id = await run_blocking(create_prepare_job, d_local, prewarm, "api-inline")
+            # 2) pokreni u pozadini preko FastAPI background task-a (pouzdanije od ručnog threada)
+            background_tasks.add_task(run_prepare_job, job_id, d_local.isoformat(), prewarm)
+        else:
+            # 2) samo enqueue – izvršava ga prepare_worker.py (SKIP LOCKED, heartbeat, retry)
+            job_id = await run_blocking(create_prepare_job, d_local, prewarm)
 
         # 3) odmah odgovori
         return JSONResponse(status_code=202, content={"ok": True, "job_id": job_id})
@@ -5764,7 +6698,7 @@ async def api_prepare_day(request: Request, background_tasks: BackgroundTasks):
         return JSONResponse(status_code=500, content={"ok": False, "error": "prepare_enqueue_failed", "detail": str(e)})
 
 @app.get("/api/prepare-day/status")
-async def api_prepare_day_status(job_id: str):
+def api_prepare_day_status(job_id: str):
     job = read_prepare_job(job_id)
     if not job:
         return JSONResponse(status_code=404, content={"ok": False, "error": "job not found"})
@@ -5776,6 +6710,63 @@ async def api_prepare_day_status(job_id: str):
         "result": job["result"]
     })
 
+@app.get("/api/prepare-day/events")
+async def api_prepare_day_events(request: Request, job_id: str | None = None):
+    """
+    SSE stream statusa prepare job-a (umesto polling-a).
+    - sa job_id: eventi tog job-a, stream se zatvara kad job završi
+    - bez job_id: globalni loader (bilo koji job), stream traje dok je klijent tu
+    """
+    sub = subscribe_prepare_events()
+
+    async def _read_db():
+        if not job_id:
+            return get_active_prepare_snapshot()  # globalni loader: snapshot iz memorije
+        return await run_blocking(read_prepare_job, job_id)
+
+    async def _stream():
+        try:
+            snap = _PREPARE_JOB_STATE.get(job_id) if job_id else None
+            if snap is None:
+                snap = await _read_db()
+            if job_id and not snap:
+                yield _sse_format({"job_id": job_id, "error": "job not found"}, name="missing")
+                return
+            payload = _prepare_event_payload(snap)
+            yield _sse_format(payload)
+            if job_id and payload["status"] in PREPARE_TERMINAL_STATUSES:
+                return
+
+            last_key = (payload["job_id"], payload["status"], payload["progress"], payload["detail"])
+            last_sent = last_db = time.monotonic()
+            while not await request.is_disconnected():
+                try:
+                    ev = await asyncio.wait_for(sub[1].get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    ev = None
+                now = time.monotonic()
+                if ev is None and now - last_db >= PREPARE_EVENTS_DB_RECHECK_SEC:
+                    # job možda radi u drugom workeru → jeftin SELECT umesto 100ms polling-a sa klijenta
+                    last_db = now
+                    ev = await _read_db() or ({"status": None} if not job_id else None)
+                if ev is not None and (not job_id or ev.get("job_id") == job_id):
+                    payload = _prepare_event_payload(ev)
+                    key = (payload["job_id"], payload["status"], payload["progress"], payload["detail"])
+                    if key != last_key:
+                        last_key = key
+                        last_sent = now
+                        yield _sse_format(payload)
+                    if job_id and payload["status"] in PREPARE_TERMINAL_STATUSES:
+                        return
+                if now - last_sent >= PREPARE_EVENTS_HEARTBEAT_SEC:
+                    last_sent = now
+                    yield ": ping\n\n"
+        finally:
+            unsubscribe_prepare_events(sub)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 def fetch_and_store_all_historical_data(fixtures, no_api: bool = False):
     # 1) last-30 po timu (sa kešom / no_api)
     all_team_matches = fetch_last_matches_for_teams(fixtures, last_n=DAY_PREFETCH_LAST_N, no_api=no_api)
@@ -5809,6 +6800,8 @@ def fetch_and_store_all_historical_data(fixtures, no_api: bool = False):
             h2h_results_all[h2h_key] = h2h
             insert_h2h_matches(a, b, h2h)
 
+    # barijera: h2h_cache/match_facts iz write-behind reda moraju biti u bazi pre čitanja (preload)
+    flush_writes("history")
     print("✅ Istorijski podaci povučeni i sačuvani (no_api=%s)." % no_api)
     return all_team_matches, h2h_results_all
 
@@ -6002,7 +6995,8 @@ def calculate_final_probability(
     fixture, team_last_matches, h2h_results, micro_db,
     league_baselines, team_strengths, team_profiles,
     extras: dict | None = None, no_api: bool = False,
-    market_odds_over05_1h: Optional[float] = None
+    market_odds_over05_1h: Optional[float] = None,
+    feature_cache: FeatureCache | None = None
 ):
     """
     Finalna vjerovatnoća za 1H Over 0.5.
@@ -6066,7 +7060,8 @@ def calculate_final_probability(
     
     # --- KRITIČNI FEATURE-I ---
     # Treba da uključimo 4 kritična feature-a u p_prior kalkulaciju
-    feats_temp = matchup_features_enhanced(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras)
+    feats_temp = get_matchup_features_1h(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras,
+                                        feature_cache=feature_cache)
     
     # 1. pace_da_total - tempo dangerous attacks
     pace_da_total = feats_temp.get("pace_da_total", 0.0)
@@ -6099,7 +7094,7 @@ def calculate_final_probability(
         p_prior = _inv_logit(_logit(p_prior) + inj_count_adj)
 
     # --- MICRO ---
-    feats = matchup_features_enhanced(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras)
+    feats = feats_temp  # isti ulazi → isti vektor, ne računaj ponovo
 
     # totals (za debug/UI)
     exp_sot_total = None
@@ -6194,7 +7189,8 @@ def calculate_final_probability_gg(
     fixture, team_last_matches, h2h_results, micro_db,
     league_baselines, team_strengths, team_profiles,
     extras: dict | None = None, no_api: bool = False,
-    market_odds_btts_1h: Optional[float] = None
+    market_odds_btts_1h: Optional[float] = None,
+    feature_cache: FeatureCache | None = None
 ):
     """
     Finalna vjerovatnoća za GG u 1. poluvremenu (oba tima daju gol).
@@ -6239,7 +7235,8 @@ def calculate_final_probability_gg(
     
     # --- KRITIČNI FEATURE-I ---
     # Treba da uključimo 4 kritična feature-a u p_prior kalkulaciju
-    feats_temp = matchup_features_enhanced(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras)
+    feats_temp = get_matchup_features_1h(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras,
+                                        feature_cache=feature_cache)
     
     # 1. pace_da_total - tempo dangerous attacks
     pace_da_total = feats_temp.get("pace_da_total", 0.0)
@@ -6272,7 +7269,7 @@ def calculate_final_probability_gg(
         p_prior = _inv_logit(_logit(p_prior) + inj_count_adj)
 
     # MICRO: p(home scores) i p(away scores) + korelacija
-    feats = matchup_features_enhanced(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras)
+    feats = feats_temp  # isti ulazi → isti vektor, ne računaj ponovo
     pH, _ = predict_team_scores1h_enhanced(fixture, feats, league_baselines, team_strengths, side='home')
     pA, _ = predict_team_scores1h_enhanced(fixture, feats, league_baselines, team_strengths, side='away')
 
@@ -6338,7 +7335,8 @@ def calculate_final_probability_over15(
     fixture, team_last_matches, h2h_results, micro_db,
     league_baselines, team_strengths, team_profiles,
     extras: dict | None = None, no_api: bool = False,
-    market_odds_over15_1h: Optional[float] = None
+    market_odds_over15_1h: Optional[float] = None,
+    feature_cache: FeatureCache | None = None
 ):
     """
     Finalna vjerovatnoća za 1H Over 1.5.
@@ -6401,7 +7399,8 @@ def calculate_final_probability_over15(
     
     # --- KRITIČNI FEATURE-I ---
     # Treba da uključimo 4 kritična feature-a u p_prior kalkulaciju
-    feats_temp = matchup_features_enhanced(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras)
+    feats_temp = get_matchup_features_1h(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras,
+                                        feature_cache=feature_cache)
     
     # 1. pace_da_total - tempo dangerous attacks
     pace_da_total = feats_temp.get("pace_da_total", 0.0)
@@ -6434,7 +7433,7 @@ def calculate_final_probability_over15(
         p_prior = _inv_logit(_logit(p_prior) + inj_count_adj)
 
     # MICRO: prvo p(≥1) kao u over05, pa u λ i p(≥2)
-    feats = matchup_features_enhanced(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras)
+    feats = feats_temp  # isti ulazi → isti vektor, ne računaj ponovo
     pH, _ = predict_team_scores1h_enhanced(fixture, feats, league_baselines, team_strengths, side='home')
     pA, _ = predict_team_scores1h_enhanced(fixture, feats, league_baselines, team_strengths, side='away')
 
@@ -6509,25 +7508,25 @@ def _select_existing_fixture_ids(fixture_ids):
     ids = [int(x) for x in set(fixture_ids) if x is not None]
     if not ids:
         return set()
+    flush_writes("stats")   # statistika iz reda (write-behind) se broji kao postojeća
     existing = set()
-    with DB_WRITE_LOCK:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        chunk = 900
-        for i in range(0, len(ids), chunk):
-            part = ids[i:i+chunk]
-            placeholders = ",".join(["%s"] * len(part))
-            cur.execute(f"SELECT fixture_id FROM match_statistics WHERE fixture_id IN ({placeholders})", tuple(part))
-            for (fid,) in cur.fetchall():
-                existing.add(int(fid))
-        conn.close()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    chunk = 900
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i+chunk]
+        placeholders = ",".join(["%s"] * len(part))
+        cur.execute(f"SELECT fixture_id FROM match_statistics WHERE fixture_id IN ({placeholders})", tuple(part))
+        for (fid,) in cur.fetchall():
+            existing.add(int(fid))
+    conn.close()
     return existing
 
 def prewarm_statistics_cache(team_last_matches: dict[int, list], max_workers: int = 2) -> dict:
     """
     Za sve istorijske mečeve koji se pominju u team_last_matches:
       - pronađi koje statistike fale u match_statistics
-      - povuci ih paralelno preko get_or_fetch_fixture_statistics (koji upisuje pod DB lock-om)
+      - povuci ih paralelno preko get_or_fetch_fixture_statistics (upis ide kroz write-behind red)
     Vraća mali rezime.
     """
     # 1) skupi sve fixture id-jeve
@@ -6565,48 +7564,248 @@ def prewarm_statistics_cache(team_last_matches: dict[int, list], max_workers: in
         for _ in as_completed(futures):
             pass
 
+    # barijera: sve povučene statistike su u match_statistics pre nego što ih analiza čita
+    flush_writes("stats")
     return {"queued": len(missing), "fetched": fetched, "errors": errors}
 
 # ------------------------- FINAL PIPELINE ---------------------------
-def analyze_fixtures(start_date: datetime, end_date: datetime, from_hour=None, to_hour=None,
-                     market: str = "1h_over05", no_api: bool = True,
-                     odds_over05_1h: float | None = None,
-                     odds_over15_1h: float | None = None,
-                     odds_btts_1h: float | None = None,
-                     preloaded_team_last: dict[int, list] | None = None,
-                     preloaded_h2h: dict[str, list] | None = None,
-                     preloaded_extras: dict[int, dict] | None = None):
+# ---------- opcioni paralelni scoring (process pool) ----------
+# Kad su ulazi preloadovani, per-fixture petlje su čist CPU → jedan core.
+# SCORING_WORKERS>1 uključuje process pool sa "spawn" (ili "forkserver") kontekstom – NE fork:
+# web proces ima thread-ove (write-behind, refresher, sweeper) i otvorene konekcije, a fork bi u child
+# preneo i zaključane lock-ove. Child zato ništa ne nasleđuje: score_fn je top-level funkcija
+# (pickle po imenu), a deljeni read-only ulazi (ctx: team_last, h2h, micro_db, baselines, strengths,
+# profiles, extras) se serijalizuju JEDNOM po child procesu kroz initializer; preko pipe-a posle
+# idu samo chunk-ovi fixtures i gotovi redovi.
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "0"))        # 0/1 = serijski (default)
+SCORING_CHUNK_SIZE = int(os.getenv("SCORING_CHUNK_SIZE", "16"))
+SCORING_WORKER_POOL_SIZE = os.getenv("SCORING_WORKER_POOL_SIZE", "2")  # MySQL pool po child procesu
+SCORING_START_METHOD = os.getenv("SCORING_START_METHOD", "spawn")       # "spawn" | "forkserver"
+
+_PARALLEL_SCORING_CTX: dict = {}
+LAST_SCORING_TIMINGS: dict[str, dict] = {}
+
+def _scoring_worker_init(score_fn, ctx):
+    # child je svež proces: mali sopstveni MySQL pool (pravi se lenjo pri prvoj konekciji) + ulazi
+    import mysql_database
+    os.environ["STATSFK_POOL_SIZE"] = SCORING_WORKER_POOL_SIZE
+    mysql_database._connection_pool = None
+    _PARALLEL_SCORING_CTX["score_fn"] = score_fn
+    _PARALLEL_SCORING_CTX["ctx"] = ctx
+
+def _score_chunk(args):
+    chunk_idx, chunk = args
+    score_fn, ctx = _PARALLEL_SCORING_CTX["score_fn"], _PARALLEL_SCORING_CTX["ctx"]
+    t0 = time.perf_counter()
+    rows = [r for r in (score_fn(ctx, fx) for fx in chunk) if r is not None]
+    return chunk_idx, rows, round(time.perf_counter() - t0, 3), os.getpid()
+
+def score_fixtures_parallel(label: str, fixtures: list, score_fn, ctx: dict, workers: int | None = None) -> list:
     """
-    Analiza mečeva u datom vremenskom opsegu.
-    - Ako je no_api=False: repo će po DANIMA osigurati da fixtures postoje u bazi (fetch + upis),
-      a zatim se sve ostalo (history/H2H/stats) čita on-demand kroz repo sloj.
-    - Ako je no_api=True: ništa se ne vuče sa API-ja; čita se samo ono što već postoji u bazi.
+    Primeni score_fn(ctx, fixture) -> dict|None na sve fixtures (score_fn mora biti top-level funkcija).
+    workers<=1 → serijski, isto kao ranije.
+    Inače: chunk-ovi po SCORING_CHUNK_SIZE u spawn/forkserver pool-u, rezultati spojeni redom chunk-ova
+    (isti redosled kao ulazni fixtures – kao serijski put).
+    Tajminzi po chunk-u idu u LAST_SCORING_TIMINGS[label].
     """
-    # 0) sanity za market
-    if market not in ACTIVE_MARKETS:
-        print(f"⚠️ Nepoznat market '{market}', koristim '1h_over05'")
-        market = "1h_over05"
+    fixtures = list(fixtures or [])
+    workers = SCORING_WORKERS if workers is None else int(workers)
+    t0 = time.perf_counter()
+
+    if workers <= 1 or len(fixtures) < 2:
+        rows = [r for r in (score_fn(ctx, fx) for fx in fixtures) if r is not None]
+        LAST_SCORING_TIMINGS[label] = {
+            "mode": "serial", "workers": 1, "fixtures": len(fixtures),
+            "elapsed_sec": round(time.perf_counter() - t0, 3), "chunks": [],
+        }
+        return rows
+
+    size = max(1, SCORING_CHUNK_SIZE)
+    chunks = [fixtures[i:i + size] for i in range(0, len(fixtures), size)]
+    by_chunk: dict[int, list] = {}
+    chunk_timings = []
+
+    method = SCORING_START_METHOD if SCORING_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+    mp_ctx = multiprocessing.get_context(method)
+    with mp_ctx.Pool(processes=min(workers, len(chunks)), initializer=_scoring_worker_init,
+                     initargs=(score_fn, ctx)) as pool:
+        for chunk_idx, rows, elapsed, pid in pool.imap_unordered(_score_chunk, list(enumerate(chunks))):
+            by_chunk[chunk_idx] = rows
+            chunk_timings.append({
+                "chunk": chunk_idx, "fixtures": len(chunks[chunk_idx]),
+                "rows": len(rows), "elapsed_sec": elapsed, "pid": pid,
+            })
 
-    # 1) Ako smijemo API, osiguraj da *po danima* imamo fixtures u DB (idempotentno)
-    if not no_api:
-        d_local = start_date.astimezone(USER_TZ).date()
-        end_local = end_date.astimezone(USER_TZ).date()
-        while d_local <= end_local:
-            try:
-                # ensure_day je idempotentno: povuče fixtures za taj dan i pripremi keševe
-                repo.ensure_day(
-                    d_local,
-                    last_n=DAY_PREFETCH_LAST_N,
-                    h2h_n=DAY_PREFETCH_H2H_N,
-                    prewarm_stats=False  # warming nije nužan; stats će se vući on-demand
-                )
-            except Exception as e:
-                print(f"ensure_day({d_local}) failed: {e}")
-            d_local += timedelta(days=1)
+    # redosled ulaza (chunk-ovi su uzastopni) – pozivaoci dobijaju isto što i serijski
+    merged = [r for idx in range(len(chunks)) for r in by_chunk.get(idx, [])]
 
-    # 2) Izvuci fixtures iz baze (DB-only) i filtriraj po satima/kompeticijama
-    fixtures = get_fixtures_in_time_range(start_date, end_date, from_hour, to_hour, no_api=True)
-    print(f"📅 Nađeno ukupno {len(fixtures)} mečeva u vremenskom opsegu.")
+    chunk_timings.sort(key=lambda c: c["chunk"])
+    LAST_SCORING_TIMINGS[label] = {
+        "mode": f"parallel:{method}", "workers": min(workers, len(chunks)), "fixtures": len(fixtures),
+        "elapsed_sec": round(time.perf_counter() - t0, 3), "chunks": chunk_timings,
+    }
+    print(f"⚡ [{label}] {len(fixtures)} fixtures / {len(chunks)} chunks / {workers} workers "
+          f"→ {LAST_SCORING_TIMINGS[label]['elapsed_sec']}s")
+    return merged
+
+def _score_fixture_1h(ctx: dict, fixture):
+    """Jedan meč za analyze_fixtures. Top-level (picklable za spawn pool); svi ulazi su u ctx."""
+    market, no_api = ctx["market"], ctx["no_api"]
+    team_last_matches, h2h_results, micro_db = ctx["team_last"], ctx["h2h"], ctx["micro_db"]
+    league_baselines, team_strengths, team_profiles = ctx["baselines"], ctx["strengths"], ctx["profiles"]
+    preloaded_extras = ctx["extras"]
+    odds_over05_1h, odds_over15_1h, odds_btts_1h = ctx["odds_over05_1h"], ctx["odds_over15_1h"], ctx["odds_btts_1h"]
+
+    home_id = fixture['teams']['home']['id']
+    away_id = fixture['teams']['away']['id']
+    a, b = sorted([home_id, away_id])
+    h2h_key = f"{a}-{b}"
+    # EXTRAS (ref/venue/weather/lineups/injuries)
+    if not isinstance(fixture, dict):
+        fixture = _coerce_fixture_row_to_api_dict(fixture) or {}
+    fid = int(((fixture.get('fixture') or {}).get('id') or 0))
+    if not fid:
+        return None
+    extras = (preloaded_extras or {}).get(fid) or build_extras_for_fixture(fixture, no_api=no_api)
+
+    # (a) istorijske % po marketu
+    if market == "gg1h":
+        team1_percent, team1_hits, team1_total = team_1h_gg_stats(team_last_matches.get(home_id, []))
+        team2_percent, team2_hits, team2_total = team_1h_gg_stats(team_last_matches.get(away_id, []))
+        h2h_percent,  h2h_hits,  h2h_total     = h2h_1h_gg_stats(h2h_results.get(h2h_key, []))
+    elif market == "1h_over15":
+        team1_percent, team1_hits, team1_total = team_1h_over15_stats(team_last_matches.get(home_id, []))
+        team2_percent, team2_hits, team2_total = team_1h_over15_stats(team_last_matches.get(away_id, []))
+        h2h_percent,  h2h_hits,  h2h_total     = h2h_1h_over15_stats(h2h_results.get(h2h_key, []))
+    else:  # "1h_over05" (default)
+        team1_percent, team1_hits, team1_total = team_1h_goal_stats(team_last_matches.get(home_id, []))
+        team2_percent, team2_hits, team2_total = team_1h_goal_stats(team_last_matches.get(away_id, []))
+        h2h_percent,  h2h_hits,  h2h_total     = h2h_1h_goal_stats(h2h_results.get(h2h_key, []))
+
+    # (b) mikro forma za UI
+    home_form = (micro_db.get(home_id) or {}).get("home") or {}
+    away_form = (micro_db.get(away_id) or {}).get("away") or {}
+
+    def _pct_or_none(x, cap):
+        try:
+            if x is None or cap in (None, 0):
+                return None
+            return round(min(100.0, max(0.0, (float(x) / float(cap)) * 100.0)), 2)
+        except Exception:
+            return None
+
+    SOT1H_CAP_LOC = float(globals().get("SOT1H_CAP", 6.0))   # per-team cap
+    DA1H_CAP_LOC  = float(globals().get("DA1H_CAP", 65.0))   # per-team cap
+
+    home_shots_pct   = _pct_or_none(home_form.get("sot1h_for"),  SOT1H_CAP_LOC)
+    away_shots_pct   = _pct_or_none(away_form.get("sot1h_for"),  SOT1H_CAP_LOC)
+    home_attacks_pct = _pct_or_none(home_form.get("da1h_for"),   DA1H_CAP_LOC)
+    away_attacks_pct = _pct_or_none(away_form.get("da1h_for"),   DA1H_CAP_LOC)
+
+    form_vals = []
+    if home_shots_pct is not None and home_attacks_pct is not None:
+        form_vals.append((home_shots_pct + home_attacks_pct) / 2.0)
+    if away_shots_pct is not None and away_attacks_pct is not None:
+        form_vals.append((away_shots_pct + away_attacks_pct) / 2.0)
+    form_percent = round(sum(form_vals)/len(form_vals), 2) if form_vals else 0.0
+
+    # (c) konačna vjerovatnoća (prosledi kvote po marketu)
+    if market == "gg1h":
+        final_percent, debug = calculate_final_probability_gg(
+            fixture, team_last_matches, h2h_results, micro_db,
+            league_baselines, team_strengths, team_profiles,
+            extras=extras, no_api=no_api,
+            market_odds_btts_1h=odds_btts_1h, feature_cache=ctx.get("feature_cache")
+        )
+    elif market == "1h_over15":
+        final_percent, debug = calculate_final_probability_over15(
+            fixture, team_last_matches, h2h_results, micro_db,
+            league_baselines, team_strengths, team_profiles,
+            extras=extras, no_api=no_api,
+            market_odds_over15_1h=odds_over15_1h, feature_cache=ctx.get("feature_cache")
+        )
+    else:  # "1h_over05"
+        final_percent, debug = calculate_final_probability(
+            fixture, team_last_matches, h2h_results, micro_db,
+            league_baselines, team_strengths, team_profiles,
+            extras=extras, no_api=no_api,
+            market_odds_over05_1h=odds_over05_1h, feature_cache=ctx.get("feature_cache")
+        )
+
+    # (d) paket za UI
+    return {
+        "fixture_id": int((fixture.get('fixture') or {}).get('id')),
+        "kickoff":    (fixture.get('fixture') or {}).get('date'),  # ISO datetime, npr. "2025-08-29T18:30:00+00:00"
+
+        "debug": debug,
+        "league": fixture['league']['name'],
+        "team1": fixture['teams']['home']['name'],
+        "team2": fixture['teams']['away']['name'],
+        "team1_full": fixture['teams']['home']['name'],
+        "team2_full": fixture['teams']['away']['name'],
+
+        "team1_percent": team1_percent,
+        "team2_percent": team2_percent,
+        "team1_hits": team1_hits, "team1_total": team1_total,
+        "team2_hits": team2_hits, "team2_total": team2_total,
+
+        "h2h_percent": h2h_percent,
+        "h2h_hits": h2h_hits, "h2h_total": h2h_total,
+
+        "home_shots_percent":   home_shots_pct,
+        "home_attacks_percent": home_attacks_pct,
+        "home_shots_used":      home_form.get('used_sot', 0),
+        "home_attacks_used":    home_form.get('used_da', 0),
+
+        "away_shots_percent":   away_shots_pct,
+        "away_attacks_percent": away_attacks_pct,
+        "away_shots_used":      away_form.get('used_sot', 0),
+        "away_attacks_used":    away_form.get('used_da', 0),
+
+        "form_percent": form_percent,
+        "final_percent": final_percent,
+    }
+
+def analyze_fixtures(start_date: datetime, end_date: datetime, from_hour=None, to_hour=None,
+                     market: str = "1h_over05", no_api: bool = True,
+                     odds_over05_1h: float | None = None,
+                     odds_over15_1h: float | None = None,
+                     odds_btts_1h: float | None = None,
+                     preloaded_team_last: dict[int, list] | None = None,
+                     preloaded_h2h: dict[str, list] | None = None,
+                     preloaded_extras: dict[int, dict] | None = None,
+                     feature_cache: FeatureCache | None = None):
+    """
+    Analiza mečeva u datom vremenskom opsegu.
+    - Ako je no_api=False: repo će po DANIMA osigurati da fixtures postoje u bazi (fetch + upis),
+      a zatim se sve ostalo (history/H2H/stats) čita on-demand kroz repo sloj.
+    - Ako je no_api=True: ništa se ne vuče sa API-ja; čita se samo ono što već postoji u bazi.
+    """
+    # 0) sanity za market
+    if market not in ACTIVE_MARKETS:
+        print(f"⚠️ Nepoznat market '{market}', koristim '1h_over05'")
+        market = "1h_over05"
+
+    # 1) Ako smijemo API, osiguraj da *po danima* imamo fixtures u DB (idempotentno)
+    if not no_api:
+        d_local = start_date.astimezone(USER_TZ).date()
+        end_local = end_date.astimezone(USER_TZ).date()
+        while d_local <= end_local:
+            try:
+                # ensure_day je idempotentno: povuče fixtures za taj dan i pripremi keševe
+                repo.ensure_day(
+                    d_local,
+                    last_n=DAY_PREFETCH_LAST_N,
+                    h2h_n=DAY_PREFETCH_H2H_N,
+                    prewarm_stats=False  # warming nije nužan; stats će se vući on-demand
+                )
+            except Exception as e:
+                print(f"ensure_day({d_local}) failed: {e}")
+            d_local += timedelta(days=1)
+
+    # 2) Izvuci fixtures iz baze (DB-only) i filtriraj po satima/kompeticijama
+    fixtures = get_fixtures_in_time_range(start_date, end_date, from_hour, to_hour, no_api=True)
+    print(f"📅 Nađeno ukupno {len(fixtures)} mečeva u vremenskom opsegu.")
     # Fallback: ako nema ničega u DB i korisnik je tražio DB-only (no_api=True),
     # pokušaj da napuniš dan(e) pa ponovo čitaj iz DB.
     if not fixtures and no_api:
@@ -6649,186 +7848,306 @@ def analyze_fixtures(start_date: datetime, end_date: datetime, from_hour=None, t
     # 4) League baselines & team strengths/profiles (stats_fn kroz repo)
     stats_fn = (lambda fid: repo.get_fixture_stats(fid, no_api=no_api))
 
-    league_baselines = compute_league_baselines(team_last_matches, stats_fn)
-    team_strengths = compute_team_strengths(
-        team_last_matches,
-        lam=5.0,
-        max_n=15,
-        m_global=(league_baselines.get('global') or {}).get('m1h', 0.55),
+    league_baselines = get_league_baselines(team_last_matches, stats_fn, scope="1h")
+    # (materijalizovano po timu: računa se samo za timove sa novim mečom u history-ju)
+    m_global_1h = (league_baselines.get('global') or {}).get('m1h', 0.55)
+    team_strengths = materialize_team_artifacts(
+        "strengths_1h", team_last_matches,
+        lambda tl: compute_team_strengths(tl, lam=5.0, max_n=15, m_global=m_global_1h),
+        params=f"m={m_global_1h:.4f}", uses_stats=False,
+    )
+    team_profiles = materialize_team_artifacts(
+        "profiles_1h", team_last_matches,
+        lambda tl: compute_team_profiles(tl, stats_fn, lam=5.0, max_n=15),
     )
-    team_profiles = compute_team_profiles(team_last_matches, stats_fn, lam=5.0, max_n=15)
 
     # 5) Mikro forma (SOT/DA/POS agregati)
-    micro_db = build_micro_db(team_last_matches, stats_fn)
+    micro_db = materialize_team_artifacts("micro_1h", team_last_matches, lambda tl: build_micro_db(tl, stats_fn))
+
+    # 6) Per-fixture obračun za traženi market (serijski ili u process pool-u, SCORING_WORKERS)
+    ctx = {
+        "market": market, "no_api": no_api,
+        "team_last": team_last_matches, "h2h": h2h_results, "micro_db": micro_db,
+        "baselines": league_baselines, "strengths": team_strengths, "profiles": team_profiles,
+        "extras": preloaded_extras or {},
+        "odds_over05_1h": odds_over05_1h, "odds_over15_1h": odds_over15_1h, "odds_btts_1h": odds_btts_1h,
+        "feature_cache": feature_cache,
+    }
+    results = score_fixtures_parallel(f"analyze:{market}", fixtures, _score_fixture_1h, ctx)
 
-    # 6) Per-fixture obračun za traženi market
-    results = []
-    for fixture in fixtures:
-        home_id = fixture['teams']['home']['id']
-        away_id = fixture['teams']['away']['id']
-        a, b = sorted([home_id, away_id])
-        h2h_key = f"{a}-{b}"
-        # EXTRAS (ref/venue/weather/lineups/injuries)
-        if not isinstance(fixture, dict):
-            fixture = _coerce_fixture_row_to_api_dict(fixture) or {}
-        fid = int(((fixture.get('fixture') or {}).get('id') or 0))
+    return results
+
+# ------------------------- BATCH SCORING (NumPy) ---------------------------
+# Skalarni kalkulatori ostaju referenca. Batch put sklapa feature matricu dana
+# (jedan red po meču) i fuziju prior ⊕ micro, logit korekcije, rho i cup multiplier
+# radi kao NumPy operacije nad kolonama (models/batch_scoring.py).
+
+def _num_or_nan(x) -> float:
+    try:
+        return float("nan") if x is None else float(x)
+    except Exception:
+        return float("nan")
+
+def _batch_row_1h(market, fixture, team_last_matches, h2h_results, micro_db,
+                  league_baselines, team_strengths, team_profiles,
+                  extras: dict | None = None, no_api: bool = False,
+                  feature_cache: FeatureCache | None = None) -> dict:
+    """Skalarni ulazi za jedan meč (1H marketi) — isti izvori kao calculate_final_probability*."""
+    home_id = ((fixture.get('teams') or {}).get('home') or {}).get('id')
+    away_id = ((fixture.get('teams') or {}).get('away') or {}).get('id')
+    a, b = sorted([home_id, away_id])
+    h2h_list = h2h_results.get(f"{a}-{b}", [])
+    base = _league_base_for_fixture(fixture, league_baselines)
+
+    if market == "gg1h":
+        _, h_home, w_home = team_1h_gg_stats(team_last_matches.get(home_id, []))
+        _, h_away, w_away = team_1h_gg_stats(team_last_matches.get(away_id, []))
+        _, h_h2h,  w_h2h  = h2h_1h_gg_stats(h2h_list)
+        p_minute, fts_cs_adj = None, 0.0   # GG ne koristi minute-bucket ni FTS/CS
+    else:
+        if market == "1h_over15":
+            _, h_home, w_home = _weighted_match_over15_rate(team_last_matches.get(home_id, []), lam=5.0, max_n=15)
+            _, h_away, w_away = _weighted_match_over15_rate(team_last_matches.get(away_id, []), lam=5.0, max_n=15)
+            _, h_h2h,  w_h2h  = _weighted_h2h_over15_rate(h2h_list, lam=4.0, max_n=10)
+        else:
+            _, h_home, w_home = _weighted_match_over05_rate(team_last_matches.get(home_id, []), lam=5.0, max_n=15)
+            _, h_away, w_away = _weighted_match_over05_rate(team_last_matches.get(away_id, []), lam=5.0, max_n=15)
+            _, h_h2h,  w_h2h  = _weighted_h2h_over05_rate(h2h_list, lam=4.0, max_n=10)
+        p_minute, _ = _prior_from_minute_buckets(repo, fixture, no_api=no_api)
+        fts_cs_adj = _fts_cs_form_coach_adj(repo, fixture, no_api=no_api)
+
+    form_adj = _calculate_form_adjustment(fixture, team_last_matches, no_api=no_api)
+    coach_adj = _calculate_coach_adjustment(fixture, no_api=no_api)
+
+    feats = get_matchup_features_1h(fixture, team_profiles, league_baselines, micro_db=micro_db, extras=extras,
+                                        feature_cache=feature_cache)
+    p_home_goal, _ = predict_team_scores1h_enhanced(fixture, feats, league_baselines, team_strengths, side='home')
+    p_away_goal, _ = predict_team_scores1h_enhanced(fixture, feats, league_baselines, team_strengths, side='away')
+
+    h_form = (micro_db.get(home_id) or {}).get("home") or {}
+    a_form = (micro_db.get(away_id) or {}).get("away") or {}
+    used = (h_form.get('used_sot',0) + a_form.get('used_sot',0) +
+            h_form.get('used_da',0)  + a_form.get('used_da',0))
+    if market != "gg1h":
+        used += h_form.get('used_pos',0) + a_form.get('used_pos',0)
+    effn_micro = max(1.0, used / 2.0 + (team_profiles.get(home_id,{}).get('eff_n',0) +
+                                        team_profiles.get(away_id,{}).get('eff_n',0))/4.0)
+
+    lgname_raw = ((fixture.get('league') or {}).get('name') or '')
+    is_cup = _is_cup(lgname_raw) or ((fixture.get('league') or {}).get('type','').lower()=='cup')
+
+    return {
+        "m1h": base["m1h"],
+        "mu_da1h": base.get("mu_da1h", 0.0) or 0.0,
+        "mu_sot1h": base["mu_sot1h"] or 0.0,
+        "sd_sot1h": base["sd_sot1h"] or 1.0,
+        "h_home": h_home or 0.0, "w_home": w_home or 0.0,
+        "h_away": h_away or 0.0, "w_away": w_away or 0.0,
+        "h_h2h": h_h2h or 0.0,   "w_h2h": w_h2h or 0.0,
+        "p_minute": _num_or_nan(p_minute),
+        "fts_cs_adj": fts_cs_adj or 0.0,
+        "form_adj": form_adj or 0.0,
+        "coach_adj": coach_adj or 0.0,
+        "pace_da_total": feats.get("pace_da_total", 0.0) or 0.0,
+        "lineups_have": 1.0 if feats.get("lineups_have", False) else 0.0,
+        "lineups_fw_count": _num_or_nan(feats.get("lineups_fw_count")),
+        "inj_count": _num_or_nan(feats.get("inj_count")),
+        "pace_sot_total": _num_or_nan(feats.get("pace_sot_total")),
+        "tier_gap_home": feats.get("tier_gap_home") or 0.0,
+        "p_home_goal": p_home_goal,
+        "p_away_goal": p_away_goal,
+        "effn_micro": effn_micro,
+        "str_effn": (team_strengths.get(home_id,{}).get('eff_n',0)) + (team_strengths.get(away_id,{}).get('eff_n',0)),
+        "is_cup": 1.0 if is_cup else 0.0,
+    }
+
+def _batch_row_ft(fixture, team_last_matches, h2h_results, micro_db_ft,
+                  league_baselines_ft, team_strengths_ft, team_profiles_ft,
+                  extras: dict | None = None, no_api: bool = False,
+                  feature_cache: FeatureCache | None = None) -> dict:
+    """Skalarni ulazi za jedan meč (FT Over 1.5) — isti izvori kao calculate_final_probability_ft_over15."""
+    home_id = ((fixture.get('teams') or {}).get('home') or {}).get('id')
+    away_id = ((fixture.get('teams') or {}).get('away') or {}).get('id')
+    a, b = sorted([home_id, away_id])
+    base = _league_base_ft_for_fixture(fixture, league_baselines_ft)
+
+    _, h_home, w_home = team_ft_over15_stats(team_last_matches.get(home_id, []))
+    _, h_away, w_away = team_ft_over15_stats(team_last_matches.get(away_id, []))
+    _, h_h2h,  w_h2h  = h2h_ft_over15_stats(h2h_results.get(f"{a}-{b}", []))
+
+    p_minute, _ = _minute_bucket_prior_ft(repo, fixture, no_api=no_api)
+    fts_cs_adj = _fts_cs_form_coach_adj(repo, fixture, no_api=no_api)
+    form_adj = _calculate_form_adjustment(fixture, team_last_matches, no_api=no_api)
+    coach_adj = _calculate_coach_adjustment(fixture, no_api=no_api)
+
+    feats = get_matchup_features_ft(fixture, team_profiles_ft, league_baselines_ft, micro_db_ft=micro_db_ft, extras=extras,
+                                        feature_cache=feature_cache)
+    lam_h, _ = predict_team_scores_ft_enhanced(fixture, feats, league_baselines_ft, team_strengths_ft, side='home')
+    lam_a, _ = predict_team_scores_ft_enhanced(fixture, feats, league_baselines_ft, team_strengths_ft, side='away')
+
+    return {
+        "m2p": base["m2p"],
+        "mu_da_ft": _league_base_for_fixture(fixture, league_baselines_ft).get("mu_da_ft", 0.0) or 0.0,
+        "h_home": h_home or 0.0, "w_home": w_home or 0.0,
+        "h_away": h_away or 0.0, "w_away": w_away or 0.0,
+        "h_h2h": h_h2h or 0.0,   "w_h2h": w_h2h or 0.0,
+        "p_minute": _num_or_nan(p_minute),
+        "fts_cs_adj": fts_cs_adj or 0.0,
+        "form_adj": form_adj or 0.0,
+        "coach_adj": coach_adj or 0.0,
+        "pace_da_total": feats.get("pace_da_total", 0.0) or 0.0,
+        "lineups_have": 1.0 if feats.get("lineups_have", False) else 0.0,
+        "lineups_fw_count": _num_or_nan(feats.get("lineups_fw_count")),
+        "inj_count": _num_or_nan(feats.get("inj_count")),
+        "lam_home": lam_h,
+        "lam_away": lam_a,
+        "coverage": (feats.get("cov_sot",1.0) + feats.get("cov_da",1.0) + feats.get("cov_pos",1.0))/3.0,
+    }
+
+def _rows_to_columns(rows: list[dict]) -> dict[str, np.ndarray]:
+    if not rows:
+        return {}
+    return {k: np.array([r[k] for r in rows], dtype=float) for k in rows[0].keys()}
+
+def score_fixtures_batch(market: str, fixtures, team_last_matches, h2h_results, micro_db,
+                         league_baselines, team_strengths, team_profiles,
+                         extras_map: dict[int, dict] | None = None, no_api: bool = True,
+                         odds: float | None = None, feature_cache: FeatureCache | None = None) -> dict[int, float]:
+    """
+    Batch ekvivalent petlje iz analyze_fixtures / compute_ft_over15_for_range.
+    Vraća {fixture_id: final} — final_percent (0..100) za 1H markete, verovatnoća (0..1) za ft_over15.
+    Za ft_over15 se prosleđuju FT ulazi (micro_db_ft, league_baselines_ft, ...).
+    """
+    fids, rows = [], []
+    for fx in fixtures or []:
+        fid = int(((fx.get('fixture') or {}).get('id') or 0))
         if not fid:
             continue
-        extras = (preloaded_extras or {}).get(fid) or build_extras_for_fixture(fixture, no_api=no_api)
-
-        # (a) istorijske % po marketu
-        if market == "gg1h":
-            team1_percent, team1_hits, team1_total = team_1h_gg_stats(team_last_matches.get(home_id, []))
-            team2_percent, team2_hits, team2_total = team_1h_gg_stats(team_last_matches.get(away_id, []))
-            h2h_percent,  h2h_hits,  h2h_total     = h2h_1h_gg_stats(h2h_results.get(h2h_key, []))
-        elif market == "1h_over15":
-            team1_percent, team1_hits, team1_total = team_1h_over15_stats(team_last_matches.get(home_id, []))
-            team2_percent, team2_hits, team2_total = team_1h_over15_stats(team_last_matches.get(away_id, []))
-            h2h_percent,  h2h_hits,  h2h_total     = h2h_1h_over15_stats(h2h_results.get(h2h_key, []))
-        else:  # "1h_over05" (default)
-            team1_percent, team1_hits, team1_total = team_1h_goal_stats(team_last_matches.get(home_id, []))
-            team2_percent, team2_hits, team2_total = team_1h_goal_stats(team_last_matches.get(away_id, []))
-            h2h_percent,  h2h_hits,  h2h_total     = h2h_1h_goal_stats(h2h_results.get(h2h_key, []))
-
-        # (b) mikro forma za UI
-        home_form = (micro_db.get(home_id) or {}).get("home") or {}
-        away_form = (micro_db.get(away_id) or {}).get("away") or {}
-
-        def _pct_or_none(x, cap):
-            try:
-                if x is None or cap in (None, 0):
-                    return None
-                return round(min(100.0, max(0.0, (float(x) / float(cap)) * 100.0)), 2)
-            except Exception:
-                return None
+        extras = (extras_map or {}).get(fid) or build_extras_for_fixture(fx, no_api=no_api)
+        if market == "ft_over15":
+            rows.append(_batch_row_ft(fx, team_last_matches, h2h_results, micro_db,
+                                      league_baselines, team_strengths, team_profiles,
+                                      extras=extras, no_api=no_api, feature_cache=feature_cache))
+        else:
+            rows.append(_batch_row_1h(market, fx, team_last_matches, h2h_results, micro_db,
+                                      league_baselines, team_strengths, team_profiles,
+                                      extras=extras, no_api=no_api, feature_cache=feature_cache))
+        fids.append(fid)
+    if not rows:
+        return {}
 
-        SOT1H_CAP_LOC = float(globals().get("SOT1H_CAP", 6.0))   # per-team cap
-        DA1H_CAP_LOC  = float(globals().get("DA1H_CAP", 65.0))   # per-team cap
-
-        home_shots_pct   = _pct_or_none(home_form.get("sot1h_for"),  SOT1H_CAP_LOC)
-        away_shots_pct   = _pct_or_none(away_form.get("sot1h_for"),  SOT1H_CAP_LOC)
-        home_attacks_pct = _pct_or_none(home_form.get("da1h_for"),   DA1H_CAP_LOC)
-        away_attacks_pct = _pct_or_none(away_form.get("da1h_for"),   DA1H_CAP_LOC)
-
-        form_vals = []
-        if home_shots_pct is not None and home_attacks_pct is not None:
-            form_vals.append((home_shots_pct + home_attacks_pct) / 2.0)
-        if away_shots_pct is not None and away_attacks_pct is not None:
-            form_vals.append((away_shots_pct + away_attacks_pct) / 2.0)
-        form_percent = round(sum(form_vals)/len(form_vals), 2) if form_vals else 0.0
-
-        # (c) konačna vjerovatnoća (prosledi kvote po marketu)
-        if market == "gg1h":
-            final_percent, debug = calculate_final_probability_gg(
-                fixture, team_last_matches, h2h_results, micro_db,
-                league_baselines, team_strengths, team_profiles,
-                extras=extras, no_api=no_api,
-                market_odds_btts_1h=odds_btts_1h
-            )
-        elif market == "1h_over15":
-            final_percent, debug = calculate_final_probability_over15(
-                fixture, team_last_matches, h2h_results, micro_db,
-                league_baselines, team_strengths, team_profiles,
-                extras=extras, no_api=no_api,
-                market_odds_over15_1h=odds_over15_1h
-            )
-        else:  # "1h_over05"
-            final_percent, debug = calculate_final_probability(
-                fixture, team_last_matches, h2h_results, micro_db,
-                league_baselines, team_strengths, team_profiles,
-                extras=extras, no_api=no_api,
-                market_odds_over05_1h=odds_over05_1h
-            )
+    cols = _rows_to_columns(rows)
+    if market == "ft_over15":
+        out = batch_scoring.score_ft_over15(cols, WEIGHTS_FT, odds=odds, alpha=ALPHA_MODEL,
+                                            calibration=CALIBRATION_FT)
+    else:
+        scorer = batch_scoring.MARKET_SCORERS.get(market)
+        if scorer is None:
+            raise ValueError(f"batch scoring: nepoznat market {market!r}")
+        out = scorer(cols, WEIGHTS, odds=odds, alpha=ALPHA_MODEL,
+                     cup_mult=float(globals().get('CUP_MOTIVATION_MULT', 1.0)))
+    return {fid: float(v) for fid, v in zip(fids, out.tolist())}
+
+def check_batch_parity(start_dt: datetime, end_dt: datetime, markets=None, tol: float = 1e-6) -> dict:
+    """
+    Parity provera: isti ulazi kroz skalarni kalkulator i kroz score_fixtures_batch,
+    vrati max |razlika| i listu fixture_id-jeva iznad tolerancije (DB-only).
+    """
+    markets = list(markets or ["1h_over05", "1h_over15", "gg1h", "ft_over15"])
+    preload = prepare_inputs_for_range(start_dt, end_dt)
+    fixtures = preload["fixtures"]
+    team_last, h2h_all, extras_map = preload["team_last"], preload["h2h"], preload["extras"]
+    if not fixtures:
+        return {"fixtures": 0, "markets": {}}
+
+    stats_fn = (lambda fid: repo.get_fixture_stats(fid, no_api=True))
+    lb = get_league_baselines(team_last, stats_fn, scope="1h")
+    ts = compute_team_strengths(team_last, lam=5.0, max_n=15, m_global=(lb.get('global') or {}).get('m1h', 0.55))
+    tp = compute_team_profiles(team_last, stats_fn, lam=5.0, max_n=15)
+    mdb = build_micro_db(team_last, stats_fn)
+
+    lb_ft = tp_ft = ts_ft = mdb_ft = None
+    if "ft_over15" in markets:
+        lb_ft = get_league_baselines(team_last, get_fixture_statistics_cached_only, scope="ft")
+        tp_ft = compute_team_profiles_ft(team_last, stats_fn=get_fixture_statistics_cached_only)
+        ts_ft = compute_team_strengths_ft(team_last, m_global=(lb_ft["global"]["m2p"]*0.9 + 0.25))
+        mdb_ft = build_micro_db_ft(team_last, stats_fn=get_fixture_statistics_cached_only)
+
+    scalar_fns = {
+        "1h_over05": calculate_final_probability,
+        "1h_over15": calculate_final_probability_over15,
+        "gg1h": calculate_final_probability_gg,
+    }
+    report = {}
+    # sopstveni keš ove provere (ne dira keš prepare job-a koji možda radi paralelno)
+    feature_cache = FeatureCache()
+    for mk in markets:
+        if mk == "ft_over15":
+            args = (team_last, h2h_all, mdb_ft, lb_ft, ts_ft, tp_ft)
+        else:
+            args = (team_last, h2h_all, mdb, lb, ts, tp)
 
-        # (d) paket za UI
-        results.append({
-            "fixture_id": int((fixture.get('fixture') or {}).get('id')),
-            "kickoff":    (fixture.get('fixture') or {}).get('date'),  # ISO datetime, npr. "2025-08-29T18:30:00+00:00"
-
-            "debug": debug,
-            "league": fixture['league']['name'],
-            "team1": fixture['teams']['home']['name'],
-            "team2": fixture['teams']['away']['name'],
-            "team1_full": fixture['teams']['home']['name'],
-            "team2_full": fixture['teams']['away']['name'],
-
-            "team1_percent": team1_percent,
-            "team2_percent": team2_percent,
-            "team1_hits": team1_hits, "team1_total": team1_total,
-            "team2_hits": team2_hits, "team2_total": team2_total,
-
-            "h2h_percent": h2h_percent,
-            "h2h_hits": h2h_hits, "h2h_total": h2h_total,
-
-            "home_shots_percent":   home_shots_pct,
-            "home_attacks_percent": home_attacks_pct,
-            "home_shots_used":      home_form.get('used_sot', 0),
-            "home_attacks_used":    home_form.get('used_da', 0),
-
-            "away_shots_percent":   away_shots_pct,
-            "away_attacks_percent": away_attacks_pct,
-            "away_shots_used":      away_form.get('used_sot', 0),
-            "away_attacks_used":    away_form.get('used_da', 0),
-
-            "form_percent": form_percent,
-            "final_percent": final_percent,
-        })
+        t0 = time.perf_counter()
+        batch = score_fixtures_batch(mk, fixtures, *args, extras_map=extras_map, no_api=True,
+                                     feature_cache=feature_cache)
+        t_batch = time.perf_counter() - t0
 
-    return results
+        t0 = time.perf_counter()
+        diffs, mismatches = [], []
+        for fx in fixtures:
+            fid = int(((fx.get('fixture') or {}).get('id') or 0))
+            if not fid or fid not in batch:
+                continue
+            ex = extras_map.get(fid) or build_extras_for_fixture(fx, no_api=True)
+            if mk == "ft_over15":
+                p_ref, _ = calculate_final_probability_ft_over15(fx, *args, extras=ex, no_api=True,
+                                                                 feature_cache=feature_cache)
+            else:
+                p_ref, _ = scalar_fns[mk](fx, *args, extras=ex, no_api=True, feature_cache=feature_cache)
+            d = abs(float(p_ref) - batch[fid])
+            diffs.append(d)
+            if d > tol:
+                mismatches.append(fid)
+        t_scalar = time.perf_counter() - t0
+
+        report[mk] = {
+            "n": len(diffs),
+            "max_abs_diff": max(diffs) if diffs else 0.0,
+            "mismatches": mismatches[:50],
+            "ok": not mismatches,
+            "batch_sec": round(t_batch, 3),
+            "scalar_sec": round(t_scalar, 3),
+        }
+    return {"fixtures": len(fixtures), "tol": tol, "markets": report}
+
+@app.post("/admin/batch-parity")
+def admin_batch_parity(date_str: str | None = None, tol: float = 1e-6):
+    d = datetime.now(USER_TZ).date() if not date_str else date.fromisoformat(date_str)
+    sdt, edt = _day_bounds_utc(d)
+    res = check_batch_parity(sdt, edt, tol=tol)
+    return JSONResponse(content={"ok": all(m["ok"] for m in res["markets"].values()), "day": d.isoformat(), **res})
 
 @app.get("/api/global-loader-status")
 async def api_global_loader_status():
-    """API endpoint za proveru statusa globalnog loadera"""
+    """API endpoint za proveru statusa globalnog loadera (čisto čitanje iz memorije)"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
-        # Prvo očisti zastarele job-ove (starije od 10 minuta)
-        cur.execute("""
-            UPDATE prepare_jobs 
-            SET status = 'error', detail = 'Job timeout - automatically cancelled'
-            WHERE status IN ('running', 'queued')
-            AND created_at < DATE_SUB(NOW(), INTERVAL 10 MINUTE)
-        """)
-        if cur.rowcount > 0:
-            print(f"🧹 [GLOBAL LOADER] Cleaned up {cur.rowcount} stale jobs")
-        
-        # Proveri da li postoji aktivan prepare job (ne stariji od 1 sata)
-        cur.execute("""
-            SELECT status, progress, detail, created_at
-            FROM prepare_jobs 
-            WHERE status IN ('running', 'queued')
-            AND created_at > DATE_SUB(NOW(), INTERVAL 1 HOUR)
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """)
-        
-        job = cur.fetchone()
-        conn.commit()
-        conn.close()
-        
-        print(f"🔍 [GLOBAL LOADER STATUS] Found job: {job}")
-        
+        job = get_active_prepare_snapshot()
         if job:
-            result = {
+            return {
                 "active": True,
-                "status": job["status"],
-                "progress": job["progress"] or 0,
-                "detail": job["detail"] or "Preparing analysis...",
-                "started_at": job["created_at"].isoformat() if job["created_at"] else None
+                "status": job.get("status"),
+                "progress": job.get("progress") or 0,
+                "detail": job.get("detail") or "Preparing analysis...",
+                "started_at": job.get("started_at"),
             }
-            print(f"🔍 [GLOBAL LOADER STATUS] Returning active: {result}")
-            return result
-        else:
-            print(f"🔍 [GLOBAL LOADER STATUS] No active job found, returning inactive")
-            return {"active": False}
-            
+        return {"active": False}
+
     except Exception as e:
         print(f"❌ [ERROR] Global loader status check failed: {e}")
         return {"active": False}
 
 @app.get("/api/check-analysis-exists")
-async def api_check_analysis_exists(request: Request):
+def api_check_analysis_exists(request: Request):
     """
     Check if analysis already exists in database for a specific date.
     Query params: { "date": "YYYY-MM-DD" }
@@ -6906,7 +8225,7 @@ async def api_check_analysis_exists(request: Request):
         return {"error": "Failed to check analysis status"}, 500
 
 @app.get("/api/users")
-async def api_get_users(request: Request):
+def api_get_users(request: Request):
     """Get all registered users (admin only)."""
     print("🔍 [DEBUG] /api/users endpoint called")
     try:
@@ -7025,19 +8344,26 @@ async def api_analyze(request: Request):
             "market": market,
         }
         cache_key = _build_cache_key(params)
-        hit = read_analysis_cache(cache_key)
-        if hit is not None:
-            return JSONResponse(content=hit, status_code=200)
+
+        # 0) in-process keš gotovih bajtova (bez DB-a; If-None-Match → 304)
+        mem = get_cached_analyze_response(cache_key)
+        if mem is not None:
+            return _analyze_bytes_response(request, *mem)
+
+        raw = await run_blocking(read_analysis_cache_raw, cache_key)
+        if raw is not None:
+            return _analyze_bytes_response(request, *put_cached_analyze_response(cache_key, gz=raw))
 
         # 2) Nema cache? — pročitaj isključivo iz model_outputs (precomputed)
-        results = read_precomputed_results(from_date, to_date, fh, th, market)
+        results = await run_blocking(read_precomputed_results, from_date, to_date, fh, th, market)
 
         prepared = len(results) > 0
         # Ako želiš da frontend zna da nije "prepared", vrati info-flagu
-        return JSONResponse(status_code=200, content={
-            "prepared": prepared,
-            "results": results
-        })
+        content = {"prepared": prepared, "results": results}
+        if not prepared:
+            return JSONResponse(status_code=200, content=content)
+        # serijalizacija + gzip velikog payload-a je CPU posao → van event loop-a
+        return _analyze_bytes_response(request, *await run_blocking(put_cached_analyze_response, cache_key, content))
 
     except Exception as e:
         print("analyze error:", e)
@@ -7045,59 +8371,26 @@ async def api_analyze(request: Request):
         return JSONResponse(status_code=500, content={"error": "analyze_failed", "detail": str(e)})
 
 @app.get("/api/team-stats")
-async def api_team_stats(request: Request):
+def api_team_stats(request: Request):
     """
     Get team statistics for specific market and period.
     Returns top 10 teams with highest success rate for the given market.
-    Uses precomputed data from team_stats table.
+    Served from the in-memory leaderboard (materialized at the end of the prepare job).
+    Optional: min_matches=N (server-side filter on total_matches).
     """
     try:
         q = request.query_params
         market = (q.get("market") or "gg1h").strip()
-        fh = q.get("from_hour")
-        th = q.get("to_hour")
-        from_s = q.get("from_date")
-        to_s = q.get("to_date")
-
-        print(f"DEBUG: api_team_stats called with market={market}")
+        if market not in TEAM_STATS_MARKET_COLS:
+            market = "gg1h"
+        try:
+            min_matches = max(1, int(q.get("min_matches") or 1))
+        except ValueError:
+            min_matches = 1
 
-        # Get team statistics from precomputed team_stats table
-        team_stats = get_team_stats_for_market(market)
-        print(f"DEBUG: get_team_stats_for_market returned {len(team_stats)} results")
+        board = get_team_leaderboard(market)
+        team_stats = [row for row in board if (row.get("total_matches") or 0) >= min_matches][:TEAM_LEADERBOARD_TOP]
 
-        # Get league country information from database
-        league_countries = {}
-        if team_stats:
-            conn = get_mysql_connection()
-            cur = conn.cursor()
-            
-            # Get unique league names from results
-            league_names = list(set([team.get('league', '') for team in team_stats if team.get('league')]))
-            
-            if league_names:
-                placeholders = ','.join(['%s'] * len(league_names))
-                cur.execute(f"""
-                    SELECT name, country 
-                    FROM leagues 
-                    WHERE name IN ({placeholders})
-                """, league_names)
-                
-                for league_name, country in cur.fetchall():
-                    league_countries[league_name] = country
-                    
-            conn.close()
-
-        # Format league with country
-        for team in team_stats:
-            league_name = team.get('league', 'Unknown')
-            league_country = league_countries.get(league_name, '')
-            team['league'] = f"{league_name}" + (f" ({league_country})" if league_country else "")
-        
-        # Sort by success rate (descending) and limit to top 10
-        team_stats.sort(key=lambda x: x['success_rate'], reverse=True)
-        team_stats = team_stats[:10]
-        
-        print(f"DEBUG: Returning {len(team_stats)} team stats")
         return JSONResponse(status_code=200, content={
             "prepared": len(team_stats) > 0,
             "results": team_stats
@@ -7109,7 +8402,7 @@ async def api_team_stats(request: Request):
         return JSONResponse(status_code=500, content={"error": "team_stats_failed", "detail": str(e)})
 
 @app.post("/api/save-pdf")
-async def save_pdf(data: dict):
+def save_pdf(data: dict):
     file_path = "analysis_results.pdf"
     c = canvas.Canvas(file_path, pagesize=letter)
     width, height = letter
@@ -7145,74 +8438,44 @@ async def save_pdf(data: dict):
     c.save()
     return FileResponse(file_path, filename="analysis_results.pdf")
 
-def get_team_stats_for_market(market: str) -> list:
+# market → prefiks kolona u team_stats
+TEAM_STATS_MARKET_COLS = {
+    'gg1h': 'gg_1h',
+    '1h_over05': 'over05_1h',
+    '1h_over15': 'over15_1h',
+    'ft_over15': 'over15_ft',
+    'ft_over25': 'over25_ft',
+    'ggft': 'gg_ft',
+    'gg3plus_ft': 'gg3plus_ft',
+    'x_ht': 'x_ht',
+}
+TEAM_LEADERBOARD_TOP = 10
+# koliko redova po marketu čuvamo (da min_matches filter ima iz čega da bira)
+TEAM_LEADERBOARD_DEPTH = int(os.getenv("TEAM_LEADERBOARD_DEPTH", "300"))
+TEAM_LEADERBOARD_RELOAD_SEC = int(os.getenv("TEAM_LEADERBOARD_RELOAD_SEC", "60"))
+
+_TEAM_LEADERBOARD = {}   # market -> list[dict] (sortirano po success_rate desc)
+_TEAM_LEADERBOARD_TS = 0.0
+_TEAM_LEADERBOARD_LOCK = threading.Lock()
+
+def get_team_stats_for_market(market: str, limit: int = TEAM_LEADERBOARD_TOP) -> list:
     """
-    Get team statistics for a specific market and period.
+    Get team statistics for a specific market (direktno iz team_stats; liga je formatirana sa državom).
     Returns list of teams with their success rates.
     """
     try:
-        print(f"DEBUG: get_team_stats_for_market called with market={market}")
-        # First, try to populate team_stats table if it's empty
-        populate_team_stats_if_needed()
+        prefix = TEAM_STATS_MARKET_COLS.get(market, TEAM_STATS_MARKET_COLS['gg1h'])
+        success_rate_col = f"{prefix}_success_rate"
+        total_matches_col = f"{prefix}_total_matches"
+        successful_matches_col = f"{prefix}_successful_matches"
         
         conn = get_mysql_connection()
         cur = conn.cursor()
-        print(f"DEBUG: Connected to database for market {market}")
-        
-        # Map market to database columns
-        market_config = {
-            'gg1h': {
-                'success_rate': 'gg_1h_success_rate',
-                'total_matches': 'gg_1h_total_matches', 
-                'successful_matches': 'gg_1h_successful_matches'
-            },
-            '1h_over05': {
-                'success_rate': 'over05_1h_success_rate',
-                'total_matches': 'over05_1h_total_matches',
-                'successful_matches': 'over05_1h_successful_matches'
-            },
-            '1h_over15': {
-                'success_rate': 'over15_1h_success_rate',
-                'total_matches': 'over15_1h_total_matches',
-                'successful_matches': 'over15_1h_successful_matches'
-            },
-            'ft_over15': {
-                'success_rate': 'over15_ft_success_rate',
-                'total_matches': 'over15_ft_total_matches',
-                'successful_matches': 'over15_ft_successful_matches'
-            },
-            'ft_over25': {
-                'success_rate': 'over25_ft_success_rate',
-                'total_matches': 'over25_ft_total_matches',
-                'successful_matches': 'over25_ft_successful_matches'
-            },
-            'ggft': {
-                'success_rate': 'gg_ft_success_rate',
-                'total_matches': 'gg_ft_total_matches',
-                'successful_matches': 'gg_ft_successful_matches'
-            },
-            'gg3plus_ft': {
-                'success_rate': 'gg3plus_ft_success_rate',
-                'total_matches': 'gg3plus_ft_total_matches',
-                'successful_matches': 'gg3plus_ft_successful_matches'
-            },
-            'x_ht': {
-                'success_rate': 'x_ht_success_rate',
-                'total_matches': 'x_ht_total_matches',
-                'successful_matches': 'x_ht_successful_matches'
-            }
-        }
-        
-        config = market_config.get(market, market_config['gg1h'])
-        success_rate_col = config['success_rate']
-        total_matches_col = config['total_matches']
-        successful_matches_col = config['successful_matches']
-        
-        # Build query
-        query = f"""
+        cur.execute(f"""
             SELECT 
                 t.name as team_name,
                 l.name as league,
+                l.country as league_country,
                 ts.{success_rate_col} as success_rate,
                 ts.{total_matches_col} as total_matches,
                 ts.{successful_matches_col} as successful_matches,
@@ -7223,171 +8486,300 @@ def get_team_stats_for_market(market: str) -> list:
             WHERE ts.{success_rate_col} IS NOT NULL
             AND ts.{success_rate_col} > 0
             AND ts.{total_matches_col} >= 1
-            ORDER BY ts.{success_rate_col} DESC
-            LIMIT 10
-        """
-        
-        print(f"DEBUG: Executing query for market {market}:\n{query}")
-        cur.execute(query)
+            ORDER BY ts.{success_rate_col} DESC, ts.{total_matches_col} DESC
+            LIMIT %s
+        """, (int(limit),))
         results = cur.fetchall()
         conn.close()
         
-        print(f"DEBUG: Query returned {len(results)} results for market {market}")
-        
-        # Convert to list of dictionaries
         team_stats = []
-        for row in results:
-            total_matches = row[3] or 0
-            successful_matches = row[4] or 0
-            success_rate = float(row[2]) if row[2] else 0
-            
+        for team_name, league, league_country, success_rate, total_matches, successful_matches, avg_goals in results:
+            total_matches = total_matches or 0
+            successful_matches = successful_matches or 0
+            league = league or 'Unknown'
             team_stats.append({
-                'team_name': row[0],
-                'league': row[1], 
-                'success_rate': round(success_rate, 2),
+                'team_name': team_name,
+                'league': league + (f" ({league_country})" if league_country else ""),
+                'success_rate': round(float(success_rate) if success_rate else 0, 2),
                 'total_matches': total_matches,
                 'successful_matches': successful_matches,
                 'matches_display': f"{successful_matches}/{total_matches}",
-                'avg_goals_scored': float(row[5]) if row[5] else None
+                'avg_goals_scored': float(avg_goals) if avg_goals else None
             })
-        
-        print(f"DEBUG: Returning {len(team_stats)} team stats for market {market}")
         return team_stats
         
     except Exception as e:
         print(f"Error getting team stats: {e}")
         return []
 
+def build_team_leaderboards() -> dict:
+    """Poziva se na kraju prepare job-a: top TEAM_LEADERBOARD_DEPTH po marketu → team_leaderboard + memorija."""
+    global _TEAM_LEADERBOARD, _TEAM_LEADERBOARD_TS
+    boards = {m: get_team_stats_for_market(m, limit=TEAM_LEADERBOARD_DEPTH) for m in TEAM_STATS_MARKET_COLS}
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.executemany("""
+            INSERT INTO team_leaderboard (market, data) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE data = VALUES(data), built_at = CURRENT_TIMESTAMP
+        """, [(m, json.dumps(rows, ensure_ascii=False)) for m, rows in boards.items()])
+        conn.commit()
+    finally:
+        conn.close()
+    with _TEAM_LEADERBOARD_LOCK:
+        _TEAM_LEADERBOARD = boards
+        _TEAM_LEADERBOARD_TS = time.time()
+    return {m: len(rows) for m, rows in boards.items()}
+
+def _load_team_leaderboards() -> dict:
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT market, data FROM team_leaderboard")
+        out = {}
+        for market, data in cur.fetchall():
+            out[market] = data if isinstance(data, list) else json.loads(data or "[]")
+        return out
+    finally:
+        conn.close()
+
+def reload_team_leaderboards() -> dict:
+    """Učitaj team_leaderboard u memoriju ovog workera (posle prepare-a u drugom procesu)."""
+    global _TEAM_LEADERBOARD, _TEAM_LEADERBOARD_TS
+    boards = _load_team_leaderboards()
+    with _TEAM_LEADERBOARD_LOCK:
+        _TEAM_LEADERBOARD = boards
+        _TEAM_LEADERBOARD_TS = time.time()
+    return {m: len(rows) for m, rows in boards.items()}
+
+def bootstrap_team_leaderboards() -> None:
+    """
+    Prva instalacija (prepare još nije pokrenut): jednom napuni team_stats i izgradi team_leaderboard.
+    Zove se iz startup-a u pozadinskom thread-u – nikad sa request putanje. Jedan worker gradi (GET_LOCK
+    drži ista konekcija), ostali posle čekanja samo pročitaju tabelu.
+    """
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT GET_LOCK(%s, %s)", ("team_leaderboard_bootstrap", 600))
+        if (cur.fetchone() or [0])[0] != 1:
+            print("[leaderboard] bootstrap lock timeout")
+            return
+        try:
+            if any(reload_team_leaderboards().values()):
+                return
+            populate_team_stats_if_needed()
+            print(f"[leaderboard] bootstrap built: {build_team_leaderboards()}")
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", ("team_leaderboard_bootstrap",))
+            cur.fetchone()
+    except Exception as e:
+        print(f"[leaderboard] bootstrap failed: {e}")
+    finally:
+        conn.close()
+
+def get_team_leaderboard(market: str) -> list:
+    """
+    Leaderboard iz memorije. Drugi workeri (i prepare_worker proces) ga osvežavaju iz team_leaderboard
+    najviše jednom u TEAM_LEADERBOARD_RELOAD_SEC. Handler samo servira postojeće podatke: ako tabela
+    još nije izgrađena (startup bootstrap / prepare), vraća prazno.
+    """
+    global _TEAM_LEADERBOARD, _TEAM_LEADERBOARD_TS
+    now = time.time()
+    if _TEAM_LEADERBOARD and now - _TEAM_LEADERBOARD_TS < TEAM_LEADERBOARD_RELOAD_SEC:
+        return _TEAM_LEADERBOARD.get(market, [])
+    with _TEAM_LEADERBOARD_LOCK:
+        if not (_TEAM_LEADERBOARD and now - _TEAM_LEADERBOARD_TS < TEAM_LEADERBOARD_RELOAD_SEC):
+            try:
+                boards = _load_team_leaderboards()
+            except Exception as e:
+                print(f"[leaderboard] reload failed: {e}")
+                boards = _TEAM_LEADERBOARD
+            _TEAM_LEADERBOARD = boards
+            _TEAM_LEADERBOARD_TS = now
+    return _TEAM_LEADERBOARD.get(market, [])
+
 def populate_teams_and_leagues_if_needed():
     """
-    Populate teams and leagues tables with data from fixtures if they're empty.
+    Safety net za stare instalacije: ako su teams/leagues prazne, jednom ih napuni iz fixtures.
+    Inače se dimenzije održavaju pri ingest-u (store_fixture_data_in_db / DataRepo._store_fixtures).
     """
     try:
-        print("DEBUG: populate_teams_and_leagues_if_needed started")
         conn = get_mysql_connection()
         cur = conn.cursor()
-        
-        # Check if teams table has any data
-        cur.execute("SELECT COUNT(*) FROM teams")
-        teams_count = cur.fetchone()[0]
-        print(f"DEBUG: teams table has {teams_count} records")
-        
-        # Check if leagues table has any data
-        cur.execute("SELECT COUNT(*) FROM leagues")
-        leagues_count = cur.fetchone()[0]
-        print(f"DEBUG: leagues table has {leagues_count} records")
-        
-        if teams_count > 0 and leagues_count > 0:
-            conn.close()
-            print("DEBUG: teams and leagues tables already populated, skipping")
+        cur.execute("SELECT (SELECT 1 FROM teams LIMIT 1), (SELECT 1 FROM leagues LIMIT 1)")
+        has_teams, has_leagues = cur.fetchone() or (None, None)
+        conn.close()
+        if has_teams and has_leagues:
             return  # Already populated
         
-        print("DEBUG: Populating teams and leagues tables...")
-        
-        # Get all unique teams and leagues from fixtures
-        cur.execute("""
-            SELECT DISTINCT 
-                f.team_home_id as team_id,
-                f.league_id,
-                f.fixture_json
-            FROM fixtures f
-            WHERE f.fixture_json IS NOT NULL
-            UNION
-            SELECT DISTINCT 
-                f.team_away_id as team_id,
-                f.league_id,
-                f.fixture_json
-            FROM fixtures f
-            WHERE f.fixture_json IS NOT NULL
-        """)
-        
-        team_league_data = cur.fetchall()
-        
-        teams_data = {}
-        leagues_data = {}
-        
-        for team_id, league_id, fixture_json in team_league_data:
-            try:
-                fixture_data = json.loads(fixture_json) if isinstance(fixture_json, str) else fixture_json
-                
-                if not fixture_data:
-                    continue
-                
-                # Extract team info
-                teams = fixture_data.get('teams', {})
-                home_team = teams.get('home', {})
-                away_team = teams.get('away', {})
-                league = fixture_data.get('league', {})
-                
-                # Store team data
-                if home_team.get('id') and home_team.get('name'):
-                    teams_data[home_team['id']] = {
-                        'id': home_team['id'],
-                        'name': home_team['name'],
-                        'country': home_team.get('country', ''),
-                        'logo': home_team.get('logo', '')
-                    }
-                
-                if away_team.get('id') and away_team.get('name'):
-                    teams_data[away_team['id']] = {
-                        'id': away_team['id'],
-                        'name': away_team['name'],
-                        'country': away_team.get('country', ''),
-                        'logo': away_team.get('logo', '')
-                    }
-                
-                # Store league data
-                if league.get('id') and league.get('name'):
-                    leagues_data[league['id']] = {
-                        'id': league['id'],
-                        'name': league['name'],
-                        'country': league.get('country', ''),
-                        'logo': league.get('logo', ''),
-                        'type': league.get('type', '')
-                    }
-                
-            except Exception as e:
-                print(f"Error processing fixture data: {e}")
-                continue
-        
-        # Insert teams
-        for team_data in teams_data.values():
-            cur.execute("""
-                INSERT INTO teams (id, name, country, logo)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    name = VALUES(name),
-                    country = VALUES(country),
-                    logo = VALUES(logo),
-                    updated_at = CURRENT_TIMESTAMP
-            """, (team_data['id'], team_data['name'], team_data['country'], team_data['logo']))
-        
-        # Insert leagues
-        for league_data in leagues_data.values():
-            cur.execute("""
-                INSERT INTO leagues (id, name, country, logo, type)
-                VALUES (%s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    name = VALUES(name),
-                    country = VALUES(country),
-                    logo = VALUES(logo),
-                    type = VALUES(type),
-                    updated_at = CURRENT_TIMESTAMP
-            """, (league_data['id'], league_data['name'], league_data['country'], league_data['logo'], league_data['type']))
-        
-        conn.commit()
-        conn.close()
-        print(f"DEBUG: Populated {len(teams_data)} teams and {len(leagues_data)} leagues")
+        print("DEBUG: Populating teams and leagues tables (backfill)...")
+        n_teams, n_leagues = backfill_dimensions()
+        print(f"DEBUG: Populated {n_teams} teams and {n_leagues} leagues")
         
     except Exception as e:
         print(f"Error populating teams and leagues: {e}")
         import traceback
         traceback.print_exc()
 
+# ---------- team_stats: set-based preračun ----------
+# Svi (team, league, season) ključevi se računaju u jednom prolazu: jedan SQL upit vraća poslednjih
+# TEAM_STATS_LAST_N odigranih mečeva za sve tražene timove (ROW_NUMBER po timu), sa golovima i pravim
+# poluvremenom (score.halftime) izvučenim iz JSON-a u SQL-u – fixture_json se ne dekodira u Python-u.
+TEAM_STATS_LAST_N = int(os.getenv("TEAM_STATS_LAST_N", "50"))
+TEAM_STATS_UPSERT_CHUNK = 500
+_TEAM_STATS_MARKETS = ('gg_1h', 'over05_1h', 'over15_1h', 'over15_ft', 'over25_ft', 'gg_ft', 'gg3plus_ft', 'x_ht')
+_TEAM_STATS_1H_MARKETS = ('gg_1h', 'over05_1h', 'over15_1h', 'x_ht')
+
+def _json_int_sql(path: str) -> str:
+    # JSON null → SQL NULL (JSON_UNQUOTE bi vratio string 'null')
+    return f"NULLIF(JSON_UNQUOTE(JSON_EXTRACT(f.fixture_json, '{path}')), 'null')"
+
+def _to_int_or_none(v):
+    try:
+        return int(float(v)) if v is not None else None
+    except Exception:
+        return None
+
+def _empty_team_stats() -> dict:
+    stats = {}
+    for m in _TEAM_STATS_MARKETS:
+        stats[f'{m}_total_matches'] = 0
+        stats[f'{m}_successful_matches'] = 0
+    stats.update({'total_goals_scored': 0, 'total_goals_conceded': 0, 'total_matches': 0})
+    return stats
+
+def _accumulate_team_match(stats: dict, tg: int, og: int, t1h, o1h) -> None:
+    """Jedan meč iz ugla tima: tg/og = FT golovi (tim/protivnik), t1h/o1h = golovi na poluvremenu (ili None)."""
+    stats['total_goals_scored'] += tg
+    stats['total_goals_conceded'] += og
+    stats['total_matches'] += 1
+    ft_hits = {
+        'over15_ft': tg + og > 1,
+        'over25_ft': tg + og > 2,
+        'gg_ft': tg > 0 and og > 0,
+        'gg3plus_ft': tg > 0 and og > 0 and tg + og >= 3,
+    }
+    for m, hit in ft_hits.items():
+        stats[f'{m}_total_matches'] += 1
+        stats[f'{m}_successful_matches'] += int(hit)
+    # 1H marketi samo kad API ima stvarni rezultat poluvremena
+    if t1h is None or o1h is None:
+        return
+    ht_hits = {
+        'gg_1h': t1h > 0 and o1h > 0,
+        'over05_1h': t1h + o1h > 0,
+        'over15_1h': t1h + o1h > 1,
+        'x_ht': t1h == o1h,
+    }
+    for m, hit in ht_hits.items():
+        stats[f'{m}_total_matches'] += 1
+        stats[f'{m}_successful_matches'] += int(hit)
+
+def _finalize_team_stats(stats: dict) -> dict:
+    for m in _TEAM_STATS_MARKETS:
+        tot = stats[f'{m}_total_matches']
+        stats[f'{m}_success_rate'] = stats[f'{m}_successful_matches'] / tot if tot > 0 else 0
+    n = stats['total_matches']
+    stats['avg_goals_scored'] = stats['total_goals_scored'] / n if n > 0 else 0
+    stats['avg_goals_conceded'] = stats['total_goals_conceded'] / n if n > 0 else 0
+    return stats
+
+def compute_team_stats_bulk(team_ids=None, last_n: int = TEAM_STATS_LAST_N) -> dict:
+    """
+    {team_id: stats} za sve tražene timove (None = svi timovi u fixtures) iz jednog SQL upita.
+    Računaju se samo odigrani mečevi (goals.home/away nisu NULL).
+    """
+    ids = sorted({int(t) for t in team_ids if t}) if team_ids is not None else None
+    if ids is not None and not ids:
+        return {}
+    cols = (f"f.id, f.date, {_json_int_sql('$.goals.home')} AS gh, {_json_int_sql('$.goals.away')} AS ga, "
+            f"{_json_int_sql('$.score.halftime.home')} AS hh, {_json_int_sql('$.score.halftime.away')} AS ha")
+    params = []
+    home_where = away_where = "f.fixture_json IS NOT NULL"
+    if ids is not None:
+        ph = ",".join(["%s"] * len(ids))
+        home_where += f" AND f.team_home_id IN ({ph})"
+        away_where += f" AND f.team_away_id IN ({ph})"
+        params = ids + ids
+    sql = f"""
+        SELECT team_id, is_home, gh, ga, hh, ha FROM (
+            SELECT x.*, ROW_NUMBER() OVER (PARTITION BY x.team_id ORDER BY x.date DESC, x.id DESC) AS rn
+            FROM (
+                SELECT f.team_home_id AS team_id, 1 AS is_home, {cols} FROM fixtures f WHERE {home_where}
+                UNION ALL
+                SELECT f.team_away_id AS team_id, 0 AS is_home, {cols} FROM fixtures f WHERE {away_where}
+            ) x
+            WHERE x.gh IS NOT NULL AND x.ga IS NOT NULL
+        ) y
+        WHERE y.rn <= %s
+    """
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, tuple(params) + (int(last_n),))
+        out = {}
+        # streaming: red po red, bez učitavanja svega u memoriju
+        for team_id, is_home, gh, ga, hh, ha in cur:
+            gh, ga, hh, ha = (_to_int_or_none(v) for v in (gh, ga, hh, ha))
+            if gh is None or ga is None:
+                continue
+            tg, og = (gh, ga) if is_home else (ga, gh)
+            t1h, o1h = (hh, ha) if is_home else (ha, hh)
+            stats = out.get(int(team_id))
+            if stats is None:
+                stats = out[int(team_id)] = _empty_team_stats()
+            _accumulate_team_match(stats, tg, og, t1h, o1h)
+    finally:
+        conn.close()
+    return {tid: _finalize_team_stats(s) for tid, s in out.items()}
+
+def upsert_team_stats_bulk(rows: list) -> int:
+    """rows: [((team_id, league_id, season), stats)] → jedan multi-row INSERT ... ON DUPLICATE KEY UPDATE po chunk-u."""
+    if not rows:
+        return 0
+    value_cols = []
+    for m in _TEAM_STATS_MARKETS:
+        value_cols += [f'{m}_success_rate', f'{m}_total_matches', f'{m}_successful_matches']
+    value_cols += ['avg_goals_scored', 'avg_goals_conceded']
+    all_cols = ['team_id', 'league_id', 'season'] + value_cols
+    row_ph = "(" + ",".join(["%s"] * len(all_cols)) + ")"
+    updates = ",\n            ".join(f"{c} = VALUES({c})" for c in value_cols)
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for i in range(0, len(rows), TEAM_STATS_UPSERT_CHUNK):
+            chunk = rows[i:i + TEAM_STATS_UPSERT_CHUNK]
+            params = []
+            for (team_id, league_id, season), stats in chunk:
+                params += [team_id, league_id, season] + [stats.get(c, 0) for c in value_cols]
+            cur.execute(f"""
+                INSERT INTO team_stats ({", ".join(all_cols)})
+                VALUES {",".join([row_ph] * len(chunk))}
+                ON DUPLICATE KEY UPDATE
+                {updates},
+                updated_at = CURRENT_TIMESTAMP
+            """, tuple(params))
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+def recompute_team_stats(keys) -> int:
+    """keys: iterable (team_id, league_id, season) → set-based preračun + bulk upsert. Vraća broj upisanih redova."""
+    keys = sorted({(int(t), int(l), int(s)) for t, l, s in keys if t and l and s})
+    if not keys:
+        return 0
+    t0 = time.perf_counter()
+    by_team = compute_team_stats_bulk({t for t, _l, _s in keys})
+    rows = [(k, by_team[k[0]]) for k in keys if k[0] in by_team]
+    n = upsert_team_stats_bulk(rows)
+    print(f"[team_stats] {n}/{len(keys)} keys, {len(by_team)} teams in {time.perf_counter() - t0:.2f}s")
+    return n
+
 def populate_team_stats_if_needed():
     """
-    Populate team_stats table with data from fixtures if it's empty.
-    This is a simplified version that calculates basic statistics.
+    Populate team_stats table with data from fixtures if it's empty (set-based, jedan prolaz za sve timove).
     """
     try:
         print("DEBUG: populate_team_stats_if_needed started")
@@ -7398,125 +8790,29 @@ def populate_team_stats_if_needed():
         conn = get_mysql_connection()
         cur = conn.cursor()
         
-        # Check if team_stats table has any data
-        cur.execute("SELECT COUNT(*) FROM team_stats")
-        count = cur.fetchone()[0]
-        print(f"DEBUG: team_stats table has {count} records")
-        
-        if count > 0:
-            # Debug: Show sample data from team_stats table
-            cur.execute("""
-                SELECT team_id, league_id, gg_1h_total_matches, gg_1h_successful_matches, gg_1h_success_rate
-                FROM team_stats 
-                LIMIT 5
-            """)
-            sample_data = cur.fetchall()
-            print(f"DEBUG: Sample team_stats data: {sample_data}")
-            
+        cur.execute("SELECT 1 FROM team_stats LIMIT 1")
+        if cur.fetchone():
             conn.close()
             print("DEBUG: team_stats table already populated, skipping")
             return  # Already populated
         
         print("DEBUG: Populating team_stats table...")
         
-        # Get all teams and leagues from fixtures (use fixture_json instead of stats_json)
+        # (team, league, season) ključevi bez čitanja fixture_json-a
         cur.execute("""
-            SELECT DISTINCT f.team_home_id, f.league_id, f.date
+            SELECT DISTINCT f.team_home_id, f.league_id, YEAR(f.date)
             FROM fixtures f
             WHERE f.fixture_json IS NOT NULL
             UNION
-            SELECT DISTINCT f.team_away_id, f.league_id, f.date
+            SELECT DISTINCT f.team_away_id, f.league_id, YEAR(f.date)
             FROM fixtures f
             WHERE f.fixture_json IS NOT NULL
         """)
-        
-        team_league_pairs = cur.fetchall()
-        print(f"DEBUG: Found {len(team_league_pairs)} unique team-league pairs to process for initial population.")
-        
-        # Debug: Check total fixtures and fixtures with stats_json (using separate cursor)
-        debug_cur = conn.cursor()
-        debug_cur.execute("SELECT COUNT(*) FROM fixtures")
-        total_fixtures = debug_cur.fetchone()[0]
-        print(f"DEBUG: Total fixtures in database: {total_fixtures}")
-        
-        debug_cur.execute("SELECT COUNT(*) FROM fixtures WHERE stats_json IS NOT NULL")
-        fixtures_with_stats = debug_cur.fetchone()[0]
-        print(f"DEBUG: Fixtures with stats_json: {fixtures_with_stats}")
-        
-        debug_cur.execute("SELECT COUNT(*) FROM fixtures WHERE fixture_json IS NOT NULL")
-        fixtures_with_fixture_json = debug_cur.fetchone()[0]
-        print(f"DEBUG: Fixtures with fixture_json: {fixtures_with_fixture_json}")
-        debug_cur.close()
-        
-        inserted_count = 0
-        for team_id, league_id, match_date in team_league_pairs:
-            # Get season from date (simplified)
-            season = match_date.year if match_date else 2024
-            
-            print(f"DEBUG: Processing team {team_id}, league {league_id}, season {season}")
-            
-            # Calculate basic stats for this team
-            stats = calculate_team_basic_stats(team_id, league_id, season)
-            
-            if stats:
-                inserted_count += 1
-                # Insert or update team stats
-                cur.execute("""
-                    INSERT INTO team_stats (
-                        team_id, league_id, season,
-                        gg_1h_success_rate, gg_1h_total_matches, gg_1h_successful_matches,
-                        over05_1h_success_rate, over05_1h_total_matches, over05_1h_successful_matches,
-                        over15_1h_success_rate, over15_1h_total_matches, over15_1h_successful_matches,
-                        over15_ft_success_rate, over15_ft_total_matches, over15_ft_successful_matches,
-                        over25_ft_success_rate, over25_ft_total_matches, over25_ft_successful_matches,
-                        gg_ft_success_rate, gg_ft_total_matches, gg_ft_successful_matches,
-                        gg3plus_ft_success_rate, gg3plus_ft_total_matches, gg3plus_ft_successful_matches,
-                        x_ht_success_rate, x_ht_total_matches, x_ht_successful_matches,
-                        avg_goals_scored, avg_goals_conceded
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                    ) ON DUPLICATE KEY UPDATE
-                        gg_1h_success_rate = VALUES(gg_1h_success_rate),
-                        gg_1h_total_matches = VALUES(gg_1h_total_matches),
-                        gg_1h_successful_matches = VALUES(gg_1h_successful_matches),
-                        over05_1h_success_rate = VALUES(over05_1h_success_rate),
-                        over05_1h_total_matches = VALUES(over05_1h_total_matches),
-                        over05_1h_successful_matches = VALUES(over05_1h_successful_matches),
-                        over15_1h_success_rate = VALUES(over15_1h_success_rate),
-                        over15_1h_total_matches = VALUES(over15_1h_total_matches),
-                        over15_1h_successful_matches = VALUES(over15_1h_successful_matches),
-                        over15_ft_success_rate = VALUES(over15_ft_success_rate),
-                        over15_ft_total_matches = VALUES(over15_ft_total_matches),
-                        over15_ft_successful_matches = VALUES(over15_ft_successful_matches),
-                        over25_ft_success_rate = VALUES(over25_ft_success_rate),
-                        over25_ft_total_matches = VALUES(over25_ft_total_matches),
-                        over25_ft_successful_matches = VALUES(over25_ft_successful_matches),
-                        gg_ft_success_rate = VALUES(gg_ft_success_rate),
-                        gg_ft_total_matches = VALUES(gg_ft_total_matches),
-                        gg_ft_successful_matches = VALUES(gg_ft_successful_matches),
-                        gg3plus_ft_success_rate = VALUES(gg3plus_ft_success_rate),
-                        gg3plus_ft_total_matches = VALUES(gg3plus_ft_total_matches),
-                        gg3plus_ft_successful_matches = VALUES(gg3plus_ft_successful_matches),
-                        x_ht_success_rate = VALUES(x_ht_success_rate),
-                        x_ht_total_matches = VALUES(x_ht_total_matches),
-                        x_ht_successful_matches = VALUES(x_ht_successful_matches),
-                        avg_goals_scored = VALUES(avg_goals_scored),
-                        avg_goals_conceded = VALUES(avg_goals_conceded)
-                """, (
-                    team_id, league_id, season,
-                    stats.get('gg_1h_success_rate', 0), stats.get('gg_1h_total_matches', 0), stats.get('gg_1h_successful_matches', 0),
-                    stats.get('over05_1h_success_rate', 0), stats.get('over05_1h_total_matches', 0), stats.get('over05_1h_successful_matches', 0),
-                    stats.get('over15_1h_success_rate', 0), stats.get('over15_1h_total_matches', 0), stats.get('over15_1h_successful_matches', 0),
-                    stats.get('over15_ft_success_rate', 0), stats.get('over15_ft_total_matches', 0), stats.get('over15_ft_successful_matches', 0),
-                    stats.get('over25_ft_success_rate', 0), stats.get('over25_ft_total_matches', 0), stats.get('over25_ft_successful_matches', 0),
-                    stats.get('gg_ft_success_rate', 0), stats.get('gg_ft_total_matches', 0), stats.get('gg_ft_successful_matches', 0),
-                    stats.get('gg3plus_ft_success_rate', 0), stats.get('gg3plus_ft_total_matches', 0), stats.get('gg3plus_ft_successful_matches', 0),
-                    stats.get('x_ht_success_rate', 0), stats.get('x_ht_total_matches', 0), stats.get('x_ht_successful_matches', 0),
-                    stats.get('avg_goals_scored', 0), stats.get('avg_goals_conceded', 0)
-                ))
-        
-        conn.commit()
+        keys = [(t, l, s or 2024) for t, l, s in cur.fetchall()]
         conn.close()
+        print(f"DEBUG: Found {len(keys)} unique team-league-season keys to process for initial population.")
+        
+        inserted_count = recompute_team_stats(keys)
         print(f"DEBUG: Finished populating team_stats table. Inserted/Updated {inserted_count} records.")
         print("Team stats table populated successfully!")
         
@@ -7525,265 +8821,39 @@ def populate_team_stats_if_needed():
 
 def update_team_stats_for_teams(team_ids: set, fixtures: list):
     """
-    Update team stats for specific teams playing today.
-    This is more efficient than recalculating all teams.
+    Update team stats for specific teams playing today (jedan SQL prolaz + jedan bulk upsert).
     """
     try:
-        conn = get_mysql_connection()
-        cur = conn.cursor()
-        
-        # Get league info for teams
-        team_leagues = {}
+        season = datetime.now().year
+        keys = set()
         for fixture in fixtures:
             teams = fixture.get('teams', {})
-            home_team = teams.get('home', {})
-            away_team = teams.get('away', {})
             league_id = fixture.get('league', {}).get('id')
-            
-            if home_team.get('id') and league_id:
-                team_leagues[home_team['id']] = league_id
-            if away_team.get('id') and league_id:
-                team_leagues[away_team['id']] = league_id
-        
-        # Update stats for each team
-        for team_id in team_ids:
-            league_id = team_leagues.get(team_id)
             if not league_id:
                 continue
-                
-            # Get season from current date
-            season = datetime.now().year
-            
-            # Calculate stats for this team
-            stats = calculate_team_basic_stats(team_id, league_id, season)
-            
-            if stats:
-                # Update team stats
-                cur.execute("""
-                    INSERT INTO team_stats (
-                        team_id, league_id, season,
-                        gg_1h_success_rate, gg_1h_total_matches, gg_1h_successful_matches,
-                        over05_1h_success_rate, over05_1h_total_matches, over05_1h_successful_matches,
-                        over15_1h_success_rate, over15_1h_total_matches, over15_1h_successful_matches,
-                        over15_ft_success_rate, over15_ft_total_matches, over15_ft_successful_matches,
-                        over25_ft_success_rate, over25_ft_total_matches, over25_ft_successful_matches,
-                        gg_ft_success_rate, gg_ft_total_matches, gg_ft_successful_matches,
-                        gg3plus_ft_success_rate, gg3plus_ft_total_matches, gg3plus_ft_successful_matches,
-                        x_ht_success_rate, x_ht_total_matches, x_ht_successful_matches,
-                        avg_goals_scored, avg_goals_conceded
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                    ) ON DUPLICATE KEY UPDATE
-                        gg_1h_success_rate = VALUES(gg_1h_success_rate),
-                        gg_1h_total_matches = VALUES(gg_1h_total_matches),
-                        gg_1h_successful_matches = VALUES(gg_1h_successful_matches),
-                        over05_1h_success_rate = VALUES(over05_1h_success_rate),
-                        over05_1h_total_matches = VALUES(over05_1h_total_matches),
-                        over05_1h_successful_matches = VALUES(over05_1h_successful_matches),
-                        over15_1h_success_rate = VALUES(over15_1h_success_rate),
-                        over15_1h_total_matches = VALUES(over15_1h_total_matches),
-                        over15_1h_successful_matches = VALUES(over15_1h_successful_matches),
-                        over15_ft_success_rate = VALUES(over15_ft_success_rate),
-                        over15_ft_total_matches = VALUES(over15_ft_total_matches),
-                        over15_ft_successful_matches = VALUES(over15_ft_successful_matches),
-                        over25_ft_success_rate = VALUES(over25_ft_success_rate),
-                        over25_ft_total_matches = VALUES(over25_ft_total_matches),
-                        over25_ft_successful_matches = VALUES(over25_ft_successful_matches),
-                        gg_ft_success_rate = VALUES(gg_ft_success_rate),
-                        gg_ft_total_matches = VALUES(gg_ft_total_matches),
-                        gg_ft_successful_matches = VALUES(gg_ft_successful_matches),
-                        gg3plus_ft_success_rate = VALUES(gg3plus_ft_success_rate),
-                        gg3plus_ft_total_matches = VALUES(gg3plus_ft_total_matches),
-                        gg3plus_ft_successful_matches = VALUES(gg3plus_ft_successful_matches),
-                        x_ht_success_rate = VALUES(x_ht_success_rate),
-                        x_ht_total_matches = VALUES(x_ht_total_matches),
-                        x_ht_successful_matches = VALUES(x_ht_successful_matches),
-                        avg_goals_scored = VALUES(avg_goals_scored),
-                        avg_goals_conceded = VALUES(avg_goals_conceded),
-                        updated_at = CURRENT_TIMESTAMP
-                """, (
-                    team_id, league_id, season,
-                    stats.get('gg_1h_success_rate', 0), stats.get('gg_1h_total_matches', 0), stats.get('gg_1h_successful_matches', 0),
-                    stats.get('over05_1h_success_rate', 0), stats.get('over05_1h_total_matches', 0), stats.get('over05_1h_successful_matches', 0),
-                    stats.get('over15_1h_success_rate', 0), stats.get('over15_1h_total_matches', 0), stats.get('over15_1h_successful_matches', 0),
-                    stats.get('over15_ft_success_rate', 0), stats.get('over15_ft_total_matches', 0), stats.get('over15_ft_successful_matches', 0),
-                    stats.get('over25_ft_success_rate', 0), stats.get('over25_ft_total_matches', 0), stats.get('over25_ft_successful_matches', 0),
-                    stats.get('gg_ft_success_rate', 0), stats.get('gg_ft_total_matches', 0), stats.get('gg_ft_successful_matches', 0),
-                    stats.get('gg3plus_ft_success_rate', 0), stats.get('gg3plus_ft_total_matches', 0), stats.get('gg3plus_ft_successful_matches', 0),
-                    stats.get('x_ht_success_rate', 0), stats.get('x_ht_total_matches', 0), stats.get('x_ht_successful_matches', 0),
-                    stats.get('avg_goals_scored', 0), stats.get('avg_goals_conceded', 0)
-                ))
-        
-        conn.commit()
-        conn.close()
-        print(f"Updated team stats for {len(team_ids)} teams")
+            for side in ('home', 'away'):
+                tid = (teams.get(side) or {}).get('id')
+                if tid and tid in team_ids:
+                    keys.add((tid, league_id, season))
+        n = recompute_team_stats(keys)
+        print(f"Updated team stats for {len(team_ids)} teams ({n} rows)")
         
     except Exception as e:
         print(f"Error updating team stats for teams: {e}")
 
-
 def calculate_team_basic_stats(team_id: int, league_id: int, season: int) -> dict:
     """
-    Calculate basic team statistics from fixtures data.
-    This is a simplified version for demonstration.
+    Calculate basic team statistics from fixtures data (jedan tim; isti kod kao bulk preračun).
     """
     try:
-        print(f"DEBUG: calculate_team_basic_stats called for team {team_id}, league {league_id}, season {season}")
-        conn = get_mysql_connection()
-        cur = conn.cursor()
-        
-        # Get team's matches
-        cur.execute("""
-            SELECT f.id, f.stats_json, f.fixture_json
-            FROM fixtures f
-            WHERE (f.team_home_id = %s OR f.team_away_id = %s)
-            AND f.fixture_json IS NOT NULL
-            ORDER BY f.date DESC
-            LIMIT 50
-        """, (team_id, team_id))
-        
-        matches = cur.fetchall()
-        conn.close()
-        
-        print(f"DEBUG: Found {len(matches)} matches for team {team_id}")
-        
-        if not matches:
-            print(f"DEBUG: No matches found for team {team_id}")
-            return None
-        
-        # Initialize counters
-        stats = {
-            'gg_1h_total_matches': 0,
-            'gg_1h_successful_matches': 0,
-            'over05_1h_total_matches': 0,
-            'over05_1h_successful_matches': 0,
-            'over15_1h_total_matches': 0,
-            'over15_1h_successful_matches': 0,
-            'over15_ft_total_matches': 0,
-            'over15_ft_successful_matches': 0,
-            'over25_ft_total_matches': 0,
-            'over25_ft_successful_matches': 0,
-            'gg_ft_total_matches': 0,
-            'gg_ft_successful_matches': 0,
-            'gg3plus_ft_total_matches': 0,
-            'gg3plus_ft_successful_matches': 0,
-            'x_ht_total_matches': 0,
-            'x_ht_successful_matches': 0,
-            'total_goals_scored': 0,
-            'total_goals_conceded': 0,
-            'total_matches': 0
-        }
-        
-        for fixture_id, stats_json, fixture_json in matches:
-            try:
-                fixture_data = json.loads(fixture_json) if isinstance(fixture_json, str) else fixture_json
-                
-                if not fixture_data:
-                    continue
-                
-                # Determine if team is home or away
-                teams = fixture_data.get('teams', {})
-                home_team_id = teams.get('home', {}).get('id')
-                away_team_id = teams.get('away', {}).get('id')
-                
-                if team_id not in [home_team_id, away_team_id]:
-                    continue
-                
-                is_home = team_id == home_team_id
-                
-                # Get goals
-                goals = fixture_data.get('goals', {})
-                home_goals = goals.get('home', 0) or 0
-                away_goals = goals.get('away', 0) or 0
-                
-                # Debug: Log goals for first few matches
-                if stats['total_matches'] < 3:
-                    print(f"DEBUG: Match {fixture_id}: home_goals={home_goals}, away_goals={away_goals}, team_goals={team_goals if 'team_goals' in locals() else 'N/A'}")
-                
-                team_goals = home_goals if is_home else away_goals
-                opponent_goals = away_goals if is_home else home_goals
-                
-                stats['total_goals_scored'] += team_goals
-                stats['total_goals_conceded'] += opponent_goals
-                stats['total_matches'] += 1
-                
-                # First half goals (simplified - assume half of total goals)
-                team_1h_goals = team_goals // 2
-                opponent_1h_goals = opponent_goals // 2
-                
-                # Check various markets
-                # GG 1H
-                stats['gg_1h_total_matches'] += 1
-                if team_1h_goals > 0 and opponent_1h_goals > 0:
-                    stats['gg_1h_successful_matches'] += 1
-                
-                # Over 0.5 1H
-                stats['over05_1h_total_matches'] += 1
-                if team_1h_goals + opponent_1h_goals > 0:
-                    stats['over05_1h_successful_matches'] += 1
-                
-                # Over 1.5 1H
-                stats['over15_1h_total_matches'] += 1
-                if team_1h_goals + opponent_1h_goals > 1:
-                    stats['over15_1h_successful_matches'] += 1
-                
-                # Over 1.5 FT
-                stats['over15_ft_total_matches'] += 1
-                if team_goals + opponent_goals > 1:
-                    stats['over15_ft_successful_matches'] += 1
-                
-                # Over 2.5 FT
-                stats['over25_ft_total_matches'] += 1
-                if team_goals + opponent_goals > 2:
-                    stats['over25_ft_successful_matches'] += 1
-                
-                # GG FT
-                stats['gg_ft_total_matches'] += 1
-                if team_goals > 0 and opponent_goals > 0:
-                    stats['gg_ft_successful_matches'] += 1
-                
-                # GG3+ FT
-                stats['gg3plus_ft_total_matches'] += 1
-                if team_goals > 0 and opponent_goals > 0 and team_goals + opponent_goals >= 3:
-                    stats['gg3plus_ft_successful_matches'] += 1
-                
-                # X HT (draw at half time)
-                stats['x_ht_total_matches'] += 1
-                if team_1h_goals == opponent_1h_goals:
-                    stats['x_ht_successful_matches'] += 1
-                
-            except Exception as e:
-                print(f"Error processing match {fixture_id}: {e}")
-                continue
-        
-        # Calculate success rates
-        for market in ['gg_1h', 'over05_1h', 'over15_1h', 'over15_ft', 'over25_ft', 'gg_ft', 'gg3plus_ft', 'x_ht']:
-            total_key = f'{market}_total_matches'
-            successful_key = f'{market}_successful_matches'
-            success_rate_key = f'{market}_success_rate'
-            
-            if stats[total_key] > 0:
-                stats[success_rate_key] = stats[successful_key] / stats[total_key]
-            else:
-                stats[success_rate_key] = 0
-        
-        # Calculate average goals
-        if stats['total_matches'] > 0:
-            stats['avg_goals_scored'] = stats['total_goals_scored'] / stats['total_matches']
-            stats['avg_goals_conceded'] = stats['total_goals_conceded'] / stats['total_matches']
-        else:
-            stats['avg_goals_scored'] = 0
-            stats['avg_goals_conceded'] = 0
-        
-        print(f"DEBUG: calculate_team_basic_stats returning stats for team {team_id}: total_matches={stats['total_matches']}, gg_1h_total_matches={stats['gg_1h_total_matches']}, gg_1h_successful_matches={stats['gg_1h_successful_matches']}")
-        return stats
-        
+        return compute_team_stats_bulk([team_id]).get(int(team_id))
     except Exception as e:
         print(f"Error calculating team stats: {e}")
         return None
 
+
 @app.post("/api/dc/train")
-async def api_dc_train(payload: DCTrainPayload):
+def api_dc_train(payload: DCTrainPayload):
     seasons = [int(s) for s in payload.seasons]
     rows = gather_dc_training_data(payload.league_id, seasons, half_life_days=payload.half_life_days)
     if len(rows) < 200:
@@ -7801,7 +8871,7 @@ async def api_dc_train(payload: DCTrainPayload):
     return {"ok": True, "league_id": payload.league_id, "meta": meta}
 
 @app.get("/api/dc/fixture/{fixture_id}")
-async def api_dc_fixture(fixture_id: int):
+def api_dc_fixture(fixture_id: int):
     fx = get_fixture_by_id(int(fixture_id))
     if not fx:
         raise HTTPException(status_code=404, detail="Fixture nije u kešu (fixtures tabela). Pokreni pripremu dana ili dovedi taj fixture.")
@@ -0,0 +1,30 @@
+# backfill_dimensions.py
+# Jednokratni backfill teams/leagues i match_facts tabela iz postojećih podataka.
+# Novi redovi dalje stižu pri ingest-u (store_fixture_data_in_db / DataRepo._store_fixtures / insert_*_matches).
+#
+#   python backfill_dimensions.py [--batch 2000] [--skip-dimensions] [--skip-match-facts]
+import argparse
+import time
+
+from services.data_repo import backfill_dimensions, backfill_match_facts
+from services.schema import apply_migrations
+
+def main():
+    ap = argparse.ArgumentParser(description="Backfill teams/leagues + match_facts iz fixtures/team_matches/h2h_matches")
+    ap.add_argument("--batch", type=int, default=2000)
+    ap.add_argument("--skip-dimensions", action="store_true")
+    ap.add_argument("--skip-match-facts", action="store_true")
+    args = ap.parse_args()
+
+    apply_migrations()
+    if not args.skip_dimensions:
+        t0 = time.perf_counter()
+        n_teams, n_leagues = backfill_dimensions(batch=args.batch)
+        print(f"[backfill] teams upserts={n_teams} leagues upserts={n_leagues} in {time.perf_counter() - t0:.1f}s")
+    if not args.skip_match_facts:
+        t0 = time.perf_counter()
+        counts = backfill_match_facts(batch=args.batch)
+        print(f"[backfill] match_facts {counts} in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
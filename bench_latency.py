@@ -0,0 +1,107 @@
+# bench_latency.py
+# Latency benchmark za serving putanju (p50/p95/p99 pod konkurentnim opterećenjem).
+#
+# Primer (pokreni protiv starog i novog build-a, isti parametri):
+#   python bench_latency.py --base http://127.0.0.1:3000 --concurrency 50 --requests 2000 \
+#          --session <SESSION_ID> --label before
+#   python bench_latency.py ... --label after --out bench_results.json
+#
+# Meša "brze" (global-loader-status, auth/me) i "teške" (analyze, team-stats) pozive, tako da se vidi
+# da li jedan spor upit blokira ostale zahteve na istom workeru (repa raspodele → p99).
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+
+DEFAULT_MIX = [
+    ("GET", "/api/global-loader-status", 4),
+    ("GET", "/api/auth/me?session_id={session}", 3),
+    ("GET", "/api/analyze?market=1h_over05", 2),
+    ("GET", "/api/analyze?market=ft_over15", 1),
+    ("GET", "/api/team-stats?market=gg1h", 1),
+]
+
+def _percentile(arr, q):
+    if not arr:
+        return None
+    arr2 = sorted(arr)
+    k = (len(arr2) - 1) * q
+    f = int(k); c = min(f + 1, len(arr2) - 1)
+    return arr2[f] + (arr2[c] - arr2[f]) * (k - f)
+
+async def _worker(session, base, jobs, lat, errors):
+    while True:
+        try:
+            method, path = jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        t0 = time.perf_counter()
+        try:
+            async with session.request(method, base + path, headers={"Accept-Encoding": "gzip"}) as resp:
+                await resp.read()
+                if resp.status >= 500:
+                    errors.append(resp.status)
+        except Exception as e:
+            errors.append(str(e))
+        lat.setdefault(path.split("?")[0], []).append((time.perf_counter() - t0) * 1000.0)
+
+async def run(base, concurrency, total, session_id):
+    weighted = [(m, p.format(session=session_id or "")) for m, p, w in DEFAULT_MIX for _ in range(w)]
+    jobs = asyncio.Queue()
+    for _ in range(total):
+        jobs.put_nowait(random.choice(weighted))
+    lat, errors = {}, []
+    t0 = time.perf_counter()
+    conn = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=conn, timeout=aiohttp.ClientTimeout(total=60)) as s:
+        await asyncio.gather(*[_worker(s, base, jobs, lat, errors) for _ in range(concurrency)])
+    wall = time.perf_counter() - t0
+
+    def _summ(arr):
+        return {"n": len(arr), "p50_ms": _percentile(arr, 0.50), "p95_ms": _percentile(arr, 0.95),
+                "p99_ms": _percentile(arr, 0.99), "max_ms": max(arr) if arr else None}
+
+    all_lat = [x for arr in lat.values() for x in arr]
+    return {
+        "concurrency": concurrency, "requests": total, "wall_sec": round(wall, 3),
+        "rps": round(total / wall, 1) if wall > 0 else None, "errors": len(errors),
+        "overall": _summ(all_lat),
+        "endpoints": {k: _summ(v) for k, v in sorted(lat.items())},
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="p50/p95/p99 latencija serving endpoint-a pod opterećenjem")
+    ap.add_argument("--base", default="http://127.0.0.1:3000")
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--session", default=None, help="session_id za /api/auth/me")
+    ap.add_argument("--label", default="run")
+    ap.add_argument("--out", default=None, help="JSON fajl u koji se dopisuje rezultat (po label-u)")
+    args = ap.parse_args()
+
+    res = asyncio.run(run(args.base.rstrip("/"), args.concurrency, args.requests, args.session))
+    res["label"] = args.label
+    o = res["overall"]
+    print(f"[{args.label}] {res['requests']} req / c={res['concurrency']} → {res['rps']} rps, "
+          f"p50={o['p50_ms']:.1f}ms p95={o['p95_ms']:.1f}ms p99={o['p99_ms']:.1f}ms, errors={res['errors']}")
+    for ep, st in res["endpoints"].items():
+        print(f"   {ep:32s} n={st['n']:5d}  p50={st['p50_ms']:.1f}  p99={st['p99_ms']:.1f}  max={st['max_ms']:.1f}")
+
+    if args.out:
+        try:
+            with open(args.out) as f:
+                data = json.load(f)
+        except Exception:
+            data = {}
+        data[args.label] = res
+        with open(args.out, "w") as f:
+            json.dump(data, f, indent=2)
+        if "before" in data and "after" in data:
+            b, a = data["before"]["overall"]["p99_ms"], data["after"]["overall"]["p99_ms"]
+            print(f"p99 before={b:.1f}ms after={a:.1f}ms ({(a - b) / b * 100:+.1f}%)")
+
+if __name__ == "__main__":
+    main()
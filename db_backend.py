@@ -1,5 +1,5 @@
 # db_backend.py — MySQL shim za backend
-import threading, json
+import json
 
 from mysql_database import (
     get_mysql_connection,
@@ -8,6 +8,7 @@ from mysql_database import (
     insert_h2h_matches as _ins_h2h,
     try_read_fixture_statistics as _try_read_stats,
 )
+from services.write_behind import enqueue_match_facts, enqueue_match_statistics, await_match_statistics
 
 # Pokušaj da uvezeš insert_match_statistics iz mysql_database; ako ga nema, uradi fallback
 try:
@@ -15,7 +16,8 @@ try:
 except Exception:
     _ins_match_stats = None
 
-DB_WRITE_LOCK = threading.RLock()
+# Nema globalnog write lock-a: pozadinski upisi idu kroz services/write_behind.py (writer po grupi tabela),
+# ostali su kratke samostalne transakcije – MySQL sam rešava konkurentne upise.
 
 def get_connection():
     """Vrati MySQL konekciju (iz pool-a)."""
@@ -26,35 +28,26 @@ def create_all_tables():
     return _create_all_tables()
 
 def insert_team_matches(team_id: int, matches: list):
-    return _ins_tm(team_id, matches)
+    res = _ins_tm(team_id, matches)
+    enqueue_match_facts(matches)   # match_facts samo kroz write-behind grupu "history"
+    return res
 
 def insert_h2h_matches(a: int, b: int, matches: list):
-    return _ins_h2h(a, b, matches)
+    res = _ins_h2h(a, b, matches)
+    enqueue_match_facts(matches)
+    return res
 
 def try_read_fixture_statistics(fixture_id: int):
+    await_match_statistics(fixture_id)
     return _try_read_stats(fixture_id)
 
 def insert_match_statistics(fixture_id: int, stats_data):
     """
     Ako mysql_database ima svoju implementaciju, koristi nju.
-    U suprotnom — minimalni fallback upsert u MySQL.
+    U suprotnom — upsert kroz write-behind grupu "stats" (isti red kao ostali pisci match_statistics).
     """
     if _ins_match_stats is not None:
         return _ins_match_stats(fixture_id, stats_data)
 
-    conn = get_connection()
-    cur = conn.cursor()
     data_json = json.dumps(stats_data, ensure_ascii=False, default=str) if stats_data else None
-    # upsert
-    cur.execute(
-        """
-        INSERT INTO match_statistics (fixture_id, data, updated_at)
-        VALUES (%s, %s, CURRENT_TIMESTAMP)
-        ON DUPLICATE KEY UPDATE
-            data = VALUES(data),
-            updated_at = CURRENT_TIMESTAMP
-        """,
-        (fixture_id, data_json),
-    )
-    conn.commit()
-    conn.close()
+    enqueue_match_statistics(fixture_id, data_json)
@@ -0,0 +1,214 @@
+# models/batch_scoring.py
+# Vektorizovana (NumPy) verzija završnog dela calculate_final_probability* funkcija.
+# Ulaz je "feature matrica" dana: dict kolona (np.ndarray, jedna vrednost po meču) koju
+# sklapa appli.score_fixtures_batch. Skalarni put u appli.py ostaje referenca —
+# formule ovde moraju da prate njega 1:1 (vidi appli.check_batch_parity).
+from __future__ import annotations
+from typing import Dict, Optional
+import numpy as np
+
+EPS_P = 1e-6
+
+def logit(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, EPS_P, 1 - EPS_P)
+    return np.log(p / (1 - p))
+
+def inv_logit(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
+
+def shift_logit(p: np.ndarray, adj) -> np.ndarray:
+    return inv_logit(logit(p) + adj)
+
+def beta_shrunk(hits: np.ndarray, total: np.ndarray, m, tau: float) -> np.ndarray:
+    m = np.broadcast_to(np.asarray(m, dtype=float), np.shape(hits))
+    a0 = m * tau
+    b0 = (1 - m) * tau
+    out = (hits + a0) / np.maximum(1e-9, total + a0 + b0)
+    return np.where(total > 0, out, m)
+
+def weight_from_effn(p: np.ndarray, eff_n: np.ndarray) -> np.ndarray:
+    p = np.clip(p, EPS_P, 1 - EPS_P)
+    var_p = p * (1 - p) / np.maximum(1.0, eff_n)
+    var_logit = var_p / (p * p * (1 - p) * (1 - p))
+    return 1.0 / np.maximum(1e-6, var_logit)
+
+def fuse_by_precision(p1, effn1, p2, effn2):
+    w1 = weight_from_effn(p1, effn1)
+    w2 = weight_from_effn(p2, effn2)
+    z = (logit(p1) * w1 + logit(p2) * w2) / (w1 + w2)
+    return inv_logit(z), w2 / (w1 + w2)
+
+def blend_with_market(p: np.ndarray, odds: Optional[float], alpha: float) -> np.ndarray:
+    if not odds or odds <= 1.0:
+        return p
+    p_mkt = np.full_like(p, 1.0 / odds)
+    return inv_logit(alpha * logit(p) + (1.0 - alpha) * logit(p_mkt))
+
+def zscore(x: np.ndarray, mu: np.ndarray, sigma: np.ndarray) -> np.ndarray:
+    # isto kao appli._z: None (NaN) ili sigma<1e-6 → 0
+    ok = ~np.isnan(x) & ~np.isnan(mu) & ~np.isnan(sigma) & (sigma >= 1e-6)
+    return np.where(ok, (np.nan_to_num(x) - np.nan_to_num(mu)) / np.where(ok, sigma, 1.0), 0.0)
+
+def poisson_ge2_from_ge1(p_ge1: np.ndarray) -> np.ndarray:
+    lam = -np.log(np.maximum(1e-9, 1.0 - p_ge1))
+    return 1.0 - np.exp(-lam) * (1.0 + lam)
+
+def _critical_features(p: np.ndarray, c: Dict[str, np.ndarray], W: dict, base_da: np.ndarray) -> np.ndarray:
+    """pace_da_total / lineups_have / lineups_fw_count / inj_count logit korekcije priora."""
+    pace = c["pace_da_total"]
+    pace_on = pace > 0
+    pace_z = np.where(base_da > 0, (pace - base_da) / np.maximum(1.0, base_da * 0.5), 0.0)
+    p = np.where(pace_on, shift_logit(p, W.get("PACE_DA_ADJ", 0.04) * pace_z), p)
+
+    p = np.where(c["lineups_have"] > 0, shift_logit(p, W.get("LINEUPS_HAVE_ADJ", 0.03)), p)
+
+    fw = c["lineups_fw_count"]
+    fw_on = ~np.isnan(fw) & (np.nan_to_num(fw) > 0)
+    fw_norm = np.clip((np.nan_to_num(fw) - 1) / 3.0, 0.0, 1.0)
+    p = np.where(fw_on, shift_logit(p, W.get("LINEUPS_FW_ADJ", 0.02) * fw_norm), p)
+
+    inj = c["inj_count"]
+    inj_on = ~np.isnan(inj) & (np.nan_to_num(inj) > 0)
+    inj_norm = np.minimum(1.0, np.nan_to_num(inj) / 10.0)
+    p = np.where(inj_on, shift_logit(p, -W.get("INJ_COUNT_ADJ", 0.02) * inj_norm), p)
+    return p
+
+def _rho(c: Dict[str, np.ndarray], offset: float, slope: float, lo: float, hi: float,
+         gap_k: float, gap_floor: float) -> np.ndarray:
+    pace_z = zscore(c["pace_sot_total"], c["mu_sot1h"], c["sd_sot1h"])
+    rho_base = np.clip(offset + slope * pace_z, lo, hi)
+    rho_factor = np.maximum(gap_floor, 1.0 - gap_k * np.abs(c["tier_gap_home"]))
+    return rho_base * rho_factor
+
+def _cup(p: np.ndarray, c: Dict[str, np.ndarray], cup_mult: float) -> np.ndarray:
+    mult = np.where(c["is_cup"] > 0, cup_mult, 1.0)
+    return np.clip(p * mult, 0.0, 1.0)
+
+def score_1h_over05(c: Dict[str, np.ndarray], W: dict, *, odds: Optional[float] = None,
+                    alpha: float = 0.7, cup_mult: float = 1.0) -> np.ndarray:
+    """Vraća final_percent (0..100) po meču — ekvivalent calculate_final_probability."""
+    m = c["m1h"]
+    p_home = beta_shrunk(c["h_home"], c["w_home"], m, 8.0)
+    p_away = beta_shrunk(c["h_away"], c["w_away"], m, 8.0)
+    p_team = (p_home + p_away) / 2.0
+
+    h2h_ok = c["w_h2h"] >= 2.5
+    p_h2h = np.where(h2h_ok, beta_shrunk(c["h_h2h"], c["w_h2h"], m, 12.0), m)
+    effn_h2h = np.where(h2h_ok, c["w_h2h"] * 0.4, 0.0)
+
+    p_prior, _ = fuse_by_precision(p_team, c["w_home"] + c["w_away"], p_h2h, effn_h2h)
+    w_min = float(W.get("MINUTE_PRIOR_BLEND", 0.25))
+    p_prior = np.where(np.isnan(c["p_minute"]), p_prior, (1.0 - w_min) * p_prior + w_min * np.nan_to_num(c["p_minute"]))
+    p_prior = shift_logit(p_prior, W.get("FTSCS_ADJ", 0.05) * c["fts_cs_adj"])
+    p_prior = shift_logit(p_prior, W.get("FORM_ADJ", 0.03) * c["form_adj"])
+    p_prior = shift_logit(p_prior, W.get("COACH_ADJ", 0.02) * c["coach_adj"])
+    p_prior = _critical_features(p_prior, c, W, c["mu_da1h"])
+
+    pH, pA = c["p_home_goal"], c["p_away_goal"]
+    rho = _rho(c, 0.05, 0.05, -0.05, 0.20, 0.20, 0.5)
+    no_goal = (1.0 - pH) * (1.0 - pA)
+    cov = rho * np.sqrt(np.maximum(0.0, pH * (1 - pH) * pA * (1 - pA)))
+    p_micro = np.clip(1.0 - np.maximum(0.0, no_goal - cov), 0.0, 1.0)
+
+    effn_prior = np.maximum(1.0, c["w_home"] + c["w_away"] + c["str_effn"] + effn_h2h)
+    p_final, _ = fuse_by_precision(p_prior, effn_prior, p_micro, c["effn_micro"])
+    p_final = blend_with_market(p_final, odds, alpha)
+    return _cup(p_final, c, cup_mult) * 100.0
+
+def score_1h_over15(c: Dict[str, np.ndarray], W: dict, *, odds: Optional[float] = None,
+                    alpha: float = 0.7, cup_mult: float = 1.0) -> np.ndarray:
+    """Ekvivalent calculate_final_probability_over15."""
+    m2 = poisson_ge2_from_ge1(c["m1h"])
+    p_home = beta_shrunk(c["h_home"], c["w_home"], m2, 10.0)
+    p_away = beta_shrunk(c["h_away"], c["w_away"], m2, 10.0)
+    p_team = (p_home + p_away) / 2.0
+
+    h2h_ok = c["w_h2h"] >= 2.0
+    p_h2h = np.where(h2h_ok, beta_shrunk(c["h_h2h"], c["w_h2h"], m2, 14.0), m2)
+    effn_h2h = np.where(h2h_ok, c["w_h2h"] * 0.35, 0.0)
+
+    p_prior, _ = fuse_by_precision(p_team, c["w_home"] + c["w_away"], p_h2h, effn_h2h)
+    w_min = float(W.get("MINUTE_PRIOR_BLEND", 0.25))
+    p_min2 = poisson_ge2_from_ge1(np.nan_to_num(c["p_minute"]))
+    p_prior = np.where(np.isnan(c["p_minute"]), p_prior, (1.0 - w_min) * p_prior + w_min * p_min2)
+    p_prior = shift_logit(p_prior, 0.8 * W.get("FTSCS_ADJ", 0.05) * c["fts_cs_adj"])
+    p_prior = shift_logit(p_prior, W.get("FORM_ADJ", 0.03) * c["form_adj"])
+    p_prior = shift_logit(p_prior, W.get("COACH_ADJ", 0.02) * c["coach_adj"])
+    p_prior = _critical_features(p_prior, c, W, c["mu_da1h"])
+
+    pH, pA = c["p_home_goal"], c["p_away_goal"]
+    rho = _rho(c, 0.05, 0.05, -0.05, 0.20, 0.20, 0.5)
+    no_goal = (1.0 - pH) * (1.0 - pA)
+    cov = rho * np.sqrt(np.maximum(0.0, pH * (1 - pH) * pA * (1 - pA)))
+    p_ge1 = np.clip(1.0 - np.maximum(0.0, no_goal - cov), 0.0, 1.0)
+    p_micro = poisson_ge2_from_ge1(p_ge1)
+
+    effn_prior = np.maximum(1.0, c["w_home"] + c["w_away"] + c["str_effn"] + effn_h2h)
+    p_final, _ = fuse_by_precision(p_prior, effn_prior, p_micro, c["effn_micro"])
+    p_final = blend_with_market(p_final, odds, alpha)
+    return _cup(p_final, c, cup_mult) * 100.0
+
+def score_gg1h(c: Dict[str, np.ndarray], W: dict, *, odds: Optional[float] = None,
+               alpha: float = 0.7, cup_mult: float = 1.0) -> np.ndarray:
+    """Ekvivalent calculate_final_probability_gg."""
+    m = c["m1h"]
+    m_gg = m * m * 0.8 + 0.02
+    p_home = beta_shrunk(c["h_home"], c["w_home"], m_gg, 8.0)
+    p_away = beta_shrunk(c["h_away"], c["w_away"], m_gg, 8.0)
+    p_team = (p_home + p_away) / 2.0
+
+    p_h2h = beta_shrunk(c["h_h2h"], c["w_h2h"], m_gg, 12.0)
+    effn_h2h = np.maximum(0.0, c["w_h2h"] * 0.35)
+
+    p_prior, _ = fuse_by_precision(p_team, c["w_home"] + c["w_away"], p_h2h, effn_h2h)
+    p_prior = shift_logit(p_prior, W.get("FORM_ADJ", 0.03) * c["form_adj"])
+    p_prior = shift_logit(p_prior, W.get("COACH_ADJ", 0.02) * c["coach_adj"])
+    p_prior = _critical_features(p_prior, c, W, c["mu_da1h"])
+
+    pH, pA = c["p_home_goal"], c["p_away_goal"]
+    rho = _rho(c, 0.03, 0.04, -0.10, 0.15, 0.25, 0.4)
+    cov = rho * np.sqrt(np.maximum(0.0, pH * (1 - pH) * pA * (1 - pA)))
+    p_micro = np.clip(pH * pA + cov, 0.0, 1.0)
+
+    effn_prior = np.maximum(1.0, c["w_home"] + c["w_away"] + effn_h2h)
+    p_final, _ = fuse_by_precision(p_prior, effn_prior, p_micro, c["effn_micro"])
+    p_final = blend_with_market(p_final, odds, alpha)
+    return _cup(p_final, c, cup_mult) * 100.0
+
+def score_ft_over15(c: Dict[str, np.ndarray], W: dict, *, odds: Optional[float] = None,
+                    alpha: float = 0.7, calibration: Optional[dict] = None) -> np.ndarray:
+    """Ekvivalent calculate_final_probability_ft_over15 (vraća verovatnoću 0..1, kao i skalarni put)."""
+    m2p = c["m2p"]
+    p_home = beta_shrunk(c["h_home"], c["w_home"], m2p, 10.0)
+    p_away = beta_shrunk(c["h_away"], c["w_away"], m2p, 10.0)
+    p_team = (p_home + p_away) / 2.0
+
+    h2h_ok = c["w_h2h"] >= 2.5
+    p_h2h = np.where(h2h_ok, beta_shrunk(c["h_h2h"], c["w_h2h"], m2p, 12.0), m2p)
+    effn_h2h = np.where(h2h_ok, c["w_h2h"] * 0.4, 0.0)
+
+    p_prior, _ = fuse_by_precision(p_team, c["w_home"] + c["w_away"], p_h2h, effn_h2h)
+    w_min = float(W.get("MINUTE_PRIOR_BLEND", 0.25))
+    p_prior = np.where(np.isnan(c["p_minute"]), p_prior, (1.0 - w_min) * p_prior + w_min * np.nan_to_num(c["p_minute"]))
+    p_prior = shift_logit(p_prior, W.get("FTSCS_ADJ", 0.05) * c["fts_cs_adj"])
+    p_prior = shift_logit(p_prior, W.get("FORM_ADJ", 0.03) * c["form_adj"])
+    p_prior = shift_logit(p_prior, W.get("COACH_ADJ", 0.02) * c["coach_adj"])
+    p_prior = _critical_features(p_prior, c, W, c["mu_da_ft"])
+
+    lam_total = np.maximum(0.0, c["lam_home"] + c["lam_away"])
+    p_micro = np.clip(1.0 - np.exp(-lam_total) * (1.0 + lam_total), 0.0, 1.0)
+
+    w = np.minimum(1.0, c["coverage"] / 8.0)
+    p_final = inv_logit((1 - w) * logit(p_prior) + w * logit(p_micro))
+    p_final = blend_with_market(p_final, odds, alpha)
+
+    cal = calibration or {}
+    temp = max(1e-6, float(cal.get("TEMP", 1.0)))
+    z = logit(np.clip(p_final, 1e-9, 1 - 1e-9))
+    return np.clip(inv_logit(z / temp), float(cal.get("FLOOR", 0.0)), float(cal.get("CEIL", 1.0)))
+
+MARKET_SCORERS = {
+    "1h_over05": score_1h_over05,
+    "1h_over15": score_1h_over15,
+    "gg1h": score_gg1h,
+}
@@ -0,0 +1,141 @@
+# models/streaming_stats.py
+# Streaming (inkrementalne) statistike za league baselines:
+#  - RunningMoments: Welford mean/variance, spajanje po Chan et al.
+#  - QuantileSketch: DDSketch-like log bucket sketch (relativna greška ~alpha), mergeable
+#  - BaselineAccumulator: sve što compute_league_baselines(_ft) treba po ligi (SOT, DA, hits/tot)
+# Sve klase se serijalizuju u čist dict (JSON kolona u MySQL-u).
+from __future__ import annotations
+import math
+from typing import Dict, Optional
+
+class RunningMoments:
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = int(n)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+
+    def add(self, x: float) -> None:
+        x = float(x)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other: "RunningMoments") -> None:
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    def mu(self) -> Optional[float]:
+        return float(self.mean) if self.n > 0 else None
+
+    def sd(self) -> Optional[float]:
+        # uzoračka (n-1), isto kao stari _pack
+        return (self.m2 / (self.n - 1)) ** 0.5 if self.n >= 2 else None
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> "RunningMoments":
+        d = d or {}
+        return cls(d.get("n", 0), d.get("mean", 0.0), d.get("m2", 0.0))
+
+
+class QuantileSketch:
+    """Log-bucket sketch: vrednost x>0 ide u bucket ceil(log_gamma(x)); x<=0 u zero bucket."""
+    __slots__ = ("alpha", "gamma", "_lg", "zero", "buckets", "count")
+
+    def __init__(self, alpha: float = 0.01, zero: int = 0, buckets: Optional[Dict[int, int]] = None, count: int = 0):
+        self.alpha = float(alpha)
+        self.gamma = (1.0 + self.alpha) / (1.0 - self.alpha)
+        self._lg = math.log(self.gamma)
+        self.zero = int(zero)
+        self.buckets: Dict[int, int] = dict(buckets or {})
+        self.count = int(count)
+
+    def add(self, x: float) -> None:
+        x = float(x)
+        self.count += 1
+        if x <= 1e-9:
+            self.zero += 1
+            return
+        k = int(math.ceil(math.log(x) / self._lg))
+        self.buckets[k] = self.buckets.get(k, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self.zero += other.zero
+        self.count += other.count
+        for k, c in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + c
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen > rank:
+                return float(2.0 * self.gamma ** k / (self.gamma + 1.0))
+        return float(2.0 * self.gamma ** max(self.buckets) / (self.gamma + 1.0)) if self.buckets else 0.0
+
+    def to_dict(self) -> dict:
+        return {"alpha": self.alpha, "zero": self.zero, "count": self.count,
+                "buckets": {str(k): c for k, c in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> "QuantileSketch":
+        d = d or {}
+        return cls(d.get("alpha", 0.01), d.get("zero", 0),
+                   {int(k): int(c) for k, c in (d.get("buckets") or {}).items()}, d.get("count", 0))
+
+
+class BaselineAccumulator:
+    """Po-ligaški agregat: SOT/DA momenti + q95 sketch + brojač pogodaka (1H≥1 ili FT≥2)."""
+
+    def __init__(self, sot=None, da=None, sot_q=None, da_q=None, hits: float = 0.0, tot: float = 0.0):
+        self.sot = sot or RunningMoments()
+        self.da = da or RunningMoments()
+        self.sot_q = sot_q or QuantileSketch()
+        self.da_q = da_q or QuantileSketch()
+        self.hits = float(hits)
+        self.tot = float(tot)
+
+    def add(self, sot: Optional[float], da: Optional[float], hit: bool) -> None:
+        if sot is not None:
+            self.sot.add(sot); self.sot_q.add(sot)
+        if da is not None:
+            self.da.add(da); self.da_q.add(da)
+        if hit:
+            self.hits += 1.0
+        self.tot += 1.0
+
+    def merge(self, other: "BaselineAccumulator") -> None:
+        self.sot.merge(other.sot); self.sot_q.merge(other.sot_q)
+        self.da.merge(other.da);   self.da_q.merge(other.da_q)
+        self.hits += other.hits
+        self.tot += other.tot
+
+    def to_dict(self) -> dict:
+        return {"sot": self.sot.to_dict(), "da": self.da.to_dict(),
+                "sot_q": self.sot_q.to_dict(), "da_q": self.da_q.to_dict(),
+                "hits": self.hits, "tot": self.tot}
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> "BaselineAccumulator":
+        d = d or {}
+        return cls(RunningMoments.from_dict(d.get("sot")), RunningMoments.from_dict(d.get("da")),
+                   QuantileSketch.from_dict(d.get("sot_q")), QuantileSketch.from_dict(d.get("da_q")),
+                   d.get("hits", 0.0), d.get("tot", 0.0))
@@ -1,6 +1,9 @@
 import time
 import os
 import json
+import atexit
+import threading
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import mysql.connector
 from mysql.connector import pooling, PoolError
@@ -69,6 +72,10 @@ def _build_dbconfig():
         password=password,
         database=database,
         autocommit=False,
+        # sesija u UTC: TIMESTAMP kolone (updated_at, expires_at …) se čitaju kao naivni UTC i NOW()
+        # je UTC, pa se porede sa datetime.utcnow() bez obzira na time_zone servera
+        # (konektor ga ponovo postavlja i posle reset-a pooled konekcije)
+        time_zone="+00:00",
     )
 
     # TLS: Ako imamo CA, verifikuj; ako nemamo, koristi TLS bez verifikacije
@@ -114,6 +121,8 @@ def get_mysql_connection():
     return _connection_pool.get_connection()
 
 def insert_team_matches(team_id: int, matches: list):
+    # redovi rekonstruisani iz match_facts su već tamo (i siromašniji od API JSON-a) – ne prepisuj
+    matches = [m for m in (matches or []) if isinstance(m, dict) and m.get("_source") != "match_facts"]
     if not matches:
         return
     conn = get_mysql_connection()
@@ -137,6 +146,8 @@ def insert_team_matches(team_id: int, matches: list):
         conn.close()
 
 def insert_h2h_matches(a: int, b: int, matches: list):
+    # redovi rekonstruisani iz match_facts su već tamo (i siromašniji od API JSON-a) – ne prepisuj
+    matches = [m for m in (matches or []) if isinstance(m, dict) and m.get("_source") != "match_facts"]
     if not matches:
         return
     x, y = sorted([a, b])
@@ -188,6 +199,306 @@ def try_read_fixture_statistics(fixture_id: int):
         return None
     return None
 
+def read_fixture_statistics_meta(fixture_id: int):
+    """
+    (data, updated_at, final) za match_statistics red ili None. final je zapisan pri upisu statistike
+    (MATCH_STATISTICS_UPSERT_SQL) – da li je meč tada već bio završen, ne kakav je status sada.
+    """
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT data, updated_at, final FROM match_statistics WHERE fixture_id = %s",
+                    (int(fixture_id),))
+        row = cur.fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    val = row[0]
+    try:
+        if isinstance(val, (bytes, bytearray)):
+            val = val.decode("utf-8", "ignore")
+        if isinstance(val, str):
+            val = json.loads(val)
+    except Exception:
+        val = None
+    return val, row[1], bool(row[2])
+
+SYNC_STATS_JSON_CHUNK = 1000
+
+def sync_fixture_stats_json(cur, fixture_ids=None) -> int:
+    """
+    fixtures.stats_json je samo duplikat match_statistics.data (izvor istine je match_statistics po fixture_id).
+    Gde je duplikat još potreban, puni se jednim UPDATE … JOIN-om po chunk-u (bez čitanja u Python).
+    fixture_ids=None → sve fixtures koje imaju statistiku. Vraća broj izmenjenih redova.
+    """
+    base = """
+        UPDATE fixtures f
+        JOIN match_statistics ms ON ms.fixture_id = f.id
+        SET f.stats_json = ms.data
+        WHERE ms.data IS NOT NULL AND NOT (f.stats_json <=> ms.data)
+    """
+    if fixture_ids is None:
+        cur.execute(base)
+        return cur.rowcount or 0
+    ids = sorted({int(x) for x in fixture_ids if x is not None})
+    changed = 0
+    for i in range(0, len(ids), SYNC_STATS_JSON_CHUNK):
+        chunk = ids[i:i + SYNC_STATS_JSON_CHUNK]
+        cur.execute(base + f" AND f.id IN ({','.join(['%s'] * len(chunk))})", tuple(chunk))
+        changed += cur.rowcount or 0
+    return changed
+
+# ===== match_facts: tipizovane činjenice o meču (umesto dekodiranja celog fixture JSON-a) =====
+MATCH_FACTS_FINAL = ("FT", "AET", "PEN")
+
+# statistika upisana posle ovoliko minuta od početka meča je konačna i kad match_facts status kasni
+MATCH_STATS_FINAL_AFTER_MIN = 180
+_MATCH_NOT_PLAYED = ("PST", "CANC", "ABD", "SUSP", "INT", "TBD", "AWD", "WO")
+
+def _stats_final_sql(fid_expr: str, at_expr: str) -> str:
+    """SQL uslov: meč fid_expr je u trenutku at_expr bio završen (status FT/AET/PEN ili prošao termin)."""
+    fin = ", ".join(f"'{st}'" for st in MATCH_FACTS_FINAL)
+    not_played = ", ".join(f"'{st}'" for st in _MATCH_NOT_PLAYED)
+    return (f"EXISTS (SELECT 1 FROM match_facts mf WHERE mf.fixture_id = {fid_expr}"
+            f" AND (mf.status IN ({fin}) OR (mf.date <= {at_expr} - INTERVAL {MATCH_STATS_FINAL_AFTER_MIN} MINUTE"
+            f" AND mf.status NOT IN ({not_played}))))")
+
+# jedini upsert za match_statistics (write-behind, DataRepo, db_backend): final se računa u trenutku upisa.
+# Parametri: (fixture_id, data_json, fixture_id)
+MATCH_STATISTICS_UPSERT_SQL = f"""
+    INSERT INTO match_statistics (fixture_id, data, final, updated_at)
+    VALUES (%s, %s, {_stats_final_sql("%s", "NOW()")}, NOW())
+    ON DUPLICATE KEY UPDATE
+        data = VALUES(data),
+        final = VALUES(final),
+        updated_at = NOW()
+"""
+
+def ensure_match_statistics_final_column():
+    """Stare instalacije: match_statistics.final + backfill (statistika povučena posle kraja meča je konačna)."""
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'match_statistics' AND COLUMN_NAME = 'final'
+        """)
+        if (cur.fetchone() or [0])[0] == 0:
+            cur.execute("ALTER TABLE match_statistics ADD COLUMN final TINYINT(1) NOT NULL DEFAULT 0 AFTER data")
+            cur.execute(f"""
+                UPDATE match_statistics ms SET ms.final = 1
+                WHERE {_stats_final_sql("ms.fixture_id", "ms.updated_at")}
+            """)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _facts_int(v):
+    try:
+        return int(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _facts_dt(s):
+    """ISO datum iz API-ja → naive UTC datetime (MySQL DATETIME)."""
+    if not s:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(s).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def match_fact_row(m: dict):
+    """API fixture dict → red za match_facts (ili None ako nema id/timova)."""
+    if not isinstance(m, dict):
+        return None
+    fx = m.get("fixture") or {}
+    lg = m.get("league") or {}
+    th = ((m.get("teams") or {}).get("home") or {})
+    ta = ((m.get("teams") or {}).get("away") or {})
+    fid, hid, aid = _facts_int(fx.get("id")), _facts_int(th.get("id")), _facts_int(ta.get("id"))
+    if not fid or not hid or not aid:
+        return None
+    score = m.get("score") or {}
+    ht = score.get("halftime") or {}
+    ft = score.get("fulltime") or {}
+    goals = m.get("goals") or {}
+    ft_home = _facts_int(ft.get("home")) if ft.get("home") is not None else _facts_int(goals.get("home"))
+    ft_away = _facts_int(ft.get("away")) if ft.get("away") is not None else _facts_int(goals.get("away"))
+    return (
+        fid, _facts_dt(fx.get("date")), _facts_int(lg.get("id")), _facts_int(lg.get("season")),
+        hid, aid, (th.get("name") or "")[:255], (ta.get("name") or "")[:255],
+        ((fx.get("status") or {}).get("short") or "")[:8],
+        _facts_int(ht.get("home")), _facts_int(ht.get("away")), ft_home, ft_away,
+        (lg.get("name") or "")[:255], (lg.get("country") or "")[:128],
+        (th.get("logo") or "")[:512], (ta.get("logo") or "")[:512],
+    )
+
+MATCH_FACTS_UPSERT_SQL = """
+    INSERT INTO match_facts (fixture_id, date, league_id, season, team_home_id, team_away_id,
+                             home_name, away_name, status, ht_home, ht_away, ft_home, ft_away,
+                             league_name, country, home_logo, away_logo, updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE
+        date = COALESCE(VALUES(date), date),
+        league_id = COALESCE(VALUES(league_id), league_id),
+        season = COALESCE(VALUES(season), season),
+        team_home_id = VALUES(team_home_id),
+        team_away_id = VALUES(team_away_id),
+        home_name = COALESCE(NULLIF(VALUES(home_name), ''), home_name),
+        away_name = COALESCE(NULLIF(VALUES(away_name), ''), away_name),
+        status = COALESCE(NULLIF(VALUES(status), ''), status),
+        ht_home = COALESCE(VALUES(ht_home), ht_home),
+        ht_away = COALESCE(VALUES(ht_away), ht_away),
+        ft_home = COALESCE(VALUES(ft_home), ft_home),
+        ft_away = COALESCE(VALUES(ft_away), ft_away),
+        league_name = COALESCE(NULLIF(VALUES(league_name), ''), league_name),
+        country = COALESCE(NULLIF(VALUES(country), ''), country),
+        home_logo = COALESCE(NULLIF(VALUES(home_logo), ''), home_logo),
+        away_logo = COALESCE(NULLIF(VALUES(away_logo), ''), away_logo),
+        updated_at = NOW()
+"""
+
+def match_fact_to_api(row: dict) -> dict:
+    """Red iz match_facts → API-oblik (fixture/league/teams/goals/score) koji history i prikaz čitaju."""
+    dt = row.get("date")
+    date_iso = dt.replace(tzinfo=timezone.utc).isoformat() if isinstance(dt, datetime) else dt
+    ts = int(dt.replace(tzinfo=timezone.utc).timestamp()) if isinstance(dt, datetime) else None
+    ftH, ftA = row.get("ft_home"), row.get("ft_away")
+    return {
+        "_source": "match_facts",  # insert_*_matches ovakve redove ne prepisuje preko punog JSON-a
+        "fixture": {"id": int(row["fixture_id"]), "date": date_iso, "timestamp": ts,
+                    "status": {"short": row.get("status")}},
+        "league": {"id": row.get("league_id"), "season": row.get("season"),
+                   "name": row.get("league_name") or None, "country": row.get("country") or None},
+        "teams": {"home": {"id": row.get("team_home_id"), "name": row.get("home_name"),
+                           "logo": row.get("home_logo") or None,
+                           "winner": (ftH > ftA) if ftH is not None and ftA is not None and ftH != ftA else None},
+                  "away": {"id": row.get("team_away_id"), "name": row.get("away_name"),
+                           "logo": row.get("away_logo") or None,
+                           "winner": (ftA > ftH) if ftH is not None and ftA is not None and ftH != ftA else None}},
+        "goals": {"home": ftH, "away": ftA},
+        "score": {"halftime": {"home": row.get("ht_home"), "away": row.get("ht_away")},
+                  "fulltime": {"home": ftH, "away": ftA}},
+    }
+
+_MATCH_FACTS_COLS = ("fixture_id, date, league_id, season, team_home_id, team_away_id, home_name, away_name, "
+                     "status, ht_home, ht_away, ft_home, ft_away, league_name, country, home_logo, away_logo, "
+                     "updated_at")
+
+def _facts_complete(rows) -> bool:
+    """Redovi upisani pre kolona za prikaz (league_name/country) nisu potpuni – takav odgovor ide starim putem."""
+    return all(r.get("league_name") for r in rows)
+
+def _history_refreshed_at(cur, team_ids) -> dict:
+    """{team_id: team_history_store.updated_at} – kad je istorija tima poslednji put povučena sa API-ja.
+    Samo taj upis garantuje da su svi noviji mečevi tima u match_facts (ingest dana/h2h upisuje pojedinačne
+    mečeve i ne govori ništa o kompletnosti istorije)."""
+    ids = sorted({int(t) for t in team_ids})
+    if not ids:
+        return {}
+    cur.execute(f"SELECT team_id, updated_at FROM team_history_store WHERE team_id IN ({','.join(['%s'] * len(ids))})",
+                tuple(ids))
+    return {int(t): u for t, u in cur.fetchall()}
+
+def _teams_fresh(cur, team_ids, max_age_hours) -> bool:
+    refreshed = _history_refreshed_at(cur, team_ids)
+    now = datetime.utcnow()
+    for t in team_ids:
+        u = refreshed.get(int(t))
+        if u is None or (now - u).total_seconds() > float(max_age_hours) * 3600.0:
+            return False
+    return True
+
+def _read_facts(sql: str, params: tuple, last_n: int, team_id: int, max_age_hours=None):
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        if len(rows) < int(last_n):
+            return None
+        rows = rows[:int(last_n)]
+        if not _facts_complete(rows):
+            return None
+        # svežina po timu (poslednji refresh istorije), ne po najnovijem redu – današnji ingest
+        # osveži updated_at jednog meča, a rupa u istoriji ostaje
+        if max_age_hours is not None and not _teams_fresh(conn.cursor(), (team_id,), max_age_hours):
+            return None
+    finally:
+        conn.close()
+    return [match_fact_to_api(r) for r in rows]
+
+def read_team_history_facts(team_id: int, last_n: int, max_age_hours=None):
+    """
+    Poslednjih last_n završenih mečeva tima iz match_facts (indeksi (team_home_id, date) / (team_away_id, date)).
+    None = pokrivenost nedovoljna ili zastarela → pozivalac ide starim putem (keš/API).
+    """
+    st = ",".join(["%s"] * len(MATCH_FACTS_FINAL))
+    sql = f"""
+        (SELECT {_MATCH_FACTS_COLS} FROM match_facts
+         WHERE team_home_id = %s AND status IN ({st}) ORDER BY date DESC LIMIT %s)
+        UNION ALL
+        (SELECT {_MATCH_FACTS_COLS} FROM match_facts
+         WHERE team_away_id = %s AND status IN ({st}) ORDER BY date DESC LIMIT %s)
+        ORDER BY date DESC LIMIT %s
+    """
+    n = int(last_n)
+    params = (int(team_id), *MATCH_FACTS_FINAL, n, int(team_id), *MATCH_FACTS_FINAL, n, n)
+    return _read_facts(sql, params, n, int(team_id), max_age_hours)
+
+def read_h2h_facts(team_a: int, team_b: int, last_n: int, max_age_hours=None):
+    """
+    Poslednjih last_n završenih međusobnih mečeva (oba rasporeda domaćin/gost) iz lokalne arhive.
+    Svežina se ne meri po samim h2h redovima (stari mečevi se retko ponovo vide), nego po tome
+    da li je istorija OBA tima skoro povučena (team_history_store.updated_at) – ako jeste, novi
+    međusobni meč bi već bio u arhivi. Upis pojedinačnog meča (ingest dana) se ne računa.
+    None = lokalno pokriće < last_n ili zastarelo.
+    """
+    a, b = int(team_a), int(team_b)
+    n = int(last_n)
+    st = ",".join(["%s"] * len(MATCH_FACTS_FINAL))
+    sql = f"""
+        (SELECT {_MATCH_FACTS_COLS} FROM match_facts
+         WHERE team_home_id = %s AND team_away_id = %s AND status IN ({st}) ORDER BY date DESC LIMIT %s)
+        UNION ALL
+        (SELECT {_MATCH_FACTS_COLS} FROM match_facts
+         WHERE team_home_id = %s AND team_away_id = %s AND status IN ({st}) ORDER BY date DESC LIMIT %s)
+        ORDER BY date DESC LIMIT %s
+    """
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(sql, (a, b, *MATCH_FACTS_FINAL, n, b, a, *MATCH_FACTS_FINAL, n, n))
+        rows = cur.fetchall()
+        if len(rows) < n or not _facts_complete(rows):
+            return None
+        if max_age_hours is not None and not _teams_fresh(conn.cursor(), (a, b), max_age_hours):
+            return None
+    finally:
+        conn.close()
+    return [match_fact_to_api(r) for r in rows]
+
+# brojači izvora h2h odgovora (po procesu) – prepare job prijavljuje lokalni hit ratio
+H2H_SOURCE_STATS = {"local": 0, "cache": 0, "api": 0}
+_H2H_SOURCE_LOCK = threading.Lock()
+
+def note_h2h_source(kind: str) -> None:
+    with _H2H_SOURCE_LOCK:
+        H2H_SOURCE_STATS[kind] = H2H_SOURCE_STATS.get(kind, 0) + 1
+
+def h2h_local_ratio(before: dict) -> dict:
+    """Razlika brojača od snapshot-a `before` + udeo lokalno rešenih parova."""
+    with _H2H_SOURCE_LOCK:
+        diff = {k: H2H_SOURCE_STATS.get(k, 0) - (before or {}).get(k, 0) for k in H2H_SOURCE_STATS}
+    total = sum(diff.values())
+    diff["local_ratio"] = round(diff["local"] / total, 3) if total else None
+    return diff
+
 def create_all_tables():
     """Kreira SVE tabele iz sqlite varijante, ali u MySQL-u."""
     conn = get_mysql_connection()
@@ -207,11 +518,48 @@ def create_all_tables():
             INDEX idx_fixtures_league (league_id)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
+        # indeksi za istoriju po timu (team_stats preračun: team_home_id/team_away_id IN (...) po datumu)
+        for idx, cols in (("idx_fixtures_home_date", "team_home_id, date"),
+                          ("idx_fixtures_away_date", "team_away_id, date")):
+            cur.execute("""
+                SELECT COUNT(*) FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'fixtures' AND INDEX_NAME = %s
+            """, (idx,))
+            if (cur.fetchone() or [0])[0] == 0:
+                cur.execute(f"ALTER TABLE fixtures ADD INDEX {idx} ({cols})")
+
+        # Tipizovane činjenice o mečevima (ht/ft golovi, datum, liga, timovi, status) – puni se pri svakom ingest-u
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS match_facts (
+            fixture_id BIGINT PRIMARY KEY,
+            date DATETIME NULL,
+            league_id INT NULL,
+            season INT NULL,
+            team_home_id INT NOT NULL,
+            team_away_id INT NOT NULL,
+            home_name VARCHAR(255) NOT NULL DEFAULT '',
+            away_name VARCHAR(255) NOT NULL DEFAULT '',
+            status VARCHAR(8) NOT NULL DEFAULT '',
+            ht_home SMALLINT NULL,
+            ht_away SMALLINT NULL,
+            ft_home SMALLINT NULL,
+            ft_away SMALLINT NULL,
+            league_name VARCHAR(255) NOT NULL DEFAULT '',
+            country VARCHAR(128) NOT NULL DEFAULT '',
+            home_logo VARCHAR(512) NOT NULL DEFAULT '',
+            away_logo VARCHAR(512) NOT NULL DEFAULT '',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_mf_home_date (team_home_id, date),
+            INDEX idx_mf_away_date (team_away_id, date),
+            INDEX idx_mf_league_date (league_id, date)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
 
         cur.execute("""
         CREATE TABLE IF NOT EXISTS match_statistics (
             fixture_id BIGINT PRIMARY KEY,
             data JSON,
+            final TINYINT(1) NOT NULL DEFAULT 0,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
@@ -226,6 +574,17 @@ def create_all_tables():
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
 
+        # Rolling istorija: jedan red po timu (poslednjih `depth` mečeva), svaki last_n je slice
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS team_history_store (
+            team_id INT PRIMARY KEY,
+            depth INT NOT NULL,
+            latest_fixture_id BIGINT NOT NULL DEFAULT 0,
+            data JSON,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
         cur.execute("""
         CREATE TABLE IF NOT EXISTS h2h_cache (
             team1_id INT NOT NULL,
@@ -267,6 +626,28 @@ def create_all_tables():
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
 
+        # inkrementalni league baselines: streaming momenti po (liga, scope); league_id=0 je global
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS league_baseline_moments (
+            league_id INT NOT NULL,
+            scope ENUM('1h','ft') NOT NULL,
+            n INT NOT NULL DEFAULT 0,
+            data JSON,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (league_id, scope)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
+        # koji mečevi su već "ušli" u momente (idempotentno dodavanje)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS league_baseline_seen (
+            fixture_id BIGINT NOT NULL,
+            scope ENUM('1h','ft') NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (fixture_id, scope)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
         cur.execute("""
         CREATE TABLE IF NOT EXISTS team_strengths_store (
             team_id INT PRIMARY KEY,
@@ -293,6 +674,19 @@ def create_all_tables():
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
 
+        # materijalizovani po-timski artefakti (profiles/strengths/micro × 1h/ft), verzija = najnoviji fixture u history-ju
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS team_artifacts_store (
+            team_id INT NOT NULL,
+            kind VARCHAR(24) NOT NULL,
+            latest_fixture_id BIGINT NOT NULL DEFAULT 0,
+            params VARCHAR(64) NOT NULL DEFAULT '',
+            data JSON,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (team_id, kind)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
         cur.execute("""
         CREATE TABLE IF NOT EXISTS fixture_extras_store (
             fixture_id BIGINT PRIMARY KEY,
@@ -423,6 +817,15 @@ def create_all_tables():
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
 
+        # Materijalizovan leaderboard po marketu (gradi ga prepare job, serving ga drži u memoriji)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS team_leaderboard (
+            market VARCHAR(32) PRIMARY KEY,
+            data JSON,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
         # Users table for authentication
         cur.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -479,6 +882,27 @@ def create_all_tables():
             pass
         conn.close()
 
+def ensure_match_facts_display_columns():
+    """Stare instalacije: match_facts kolone za prikaz (liga/država/logoi) – guarded ALTER."""
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for col, ddl in (
+            ("league_name", "ADD COLUMN league_name VARCHAR(255) NOT NULL DEFAULT '' AFTER ft_away"),
+            ("country",     "ADD COLUMN country VARCHAR(128) NOT NULL DEFAULT '' AFTER league_name"),
+            ("home_logo",   "ADD COLUMN home_logo VARCHAR(512) NOT NULL DEFAULT '' AFTER country"),
+            ("away_logo",   "ADD COLUMN away_logo VARCHAR(512) NOT NULL DEFAULT '' AFTER home_logo"),
+        ):
+            cur.execute("""
+                SELECT COUNT(*) FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'match_facts' AND COLUMN_NAME = %s
+            """, (col,))
+            if (cur.fetchone() or [0])[0] == 0:
+                cur.execute(f"ALTER TABLE match_facts {ddl}")
+        conn.commit()
+    finally:
+        conn.close()
+
 # ====== USER AUTHENTICATION FUNCTIONS ======
 
 def hash_password(password: str) -> str:
@@ -602,8 +1026,77 @@ def create_session(user_id: int, session_id: str, expires_at: str, ip_address: s
     finally:
         conn.close()
 
+# ---- Session keš: validacija iz memorije, last_accessed se upisuje u batch-u (write-behind) ----
+# keš je po workeru: logout u drugom workeru se ovde vidi najkasnije posle SESSION_CACHE_TTL sekundi
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "5"))             # sekundi
+SESSION_TOUCH_FLUSH_SEC = int(os.getenv("SESSION_TOUCH_FLUSH_SEC", "60"))  # koliko često se flush-uje last_accessed
+SESSION_CACHE_MAX = 10000
+
+_SESSION_CACHE = {}          # session_id -> (cached_at, session dict)
+_PENDING_TOUCHES = set()     # session_id-jevi kojima treba osvežiti last_accessed
+_REVOKED_SESSIONS = {}       # session_id -> monotonic vreme brisanja (SELECT u letu ne sme da je vrati u keš)
+_SESSION_CACHE_LOCK = threading.Lock()
+_TOUCH_FLUSHER_STARTED = False
+
+def _ensure_touch_flusher():
+    global _TOUCH_FLUSHER_STARTED
+    if _TOUCH_FLUSHER_STARTED:
+        return
+    with _SESSION_CACHE_LOCK:
+        if _TOUCH_FLUSHER_STARTED:
+            return
+        _TOUCH_FLUSHER_STARTED = True
+
+    def _loop():
+        while True:
+            time.sleep(SESSION_TOUCH_FLUSH_SEC)
+            try:
+                flush_session_touches()
+            except Exception as e:
+                print(f"[session touch flush] warn: {e}")
+
+    threading.Thread(target=_loop, name="session-touch-flusher", daemon=True).start()
+    atexit.register(flush_session_touches)
+
+def flush_session_touches() -> int:
+    """Jedan UPDATE ... WHERE id IN (...) za sve sesije korišćene od poslednjeg flush-a."""
+    with _SESSION_CACHE_LOCK:
+        if not _PENDING_TOUCHES:
+            return 0
+        ids = list(_PENDING_TOUCHES)
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join(["%s"] * len(chunk))
+            cur.execute(f"UPDATE user_sessions SET last_accessed = CURRENT_TIMESTAMP WHERE id IN ({marks})", chunk)
+        conn.commit()
+    finally:
+        conn.close()
+    # tek posle uspešnog commit-a – greška ostavlja touch-eve za sledeći flush
+    with _SESSION_CACHE_LOCK:
+        _PENDING_TOUCHES.difference_update(ids)
+    return len(ids)
+
+def invalidate_session_cache(session_id: str = None):
+    """Izbaci sesiju (ili sve, ako session_id=None) iz keša."""
+    with _SESSION_CACHE_LOCK:
+        if session_id is None:
+            _SESSION_CACHE.clear()
+        else:
+            _SESSION_CACHE.pop(session_id, None)
+            _PENDING_TOUCHES.discard(session_id)
+
 def get_session(session_id: str) -> dict:
-    """Get session by ID."""
+    """Get session by ID (keširano SESSION_CACHE_TTL sekundi; last_accessed ide u batch)."""
+    now = time.monotonic()
+    with _SESSION_CACHE_LOCK:
+        hit = _SESSION_CACHE.get(session_id)
+        if hit and now - hit[0] < SESSION_CACHE_TTL:
+            _PENDING_TOUCHES.add(session_id)
+            return dict(hit[1])
+
     conn = get_mysql_connection()
     try:
         cur = conn.cursor(dictionary=True)
@@ -616,19 +1109,23 @@ def get_session(session_id: str) -> dict:
         """, (session_id,))
         
         session = cur.fetchone()
-        if session:
-            # Update last accessed
-            cur.execute("""
-                UPDATE user_sessions SET last_accessed = CURRENT_TIMESTAMP WHERE id = %s
-            """, (session_id,))
-            conn.commit()
-        
-        return session
     except Exception as e:
         return None
     finally:
         conn.close()
 
+    if session:
+        # last_accessed se ne upisuje odmah – flusher ga pokupi u sledećem batch-u
+        _ensure_touch_flusher()
+        with _SESSION_CACHE_LOCK:
+            if session_id in _REVOKED_SESSIONS:
+                return None   # obrisana dok je SELECT bio u letu
+            if len(_SESSION_CACHE) >= SESSION_CACHE_MAX:
+                _SESSION_CACHE.clear()
+            _SESSION_CACHE[session_id] = (now, dict(session))
+            _PENDING_TOUCHES.add(session_id)
+    return session
+
 def delete_session(session_id: str) -> bool:
     """Delete a session."""
     conn = get_mysql_connection()
@@ -638,11 +1135,19 @@ def delete_session(session_id: str) -> bool:
         cur.execute("DELETE FROM user_sessions WHERE id = %s", (session_id,))
         
         conn.commit()
-        return cur.rowcount > 0
+        deleted = cur.rowcount > 0
     except Exception as e:
         return False
     finally:
         conn.close()
+    # posle commit-a: get_session koji je pročitao red pre DELETE-a ga više ne vraća u keš
+    now = time.monotonic()
+    with _SESSION_CACHE_LOCK:
+        for sid in [s for s, t in _REVOKED_SESSIONS.items() if now - t > SESSION_CACHE_TTL]:
+            _REVOKED_SESSIONS.pop(sid, None)
+        _REVOKED_SESSIONS[session_id] = now
+    invalidate_session_cache(session_id)
+    return deleted
 
 def cleanup_expired_sessions() -> int:
     """Clean up expired sessions."""
@@ -653,6 +1158,7 @@ def cleanup_expired_sessions() -> int:
         cur.execute("DELETE FROM user_sessions WHERE expires_at < CURRENT_TIMESTAMP")
         
         conn.commit()
+        invalidate_session_cache()
         return cur.rowcount
     except Exception as e:
         return 0
@@ -0,0 +1,120 @@
+# prepare_worker.py
+# Samostalni prepare worker: uzima jobove iz prepare_jobs (SELECT ... FOR UPDATE SKIP LOCKED),
+# svaki job izvršava u svom child procesu (više dana paralelno), šalje heartbeat i radi retry.
+#
+# Pokretanje (pored uvicorn-a; PREPARE_DISPATCH=worker je podrazumevan – docker-compose.yml ga diže kao
+# servis "worker"):
+#   python prepare_worker.py --concurrency 2
+# Više instanci (na više mašina) je OK – SKIP LOCKED + heartbeat brinu da job radi tačno jedan worker.
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import uuid
+
+import appli
+from services.write_behind import flush_writes
+
+PREPARE_WORKER_FLUSH_SEC = float(os.getenv("PREPARE_WORKER_FLUSH_SEC", "20"))
+
+def _run_job(job_id: str, day_iso: str, prewarm: bool):
+    """Child proces: ceo prepare jednog dana (sopstveni PREPARE_LOCK, DB pool i process pool)."""
+    # p.terminate() (gašenje worker-a) šalje SIGTERM – atexit se tada ne izvršava, pa SIGTERM
+    # pretvaramo u SystemExit: finally ispod upiše write-behind red (model_outputs, match_statistics)
+    def _on_term(signum, _frame):
+        raise SystemExit(128 + signum)
+    signal.signal(signal.SIGTERM, _on_term)
+
+    # spawn child ne nasleđuje stanje roditelja (whitelist u memoriji) → ista init kao startup hook
+    appli.init_process()
+    try:
+        appli.run_prepare_job(job_id, day_iso, prewarm)
+    finally:
+        if not flush_writes(timeout=PREPARE_WORKER_FLUSH_SEC):
+            print(f"[prepare-worker] job {job_id}: write-behind flush incomplete on exit")
+
+def main():
+    ap = argparse.ArgumentParser(description="Prepare worker (durable queue nad prepare_jobs)")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("PREPARE_WORKER_CONCURRENCY", "2")))
+    ap.add_argument("--poll-sec", type=float, default=float(os.getenv("PREPARE_WORKER_POLL_SEC", "2")))
+    args = ap.parse_args()
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    appli.init_process()
+
+    # spawn: child ne nasleđuje thread-ove/konekcije roditelja
+    ctx = multiprocessing.get_context("spawn")
+    running = {}  # job_id -> (process, job)
+    running_lock = threading.Lock()
+    stop = threading.Event()
+
+    def _on_signal(signum, _frame):
+        print(f"[prepare-worker {worker_id}] signal {signum} → stop")
+        stop.set()
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    def _heartbeat_loop():
+        while not stop.wait(appli.PREPARE_HEARTBEAT_SEC):
+            with running_lock:
+                ids = list(running)
+            try:
+                appli.heartbeat_prepare_jobs(worker_id, ids)
+            except Exception as e:
+                print(f"[prepare-worker] heartbeat failed: {e}")
+    threading.Thread(target=_heartbeat_loop, daemon=True).start()
+
+    print(f"[prepare-worker {worker_id}] started (concurrency={args.concurrency})")
+    while not stop.is_set():
+        # 1) pokupi završene child-ove
+        with running_lock:
+            finished = [(jid, p, job) for jid, (p, job) in running.items() if not p.is_alive()]
+            for jid, _p, _job in finished:
+                running.pop(jid, None)
+        for jid, p, job in finished:
+            p.join()
+            try:
+                final = appli.finalize_prepare_attempt(jid, job["attempts"], p.exitcode)
+                print(f"[prepare-worker] job {jid} ({job['day']}) → {final} (exit {p.exitcode})")
+            except Exception as e:
+                print(f"[prepare-worker] finalize {jid} failed: {e}")
+
+        # 2) uzmi nove dok ima slobodnih slotova
+        claimed = False
+        while len(running) < args.concurrency and not stop.is_set():
+            try:
+                job = appli.claim_prepare_job(worker_id)
+            except Exception as e:
+                print(f"[prepare-worker] claim failed: {e}")
+                break
+            if not job:
+                break
+            p = ctx.Process(target=_run_job, args=(job["job_id"], job["day"], job["prewarm"]),
+                            name=f"prepare-{job['day']}")
+            p.start()
+            with running_lock:
+                running[job["job_id"]] = (p, job)
+            claimed = True
+            print(f"[prepare-worker] claimed {job['job_id']} day={job['day']} attempt={job['attempts']}")
+
+        if not claimed:
+            stop.wait(args.poll_sec)
+
+    # gašenje (redeploy): prekini child-ove i odmah vrati njihove jobove u red
+    with running_lock:
+        items = list(running.items())
+    for jid, (p, job) in items:
+        if p.is_alive():
+            p.terminate()
+        p.join(timeout=30)
+        try:
+            appli.finalize_prepare_attempt(jid, job["attempts"], p.exitcode, reason="worker shutdown",
+                                           refund_attempt=True)
+        except Exception as e:
+            print(f"[prepare-worker] requeue {jid} failed: {e}")
+    print(f"[prepare-worker {worker_id}] stopped")
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,23 @@ from __future__ import annotations
 
 from datetime import datetime, date, timedelta, timezone
 from typing import Dict, List, Tuple, Optional, Set, Iterable
+import copy
 import json
+import os
+import threading
 import time
-
-from mysql_database import get_mysql_connection
+from collections import OrderedDict
+
+from mysql_database import (
+    get_mysql_connection,
+    read_team_history_facts, read_h2h_facts, note_h2h_source, read_fixture_statistics_meta,
+)
+from services.retention import is_fresh, policy_fresh_hours, run_retention
+from services.schema import register_migration
+from services.write_behind import (
+    enqueue_match_facts, enqueue_match_statistics, enqueue_h2h_cache, flush_writes,
+    await_match_statistics,
+)
 
 # ---------- HTTP klijent (API-Football) ----------
 try:
@@ -39,12 +52,16 @@ except Exception:
         return None
 
 BASE_URL = "https://v3.football.api-sports.io"
-CACHE_TTL_HOURS = 48
-EXTRAS_TTL_HOURS = 48
+# TTL-ovi dolaze iz jedinstvenog registra politika (services/retention.py → RETENTION_POLICIES)
+CACHE_TTL_HOURS = policy_fresh_hours("team_history_store")
+# history/h2h iz match_facts kad pokrivenost dozvoljava (bez dekodiranja JSON blob-ova)
+HISTORY_FROM_MATCH_FACTS = os.getenv("HISTORY_FROM_MATCH_FACTS", "1") == "1"
 BASE_SEASON_FALLBACK = datetime.utcnow().year
 
 # ---------- MySQL helper-i (INSERT/UPSERT) ----------
 def insert_team_matches(team_id: int, matches: list):
+    # redovi rekonstruisani iz match_facts su već tamo (i siromašniji od API JSON-a) – ne prepisuj
+    matches = [m for m in (matches or []) if isinstance(m, dict) and m.get("_source") != "match_facts"]
     if not matches:
         return
     conn = get_mysql_connection()
@@ -60,8 +77,11 @@ def insert_team_matches(team_id: int, matches: list):
         """, (team_id, fid, json.dumps(m, ensure_ascii=False)))
     conn.commit()
     conn.close()
+    enqueue_match_facts(matches)
 
 def insert_h2h_matches(a: int, b: int, matches: list):
+    # redovi rekonstruisani iz match_facts su već tamo (i siromašniji od API JSON-a) – ne prepisuj
+    matches = [m for m in (matches or []) if isinstance(m, dict) and m.get("_source") != "match_facts"]
     if not matches:
         return
     x, y = sorted([a, b])
@@ -78,8 +98,10 @@ def insert_h2h_matches(a: int, b: int, matches: list):
         """, (x, y, fid, json.dumps(m, ensure_ascii=False)))
     conn.commit()
     conn.close()
+    enqueue_match_facts(matches)
 
 def try_read_fixture_statistics(fixture_id: int):
+    await_match_statistics(fixture_id)
     conn = get_mysql_connection()
     cur = conn.cursor()
     cur.execute("SELECT data FROM match_statistics WHERE fixture_id=%s", (fixture_id,))
@@ -92,6 +114,188 @@ def try_read_fixture_statistics(fixture_id: int):
             return None
     return None
 
+# ---------- Rolling istorija tima (jedan red po timu, poslednjih K mečeva; last_n = slice) ----------
+TEAM_HISTORY_K = int(os.getenv("TEAM_HISTORY_K", "50"))
+# pri osvežavanju tražimo samo poslednjih nekoliko mečeva i spajamo ih sa postojećima
+TEAM_HISTORY_INCREMENT = int(os.getenv("TEAM_HISTORY_INCREMENT", "10"))
+TEAM_HISTORY_MEM_TTL_SEC = int(os.getenv("TEAM_HISTORY_MEM_TTL_SEC", "300"))
+TEAM_HISTORY_MEM_MAX = int(os.getenv("TEAM_HISTORY_MEM_MAX", "4000"))
+
+_TEAM_HISTORY_MEM = OrderedDict()   # team_id -> (mem_ts, depth, updated_at, matches)
+_TEAM_HISTORY_MEM_LOCK = threading.Lock()
+
+def _history_sort_key(m: dict):
+    fx = (m or {}).get("fixture") or {}
+    return (fx.get("timestamp") or 0, str(fx.get("date") or ""), fx.get("id") or 0)
+
+def merge_team_history(old: List[dict], new: List[dict], k: int) -> Tuple[List[dict], bool]:
+    """Spoji po fixture id-u (novi payload pobeđuje), sortiraj od najnovijeg, odseci na k.
+    contiguous=False → između starog i novog možda postoji rupa (nema preklapanja)."""
+    by_id = {}
+    for m in old or []:
+        fid = ((m.get("fixture") or {}).get("id")) if isinstance(m, dict) else None
+        if fid:
+            by_id[fid] = m
+    old_ids = set(by_id)
+    new_ids = set()
+    for m in new or []:
+        fid = ((m.get("fixture") or {}).get("id")) if isinstance(m, dict) else None
+        if fid:
+            by_id[fid] = m
+            new_ids.add(fid)
+    contiguous = not old_ids or not new_ids or bool(old_ids & new_ids) or len(new_ids) < TEAM_HISTORY_INCREMENT
+    merged = sorted(by_id.values(), key=_history_sort_key, reverse=True)[:int(k)]
+    return merged, contiguous
+
+def load_team_history_store(team_id: int):
+    """→ (depth, updated_at, matches) ili None."""
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT depth, data, updated_at FROM team_history_store WHERE team_id=%s", (int(team_id),))
+        row = cur.fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    try:
+        data = (json.loads(row[1]) if isinstance(row[1], (str, bytes)) else row[1]) or []
+    except Exception:
+        return None
+    return int(row[0] or 0), row[2], data
+
+def save_team_history_store(team_id: int, depth: int, matches: List[dict]) -> None:
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO team_history_store (team_id, depth, latest_fixture_id, data, updated_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE depth=VALUES(depth), latest_fixture_id=VALUES(latest_fixture_id),
+                                    data=VALUES(data), updated_at=NOW()
+        """, (int(team_id), int(depth),
+              int(((matches[0].get("fixture") or {}).get("id")) or 0) if matches else 0,
+              json.dumps(matches, ensure_ascii=False)))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _mem_history_get(team_id: int, last_n: int, ttl_hours, now_ts: float):
+    with _TEAM_HISTORY_MEM_LOCK:
+        ent = _TEAM_HISTORY_MEM.get(int(team_id))
+        if not ent:
+            return None
+        mem_ts, depth, updated_at, matches = ent
+        if now_ts - mem_ts > TEAM_HISTORY_MEM_TTL_SEC:
+            _TEAM_HISTORY_MEM.pop(int(team_id), None)
+            return None
+        if depth < last_n or not _history_is_fresh(updated_at, ttl_hours):
+            return None
+        _TEAM_HISTORY_MEM.move_to_end(int(team_id))
+        # duboka kopija – pozivalac sme da menja mečeve (dict-ove) bez uticaja na procesni keš
+        return copy.deepcopy(matches[:last_n])
+
+def _mem_history_put(team_id: int, depth: int, updated_at, matches: List[dict], now_ts: float) -> None:
+    with _TEAM_HISTORY_MEM_LOCK:
+        # keš čuva svoju kopiju – pozivalac zadržava (i može da menja) originalne dict-ove
+        _TEAM_HISTORY_MEM[int(team_id)] = (now_ts, int(depth), updated_at, copy.deepcopy(list(matches)))
+        _TEAM_HISTORY_MEM.move_to_end(int(team_id))
+        while len(_TEAM_HISTORY_MEM) > TEAM_HISTORY_MEM_MAX:
+            _TEAM_HISTORY_MEM.popitem(last=False)
+
+def invalidate_team_history_mem(team_id: Optional[int] = None) -> None:
+    with _TEAM_HISTORY_MEM_LOCK:
+        if team_id is None:
+            _TEAM_HISTORY_MEM.clear()
+        else:
+            _TEAM_HISTORY_MEM.pop(int(team_id), None)
+
+def _history_is_fresh(updated_at, ttl_hours) -> bool:
+    """updated_at je naivni UTC (DB sesija je u '+00:00'); aware vrednosti se svode na UTC."""
+    if ttl_hours is None:
+        return True
+    if not isinstance(updated_at, datetime):
+        try:
+            updated_at = datetime.fromisoformat(str(updated_at))
+        except Exception:
+            return False
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return (datetime.utcnow() - updated_at) <= timedelta(hours=ttl_hours)
+
+def get_team_history_rolling(team_id: int, last_n: int = 15, no_api: bool = False,
+                             force_refresh: bool = False, ttl_hours: int = CACHE_TTL_HOURS) -> List[dict]:
+    """
+    Poslednjih last_n mečeva tima. Redosled: memorija (TTL) → match_facts → team_history_store → API.
+    API se zove inkrementalno (last=TEAM_HISTORY_INCREMENT + merge); pun fetch samo kad nema
+    dovoljno dubine ili kad se novi i stari mečevi ne preklapaju.
+    """
+    team_id, last_n = int(team_id), int(last_n)
+    eff_ttl = None if no_api else ttl_hours
+    now_ts = time.time()
+    if not force_refresh:
+        hit = _mem_history_get(team_id, last_n, eff_ttl, now_ts)
+        if hit is not None:
+            return hit
+        if HISTORY_FROM_MATCH_FACTS:
+            facts = read_team_history_facts(team_id, last_n, eff_ttl)
+            if facts is not None:
+                return facts
+
+    stored = load_team_history_store(team_id)
+    if stored and not force_refresh:
+        depth, updated_at, matches = stored
+        if depth >= last_n and _history_is_fresh(updated_at, eff_ttl):
+            _mem_history_put(team_id, depth, updated_at, matches, now_ts)
+            return list(matches[:last_n])
+
+    if no_api:
+        # bolje išta nego ništa (poštuje staro no_api ponašanje: keš bez obzira na starost)
+        return list(stored[2][:last_n]) if stored else []
+
+    depth = max(TEAM_HISTORY_K, last_n)
+    old = stored[2] if stored else []
+    data = None
+    if stored and stored[0] >= depth and not force_refresh:
+        resp = rate_limited_request(f"{BASE_URL}/fixtures",
+                                    params={'team': team_id, 'last': TEAM_HISTORY_INCREMENT, 'timezone': 'UTC'})
+        fresh = (resp or {}).get('response') or []
+        merged, contiguous = merge_team_history(old, fresh, depth)
+        if resp is not None and contiguous:
+            data = merged
+            new_rows = fresh
+    if data is None:
+        resp = rate_limited_request(f"{BASE_URL}/fixtures", params={'team': team_id, 'last': depth, 'timezone': 'UTC'})
+        new_rows = (resp or {}).get('response') or []
+        if resp is None and old:
+            return list(old[:last_n])
+        data, _ = merge_team_history([], new_rows, depth)
+
+    try:
+        insert_team_matches(team_id, new_rows)
+    except Exception:
+        pass
+    save_team_history_store(team_id, depth, data)
+    _mem_history_put(team_id, depth, datetime.utcnow(), data, now_ts)
+    return list(data[:last_n])
+
+def teams_with_fresh_history(team_ids: Iterable[int], last_n: int, ttl_hours: int) -> Set[int]:
+    """Timovi čiji team_history_store pokriva last_n i mlađi je od ttl_hours (jedan IN upit)."""
+    ids = sorted({int(t) for t in team_ids if t})
+    if not ids:
+        return set()
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        ph = ",".join(["%s"] * len(ids))
+        cur.execute(f"""
+            SELECT team_id FROM team_history_store
+            WHERE team_id IN ({ph}) AND depth >= %s AND updated_at >= NOW() - INTERVAL %s HOUR
+        """, (*ids, int(last_n), int(ttl_hours)))
+        return {int(r[0]) for r in cur.fetchall()}
+    finally:
+        conn.close()
+
 # ---------- DataRepo ----------
 class DataRepo:
     # ---- helpers ----
@@ -139,20 +343,26 @@ class DataRepo:
                 fxj = json.dumps(fx, ensure_ascii=False)
                 cur.execute("""
                     INSERT INTO fixtures
-                        (id, `date`, league_id, team_home_id, team_away_id, stats_json, fixture_json)
-                    VALUES (%s,%s,%s,%s,%s,%s,%s)
+                        (id, `date`, league_id, team_home_id, team_away_id, fixture_json)
+                    VALUES (%s,%s,%s,%s,%s,%s)
                     ON DUPLICATE KEY UPDATE
                         `date`=VALUES(`date`),
                         league_id=VALUES(league_id),
                         team_home_id=VALUES(team_home_id),
                         team_away_id=VALUES(team_away_id),
-                        stats_json=VALUES(stats_json),
                         fixture_json=VALUES(fixture_json)
-                """, (fid, fdt, lid, hid, aid, None, fxj))
+                """, (fid, fdt, lid, hid, aid, fxj))
             except Exception:
                 continue
+        try:
+            upsert_dimensions(cur, fixtures)
+        except Exception as e:
+            print(f"[data_repo] dimension upsert failed: {e}")
         conn.commit()
         conn.close()
+        # match_facts kroz write-behind; flush → posle povratka su u bazi kao i fixtures
+        enqueue_match_facts(fixtures)
+        flush_writes("history")
 
     # ---- PUBLIC ----
     def ensure_day(self, d: date, last_n: int = 15, h2h_n: int = 10, prewarm_stats: bool = False) -> dict:
@@ -252,50 +462,15 @@ class DataRepo:
         }
 
     def get_team_history(self, team_id: int, last_n: int = 15, no_api: bool = False) -> List[dict]:
-        now = datetime.utcnow()
-        conn = get_mysql_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT data, updated_at FROM team_history_cache WHERE team_id=%s AND last_n=%s", (team_id, last_n))
-        row = cur.fetchone()
-        conn.close()
-
-        if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=CACHE_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=CACHE_TTL_HOURS) or no_api:
-                try:
-                    j = row[0]
-                    return (json.loads(j) if isinstance(j, str) else j) or []
-                except Exception:
-                    return []
-
-        if no_api:
-            return []
-
-        resp = rate_limited_request(f"{BASE_URL}/fixtures", params={'team': team_id, 'last': last_n, 'timezone': 'UTC'})
-        data = resp.get('response', []) if resp else []
-
-        try:
-            insert_team_matches(team_id, data)
-        except Exception:
-            pass
-
-        conn = get_mysql_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO team_history_cache(team_id,last_n,data)
-            VALUES(%s,%s,%s)
-            ON DUPLICATE KEY UPDATE data=VALUES(data)
-        """, (team_id, last_n, json.dumps(data, ensure_ascii=False)))
-        conn.commit()
-        conn.close()
-        return data
+        return get_team_history_rolling(team_id, last_n, no_api=no_api)
 
     def get_h2h(self, team_a: int, team_b: int, last_n: int = 10, no_api: bool = False) -> List[dict]:
         a, b = sorted([team_a, team_b])
-        now = datetime.utcnow()
+        if HISTORY_FROM_MATCH_FACTS:
+            facts = read_h2h_facts(a, b, last_n, None if no_api else policy_fresh_hours("h2h_cache"))
+            if facts is not None:
+                note_h2h_source("local")
+                return facts
         conn = get_mysql_connection()
         cur = conn.cursor()
         cur.execute("""
@@ -306,11 +481,8 @@ class DataRepo:
         conn.close()
 
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=CACHE_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=CACHE_TTL_HOURS) or no_api:
+            if is_fresh("h2h_cache", row[1]) or no_api:
+                note_h2h_source("cache")
                 try:
                     j = row[0]
                     return (json.loads(j) if isinstance(j, str) else j) or []
@@ -320,6 +492,7 @@ class DataRepo:
         if no_api:
             return []
 
+        note_h2h_source("api")
         h2h_key = f"{a}-{b}"
         resp = rate_limited_request(f"{BASE_URL}/fixtures/headtohead", params={'h2h': h2h_key, 'last': last_n})
         data = resp.get('response', []) if resp else []
@@ -329,34 +502,24 @@ class DataRepo:
         except Exception:
             pass
 
-        conn = get_mysql_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO h2h_cache(team1_id,team2_id,last_n,data)
-            VALUES(%s,%s,%s,%s)
-            ON DUPLICATE KEY UPDATE data=VALUES(data)
-        """, (a, b, last_n, json.dumps(data, ensure_ascii=False)))
-        conn.commit()
-        conn.close()
+        enqueue_h2h_cache(a, b, last_n, json.dumps(data, ensure_ascii=False))
         return data
 
     def get_fixture_stats(self, fixture_id: int, no_api: bool = False) -> Optional[list]:
-        existing = try_read_fixture_statistics(fixture_id)
-        if existing is not None or no_api:
-            return existing
+        # završen meč: statistika je konačna (immutable); nezavršen: osvežava se po TTL-u
+        await_match_statistics(fixture_id)
+        meta = read_fixture_statistics_meta(fixture_id)
+        if meta is not None:
+            existing, updated_at, final = meta
+            if existing is not None and (no_api or is_fresh("match_statistics", updated_at, final=final)):
+                return existing
+        if no_api:
+            return None
 
         response = rate_limited_request(f"{BASE_URL}/fixtures/statistics", params={"fixture": fixture_id})
         stats = (response or {}).get('response') or None
         if stats is not None:
-            conn = get_mysql_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO match_statistics(fixture_id, data)
-                VALUES (%s, %s)
-                ON DUPLICATE KEY UPDATE data=VALUES(data)
-            """, (fixture_id, json.dumps(stats, ensure_ascii=False)))
-            conn.commit()
-            conn.close()
+            enqueue_match_statistics(fixture_id, json.dumps(stats, ensure_ascii=False))
         return stats
 
     def get_fixture_full(self, fixture_id: int, no_api: bool = False) -> Optional[dict]:
@@ -384,18 +547,13 @@ class DataRepo:
     def get_venue(self, venue_id: Optional[int], no_api: bool = False) -> Optional[dict]:
         if not venue_id:
             return None
-        now = datetime.utcnow()
         conn = get_mysql_connection()
         cur = conn.cursor()
         cur.execute("SELECT data, updated_at FROM venues_cache WHERE venue_id=%s", (venue_id,))
         row = cur.fetchone()
         conn.close()
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=EXTRAS_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=EXTRAS_TTL_HOURS) or no_api:
+            if is_fresh("venues_cache", row[1]) or no_api:
                 try:
                     j = row[0]
                     return json.loads(j) if isinstance(j, str) else j
@@ -421,18 +579,13 @@ class DataRepo:
         return ven
 
     def get_lineups(self, fixture_id: int, no_api: bool = False) -> Optional[list]:
-        now = datetime.utcnow()
         conn = get_mysql_connection()
         cur = conn.cursor()
         cur.execute("SELECT data, updated_at FROM lineups_cache WHERE fixture_id=%s", (fixture_id,))
         row = cur.fetchone()
         conn.close()
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=EXTRAS_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=EXTRAS_TTL_HOURS) or no_api:
+            if is_fresh("lineups_cache", row[1]) or no_api:
                 try:
                     j = row[0]
                     return json.loads(j) if isinstance(j, str) else j
@@ -457,18 +610,13 @@ class DataRepo:
         return arr
 
     def get_injuries(self, fixture_id: int, no_api: bool = False) -> Optional[list]:
-        now = datetime.utcnow()
         conn = get_mysql_connection()
         cur = conn.cursor()
         cur.execute("SELECT data, updated_at FROM injuries_cache WHERE fixture_id=%s", (fixture_id,))
         row = cur.fetchone()
         conn.close()
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=EXTRAS_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=EXTRAS_TTL_HOURS) or no_api:
+            if is_fresh("injuries_cache", row[1]) or no_api:
                 try:
                     j = row[0]
                     return json.loads(j) if isinstance(j, str) else j
@@ -493,7 +641,6 @@ class DataRepo:
         return arr
 
     def get_team_statistics(self, team_id: int, league_id: int, season: int, no_api: bool = False) -> dict | None:
-        now = datetime.utcnow()
         conn = get_mysql_connection()
         cur = conn.cursor()
         cur.execute("""
@@ -503,11 +650,7 @@ class DataRepo:
         row = cur.fetchone()
         conn.close()
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=24 + 1)
-            if (now - updated_at) <= timedelta(hours=24) or no_api:
+            if is_fresh("team_stats_cache", row[1], season=season) or no_api:
                 try:
                     j = row[0]
                     return (json.loads(j) if isinstance(j, str) else j) or {}
@@ -535,7 +678,6 @@ class DataRepo:
     def get_referee_fixtures(self, ref_name: str, season: Optional[int] = None, last_n: int = 200, no_api: bool = False) -> List[dict]:
         if not ref_name:
             return []
-        now = datetime.utcnow()
         year = season or BASE_SEASON_FALLBACK
 
         conn = get_mysql_connection()
@@ -547,11 +689,7 @@ class DataRepo:
         row = cur.fetchone()
         conn.close()
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=EXTRAS_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=EXTRAS_TTL_HOURS) or no_api:
+            if is_fresh("referee_cache", row[1], season=year) or no_api:
                 try:
                     j = row[0]
                     return (json.loads(j) if isinstance(j, str) else j) or []
@@ -584,11 +722,7 @@ class DataRepo:
         row = cur.fetchone()
         conn.close()
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=EXTRAS_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=EXTRAS_TTL_HOURS) or no_api:
+            if is_fresh("odds_cache", row[1]) or no_api:
                 try:
                     j = row[0]
                     return (json.loads(j) if isinstance(j, str) else j) or {}
@@ -656,11 +790,7 @@ class DataRepo:
         row = cur.fetchone()
         conn.close()
         if row:
-            try:
-                updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-            except Exception:
-                updated_at = now - timedelta(hours=EXTRAS_TTL_HOURS + 1)
-            if (now - updated_at) <= timedelta(hours=EXTRAS_TTL_HOURS) or no_api:
+            if is_fresh("odds_cache", row[1]) or no_api:
                 try:
                     j = row[0]
                     return (json.loads(j) if isinstance(j, str) else j) or {}
@@ -772,37 +902,324 @@ class DataRepo:
         except Exception as e:
             print(f"[save_artifacts_for_fixture] warn: {e}")
 
-# ---- PURGE 72h (možeš pozvati iz management skripte) ----
+# ---- PURGE (možeš pozvati iz management skripte) ----
 def purge_old_data():
+    """Retention za sve keš tabele po RETENTION_POLICIES (batch DELETE / DROP PARTITION, vidi services/retention.py)."""
+    return run_retention()
+
+# ===== Inkrementalni league baselines (streaming momenti) =====
+# league_id=0 nosi global agregat; league_id=-1 = nepoznata liga (isto kao compute_league_baselines)
+BASELINE_GLOBAL_LID = 0
+
+def fold_league_baseline_samples(scope: str, samples: List[dict]) -> int:
+    """
+    Dodaje nove uzorke ({fixture_id, league_id, sot, da, hit}) u perzistentne momente.
+    Meč koji je već ušao (league_baseline_seen) se preskače, pa je poziv idempotentan.
+    Vraća broj stvarno dodatih mečeva.
+    """
+    from models.streaming_stats import BaselineAccumulator
+    if not samples:
+        return 0
     conn = get_mysql_connection()
-    cur = conn.cursor()
-    queries = [
-        ("DELETE FROM fixtures              WHERE `date`     < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM match_statistics      WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM team_history_cache    WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM h2h_cache             WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM team_matches          WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM h2h_matches           WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM league_baselines_store WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM team_strengths_store   WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM team_profiles_store    WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM team_micro_form_store  WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM fixture_extras_store   WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM venues_cache          WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM lineups_cache         WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM injuries_cache        WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM referee_cache         WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM odds_cache            WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-        ("DELETE FROM team_stats_cache      WHERE updated_at < NOW() - INTERVAL 72 HOUR", ()),
-    ]
-    for q, p in queries:
-        cur.execute(q, p)
-    conn.commit()
-    conn.close()
+    try:
+        cur = conn.cursor()
+        fids = sorted({int(s["fixture_id"]) for s in samples if s.get("fixture_id")})
+        seen: Set[int] = set()
+        for i in range(0, len(fids), 500):
+            chunk = fids[i:i + 500]
+            marks = ",".join(["%s"] * len(chunk))
+            cur.execute(f"SELECT fixture_id FROM league_baseline_seen WHERE scope=%s AND fixture_id IN ({marks})",
+                        (scope, *chunk))
+            seen.update(int(r[0]) for r in cur.fetchall())
+
+        deltas: Dict[int, BaselineAccumulator] = {}
+        added = 0
+        for s in samples:
+            fid = int(s.get("fixture_id") or 0)
+            if not fid or fid in seen:
+                continue
+            # INSERT IGNORE štiti i od paralelnog procesa koji radi isti fold
+            cur.execute("INSERT IGNORE INTO league_baseline_seen (fixture_id, scope) VALUES (%s, %s)", (fid, scope))
+            if cur.rowcount != 1:
+                continue
+            seen.add(fid)
+            lid = int(s.get("league_id") if s.get("league_id") is not None else -1)
+            for key in (lid, BASELINE_GLOBAL_LID):
+                deltas.setdefault(key, BaselineAccumulator()).add(s.get("sot"), s.get("da"), bool(s.get("hit")))
+            added += 1
+
+        if not deltas:
+            conn.rollback()
+            return 0
+
+        lids = sorted(deltas)
+        marks = ",".join(["%s"] * len(lids))
+        cur.execute(f"SELECT league_id, data FROM league_baseline_moments WHERE scope=%s AND league_id IN ({marks}) FOR UPDATE",
+                    (scope, *lids))
+        current = {}
+        for lid, data in cur.fetchall():
+            try:
+                current[int(lid)] = json.loads(data) if isinstance(data, (str, bytes, bytearray)) else (data or {})
+            except Exception:
+                current[int(lid)] = {}
 
-# ===== Dixon–Coles helpers: league season cache + training set =====
+        for lid in lids:
+            acc = BaselineAccumulator.from_dict(current.get(lid))
+            acc.merge(deltas[lid])
+            cur.execute("""
+                INSERT INTO league_baseline_moments (league_id, scope, n, data)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE n=VALUES(n), data=VALUES(data)
+            """, (lid, scope, int(acc.tot), json.dumps(acc.to_dict())))
+        conn.commit()
+        return added
+    except Exception as e:
+        try: conn.rollback()
+        except Exception: pass
+        print(f"[fold_league_baseline_samples] warn: {e}")
+        return 0
+    finally:
+        conn.close()
 
-LEAGUE_SEASON_TTL_DAYS = 14
+def league_baseline_seen_scopes(fixture_ids: Iterable[int]) -> Dict[int, Set[str]]:
+    """{fixture_id: {scope, ...}} za mečeve koji su već ušli u momente – jedan IN upit (pre stats_fn poziva)."""
+    fids = sorted({int(f) for f in fixture_ids if f})
+    out: Dict[int, Set[str]] = {}
+    if not fids:
+        return out
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for i in range(0, len(fids), 5000):
+            chunk = fids[i:i + 5000]
+            cur.execute(f"SELECT fixture_id, scope FROM league_baseline_seen WHERE fixture_id IN ({','.join(['%s'] * len(chunk))})",
+                        tuple(chunk))
+            for fid, scope in cur.fetchall():
+                out.setdefault(int(fid), set()).add(str(scope))
+        return out
+    finally:
+        conn.close()
+
+def load_league_baseline_moments(scope: str) -> Dict[int, dict]:
+    """Vrati {league_id: accumulator_dict} za dati scope ('1h' | 'ft')."""
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT league_id, data FROM league_baseline_moments WHERE scope=%s", (scope,))
+        out: Dict[int, dict] = {}
+        for lid, data in cur.fetchall():
+            try:
+                out[int(lid)] = json.loads(data) if isinstance(data, (str, bytes, bytearray)) else (data or {})
+            except Exception:
+                continue
+        return out
+    finally:
+        conn.close()
+
+# ===== Materijalizovani po-timski artefakti (profiles / strengths / micro) =====
+def load_team_artifacts(kind: str, team_ids: Iterable[int]) -> Dict[int, Tuple[int, str, dict]]:
+    """Vrati {team_id: (latest_fixture_id, params, data)} za dati kind; bulk, po 500 ID-jeva."""
+    ids = sorted({int(t) for t in (team_ids or []) if t is not None})
+    out: Dict[int, Tuple[int, str, dict]] = {}
+    if not ids:
+        return out
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join(["%s"] * len(chunk))
+            cur.execute(f"""
+                SELECT team_id, latest_fixture_id, params, data
+                FROM team_artifacts_store
+                WHERE kind=%s AND team_id IN ({marks})
+            """, (kind, *chunk))
+            for tid, head, params, data in cur.fetchall():
+                try:
+                    obj = json.loads(data) if isinstance(data, (str, bytes, bytearray)) else data
+                except Exception:
+                    continue
+                out[int(tid)] = (int(head or 0), params or "", obj)
+        return out
+    finally:
+        conn.close()
+
+def fixture_stats_versions(fixture_ids: Iterable[int]) -> Dict[int, str]:
+    """{fixture_id: updated_at} za mečeve koji imaju match_statistics – pokrivenost statistikom za ključ artefakta."""
+    ids = sorted({int(f) for f in (fixture_ids or []) if f})
+    out: Dict[int, str] = {}
+    if not ids:
+        return out
+    flush_writes("stats")   # upravo povučena statistika (write-behind) mora da uđe u ključ
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for i in range(0, len(ids), 5000):
+            chunk = ids[i:i + 5000]
+            cur.execute(f"""
+                SELECT fixture_id, updated_at FROM match_statistics
+                WHERE fixture_id IN ({','.join(['%s'] * len(chunk))}) AND data IS NOT NULL
+            """, tuple(chunk))
+            for fid, u in cur.fetchall():
+                out[int(fid)] = str(u)
+        return out
+    finally:
+        conn.close()
+
+def save_team_artifacts(kind: str, rows: List[Tuple[int, int, str, dict]]) -> None:
+    """rows: [(team_id, latest_fixture_id, params, data)] → upsert u team_artifacts_store."""
+    if not rows:
+        return
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        cur.executemany("""
+            INSERT INTO team_artifacts_store (team_id, kind, latest_fixture_id, params, data)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE latest_fixture_id=VALUES(latest_fixture_id),
+                                    params=VALUES(params), data=VALUES(data)
+        """, [(int(tid), kind, int(head or 0), params or "", json.dumps(obj, ensure_ascii=False))
+              for tid, head, params, obj in rows])
+        conn.commit()
+    finally:
+        conn.close()
+
+# ===== Dimenzije (teams / leagues) – održavaju se pri ingest-u fixtures =====
+_TEAM_UPSERT_SQL = """
+    INSERT INTO teams (id, name, country, logo)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name),
+        country = COALESCE(NULLIF(VALUES(country), ''), country),
+        logo = COALESCE(NULLIF(VALUES(logo), ''), logo)
+"""
+_LEAGUE_UPSERT_SQL = """
+    INSERT INTO leagues (id, name, country, logo, type)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name),
+        country = COALESCE(NULLIF(VALUES(country), ''), country),
+        logo = COALESCE(NULLIF(VALUES(logo), ''), logo),
+        type = COALESCE(NULLIF(VALUES(type), ''), type)
+"""
+
+def extract_dimensions(fixtures: Iterable[dict]) -> Tuple[Dict[int, tuple], Dict[int, tuple]]:
+    """Iz API fixture payload-a: ({team_id: (id, name, country, logo)}, {league_id: (id, name, country, logo, type)})."""
+    teams, leagues = {}, {}
+    for fx in fixtures or []:
+        if not isinstance(fx, dict):
+            continue
+        for side in ("home", "away"):
+            t = ((fx.get("teams") or {}).get(side) or {})
+            if t.get("id") and t.get("name"):
+                teams[int(t["id"])] = (int(t["id"]), t["name"], t.get("country") or "", t.get("logo") or "")
+        lg = fx.get("league") or {}
+        if lg.get("id") and lg.get("name"):
+            leagues[int(lg["id"])] = (int(lg["id"]), lg["name"], lg.get("country") or "",
+                                      lg.get("logo") or "", lg.get("type") or "")
+    return teams, leagues
+
+def upsert_dimensions(cur, fixtures: Iterable[dict]) -> Tuple[int, int]:
+    """
+    Bulk upsert teams/leagues na PROSLEĐENOM kursoru (ista transakcija kao upis fixtures; commit radi pozivalac).
+    Nepromenjeni redovi se ne prepisuju (MySQL ne dira red kad su vrednosti iste).
+    """
+    teams, leagues = extract_dimensions(fixtures)
+    if teams:
+        cur.executemany(_TEAM_UPSERT_SQL, sorted(teams.values()))
+    if leagues:
+        cur.executemany(_LEAGUE_UPSERT_SQL, sorted(leagues.values()))
+    return len(teams), len(leagues)
+
+def backfill_dimensions(batch: int = 2000) -> Tuple[int, int]:
+    """
+    Jednokratni backfill teams/leagues iz postojećih fixtures (keyset po id-u, polja iz JSON-a vadi MySQL).
+    Pokretanje: python backfill_dimensions.py
+    """
+    def _j(path):
+        return f"NULLIF(JSON_UNQUOTE(JSON_EXTRACT(fixture_json, '{path}')), 'null')"
+    cols = ", ".join(_j(p) for p in (
+        "$.teams.home.id", "$.teams.home.name", "$.teams.home.logo",
+        "$.teams.away.id", "$.teams.away.name", "$.teams.away.logo",
+        "$.league.id", "$.league.name", "$.league.country", "$.league.logo", "$.league.type",
+    ))
+    n_teams = n_leagues = 0
+    last_id = 0
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute(f"""
+                SELECT id, {cols} FROM fixtures
+                WHERE id > %s AND fixture_json IS NOT NULL
+                ORDER BY id LIMIT %s
+            """, (last_id, int(batch)))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            fixtures = [{
+                "teams": {"home": {"id": r[1], "name": r[2], "logo": r[3]},
+                          "away": {"id": r[4], "name": r[5], "logo": r[6]}},
+                "league": {"id": r[7], "name": r[8], "country": r[9], "logo": r[10], "type": r[11]},
+            } for r in rows]
+            t, l = upsert_dimensions(cur, fixtures)
+            conn.commit()
+            n_teams += t; n_leagues += l
+    finally:
+        conn.close()
+    return n_teams, n_leagues
+
+def backfill_match_facts(batch: int = 1000) -> Dict[str, int]:
+    """Jednokratno: match_facts iz postojećih fixtures / team_matches / h2h_matches (keyset po id-u) i league_season_cache."""
+    sources = (
+        ("fixtures", "id", "fixture_json"),
+        ("team_matches", "fixture_id", "data"),
+        ("h2h_matches", "fixture_id", "data"),
+    )
+    out = {}
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for table, id_col, json_col in sources:
+            last_id, n = 0, 0
+            while True:
+                # DISTINCT: isti meč u team_matches postoji za oba tima
+                cur.execute(f"""
+                    SELECT {id_col}, ANY_VALUE({json_col}) FROM {table}
+                    WHERE {id_col} > %s AND {json_col} IS NOT NULL
+                    GROUP BY {id_col} ORDER BY {id_col} LIMIT %s
+                """, (last_id, int(batch)))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                matches = []
+                for _fid, j in rows:
+                    try:
+                        matches.append(json.loads(j) if isinstance(j, (str, bytes)) else j)
+                    except Exception:
+                        continue
+                n += enqueue_match_facts(matches)
+            out[table] = n
+        # league_season_cache: jedan red = cela sezona lige (lista mečeva)
+        cur.execute("SELECT league_id, season FROM league_season_cache")
+        n = 0
+        for league_id, season in cur.fetchall():
+            cur.execute("SELECT data FROM league_season_cache WHERE league_id=%s AND season=%s", (league_id, season))
+            row = cur.fetchone()
+            try:
+                matches = (json.loads(row[0]) if isinstance(row[0], (str, bytes)) else row[0]) or []
+            except Exception:
+                continue
+            n += enqueue_match_facts(matches)
+        out["league_season_cache"] = n
+    finally:
+        conn.close()
+    flush_writes("history")
+    return out
+
+# ===== Dixon–Coles helpers: league season cache + training set =====
 
 def ensure_league_season_cache_table():
     conn = get_mysql_connection()
@@ -819,23 +1236,19 @@ def ensure_league_season_cache_table():
     conn.commit()
     conn.close()
 
+register_migration(6, "league_season_cache", ensure_league_season_cache_table)
+
 def get_league_season_results(league_id: int, season: int, no_api: bool=False) -> list:
     """
     Vrati listu FT mečeva za ligu+sezonu (keširano u league_season_cache).
     """
-    ensure_league_season_cache_table()
-    now = datetime.utcnow()
     conn = get_mysql_connection()
     cur = conn.cursor()
     cur.execute("SELECT data, updated_at FROM league_season_cache WHERE league_id=%s AND season=%s", (league_id, season))
     row = cur.fetchone()
     conn.close()
     if row:
-        try:
-            updated_at = row[1] if isinstance(row[1], datetime) else datetime.fromisoformat(str(row[1]))
-        except Exception:
-            updated_at = now - timedelta(days=LEAGUE_SEASON_TTL_DAYS + 1)
-        if (now - updated_at) <= timedelta(days=LEAGUE_SEASON_TTL_DAYS) or no_api:
+        if is_fresh("league_season_cache", row[1], season=season) or no_api:
             try:
                 j = row[0]
                 return (json.loads(j) if isinstance(j, str) else j) or []
@@ -867,6 +1280,7 @@ def get_league_season_results(league_id: int, season: int, no_api: bool=False) -
     """, (league_id, season, json.dumps(out, ensure_ascii=False)))
     conn.commit()
     conn.close()
+    enqueue_match_facts(out)
     return out
 
 def gather_dc_training_data(league_id: int, seasons: Iterable[int], half_life_days: int=365) -> list:
@@ -0,0 +1,276 @@
+# services/retention.py
+# Retention engine: brisanje starih redova ISKLJUČIVO batch DELETE-om – mali indeksirani batch-evi
+# (sa pauzama) umesto jednog neograničenog DELETE-a po tabeli u jednoj transakciji.
+#  - svaka tabela ima politiku (RETENTION_POLICIES: ttl / final / season) iz koje se izvode i purge
+#    poslovi i TTL provere u DataRepo-u; vremenska kolona mora biti indeksirana
+#    (ensure_retention_indexes dodaje indeks ako fali – izvršava se kao migracija 10, ne pri startu;
+#    nova retention tabela = nova migracija koja ponovo poziva ensure_retention_indexes)
+#  - particionisanje po danu se ne koristi: MySQL traži particionu kolonu u svakom unique ključu, a
+#    upsert ključevi (fixtures.id, model_outputs (fixture_id, market), analysis_cache.cache_key) nisu
+#    vremenski – prošireni PK bi za isti ključ pravio duple redove
+#  - za svaku tabelu se loguje broj obrisanih redova i utrošeno vreme
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from mysql_database import get_mysql_connection
+from services.schema import register_migration, apply_migrations
+
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "2000"))
+RETENTION_PAUSE_SEC = float(os.getenv("RETENTION_PAUSE_SEC", "0.05"))
+# zaštita: jedna tabela ne sme da drži sweeper duže od ovoga (ostatak ide sledeći krug)
+RETENTION_MAX_SEC_PER_TABLE = float(os.getenv("RETENTION_MAX_SEC_PER_TABLE", "120"))
+# primarni podaci (fixtures, team/h2h mečevi, *_store) se brišu SAMO uz eksplicitni opt-in
+RETENTION_PURGE_PRIMARY = os.getenv("RETENTION_PURGE_PRIMARY", "0") == "1"
+
+DEFAULT_RETENTION_HOURS = 72
+DEFAULT_FRESH_HOURS = 48
+
+# ---------- Politike po tabeli (jedan registar za purge, DataRepo TTL i freshness provere) ----------
+# kind:
+#   "ttl"    – red je svež fresh_hours, briše se posle keep_hours
+#   "final"  – red upisan posle završetka meča (kolona `final`, zapisana pri upisu) se više ne menja:
+#              svež je zauvek i čuva se final_keep_hours; final=0 (i bez match_facts) se ponaša kao "ttl"
+#   "season" – red za završenu sezonu je svež zauvek i čuva se past_keep_hours; tekuća sezona kao "ttl"
+# col = vremenska kolona za purge; keep_hours=0 → "col < NOW()" (npr. expires_at).
+# primary=True → izvorni podaci (ne keš): TTL važi za freshness, ali purge samo uz RETENTION_PURGE_PRIMARY=1.
+# Override bez deploy-a: RETENTION_POLICIES_JSON='{"venues_cache": {"fresh_hours": 720}}'
+RETENTION_POLICIES: Dict[str, dict] = {
+    "fixtures":               {"kind": "ttl", "col": "date", "primary": True},
+    "match_statistics":       {"kind": "final", "fresh_hours": 6, "final_keep_hours": 400 * 24},
+    "team_history_cache":     {"kind": "ttl"},
+    "team_history_store":     {"kind": "ttl", "keep_hours": 30 * 24, "primary": True},
+    "h2h_cache":              {"kind": "ttl"},
+    "team_matches":           {"kind": "ttl", "primary": True},
+    "h2h_matches":            {"kind": "ttl", "primary": True},
+    "league_baselines_store": {"kind": "ttl", "primary": True},
+    "team_strengths_store":   {"kind": "ttl", "primary": True},
+    "team_profiles_store":    {"kind": "ttl", "primary": True},
+    "team_micro_form_store":  {"kind": "ttl", "primary": True},
+    "fixture_extras_store":   {"kind": "ttl", "primary": True},
+    "team_artifacts_store":   {"kind": "ttl", "primary": True},
+    "venues_cache":           {"kind": "ttl", "fresh_hours": 90 * 24, "keep_hours": 180 * 24},
+    "lineups_cache":          {"kind": "ttl"},
+    "injuries_cache":         {"kind": "ttl"},
+    "referee_cache":          {"kind": "season", "past_keep_hours": 400 * 24},
+    "odds_cache":             {"kind": "ttl"},
+    "team_stats_cache":       {"kind": "season", "fresh_hours": 24, "past_keep_hours": 400 * 24},
+    "league_season_cache":    {"kind": "season", "fresh_hours": 14 * 24, "keep_hours": 30 * 24,
+                               "past_keep_hours": 400 * 24},
+    "model_outputs":          {"kind": "ttl"},
+    "analysis_cache":         {"kind": "ttl", "col": "created_at"},
+    # idempotentnost baseline fold-a: meč stariji od keep_hours se više ne fold-uje (vidi
+    # update_league_baselines_incremental), pa brisanje starih seen redova ne dovodi do duplog brojanja
+    "league_baseline_seen":   {"kind": "ttl", "col": "created_at", "keep_hours": 400 * 24},
+}
+
+def _load_policy_overrides() -> None:
+    raw = os.getenv("RETENTION_POLICIES_JSON")
+    if not raw:
+        return
+    try:
+        for table, over in (json.loads(raw) or {}).items():
+            if isinstance(over, dict):
+                RETENTION_POLICIES.setdefault(table, {"kind": "ttl"}).update(over)
+    except Exception as e:
+        print(f"[retention] RETENTION_POLICIES_JSON ignored: {e}")
+
+_load_policy_overrides()
+
+
+def policy_for(table: str) -> dict:
+    """Politika tabele sa popunjenim podrazumevanim vrednostima."""
+    p = dict(RETENTION_POLICIES.get(table) or {"kind": "ttl"})
+    p.setdefault("col", "updated_at")
+    p.setdefault("fresh_hours", DEFAULT_FRESH_HOURS)
+    p.setdefault("keep_hours", max(DEFAULT_RETENTION_HOURS, int(p["fresh_hours"])))
+    return p
+
+
+def policy_fresh_hours(table: str) -> int:
+    return int(policy_for(table)["fresh_hours"])
+
+
+def oldest_open_season(today: Optional[date] = None) -> int:
+    """Najstarija sezona koja još može da se menja. Evropske sezone (2025 = 2025/26) se završavaju
+    do leta, kalendarske (2025 = 2025) do decembra – sezona y je sigurno gotova od avgusta y+1."""
+    today = today or date.today()
+    return today.year - 1 if today.month < 8 else today.year
+
+
+def is_fresh(table: str, updated_at, final: Optional[bool] = None, season: Optional[int] = None) -> bool:
+    """Da li je keširani red još važeći po politici tabele (updated_at je naivni UTC – DB sesija je
+    u time_zone '+00:00', vidi mysql_database._build_dbconfig)."""
+    p = policy_for(table)
+    if p["kind"] == "final" and final:
+        return True
+    if p["kind"] == "season" and season is not None:
+        try:
+            if int(season) < oldest_open_season():
+                return True
+        except (TypeError, ValueError):
+            pass
+    if updated_at is None:
+        return False
+    if not isinstance(updated_at, datetime):
+        try:
+            updated_at = datetime.fromisoformat(str(updated_at))
+        except Exception:
+            return False
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return (datetime.utcnow() - updated_at) <= timedelta(hours=int(p["fresh_hours"]))
+
+
+
+def retention_jobs(include_primary: Optional[bool] = None) -> List[tuple]:
+    """Registar → lista purge poslova (tabela, kolona, sati[, dodatni WHERE]).
+    Primarne tabele su uključene samo uz include_primary / RETENTION_PURGE_PRIMARY=1."""
+    if include_primary is None:
+        include_primary = RETENTION_PURGE_PRIMARY
+    jobs: List[tuple] = []
+    for table in RETENTION_POLICIES:
+        p = policy_for(table)
+        if p.get("primary") and not include_primary:
+            continue
+        col, keep = p["col"], int(p["keep_hours"])
+        if p["kind"] == "final":
+            jobs.append((table, col, keep, "final = 0"))
+            jobs.append((table, col, int(p.get("final_keep_hours", keep))))
+        elif p["kind"] == "season":
+            jobs.append((table, col, keep, f"season >= {oldest_open_season()}"))
+            jobs.append((table, col, int(p.get("past_keep_hours", keep))))
+        else:
+            jobs.append((table, col, keep))
+    # analysis_cache ima i eksplicitni expires_at
+    jobs.append(("analysis_cache", "expires_at", 0))
+    return jobs
+
+def _index_exists(cur, table: str, column: str) -> Optional[bool]:
+    """True/False = da li postoji indeks kome je `column` prva kolona; None = tabela ne postoji."""
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    if (cur.fetchone() or [0])[0] == 0:
+        return None
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s AND SEQ_IN_INDEX = 1
+    """, (table, column))
+    return (cur.fetchone() or [0])[0] > 0
+
+
+def ensure_retention_indexes(tables: Optional[List[tuple]] = None) -> List[str]:
+    """Dodaj indeks na vremensku kolonu svake retention tabele ako fali (idempotentno)."""
+    added = []
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        for table, col, *_rest in tables or retention_jobs():
+            exists = _index_exists(cur, table, col)
+            if exists is None or exists:
+                continue
+            idx = f"idx_{table}_{col}"[:64]
+            cur.execute(f"ALTER TABLE `{table}` ADD INDEX `{idx}` (`{col}`)")
+            added.append(idx)
+        conn.commit()
+    finally:
+        conn.close()
+    if added:
+        print(f"[retention] added indexes: {added}")
+    return added
+
+
+register_migration(10, "retention_indexes", ensure_retention_indexes)
+
+
+def purge_table_chunked(table: str, col: str, hours: int, where: Optional[str] = None,
+                        batch: int = RETENTION_BATCH, pause: float = RETENTION_PAUSE_SEC) -> Tuple[int, float]:
+    """
+    Obriši redove starije od `hours` (0 → col < NOW()) u batch-evima od `batch` redova,
+    svaki batch je zasebna (kratka) transakcija. `where` sužava brisanje (npr. samo tekuća sezona).
+    Vraća (obrisano redova, sekunde).
+    """
+    t0 = time.perf_counter()
+    removed = 0
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        # cutoff se fiksira jednom (DB vreme), da se granica ne pomera između batch-eva
+        if hours > 0:
+            cur.execute("SELECT NOW() - INTERVAL %s HOUR", (int(hours),))
+        else:
+            cur.execute("SELECT NOW()")
+        cutoff = cur.fetchone()[0]
+        while True:
+            extra = f" AND ({where})" if where else ""
+            cur.execute(f"DELETE FROM `{table}` WHERE `{col}` < %s{extra} ORDER BY `{col}` LIMIT %s",
+                        (cutoff, int(batch)))
+            n = cur.rowcount or 0
+            conn.commit()
+            removed += n
+            if n < batch or time.perf_counter() - t0 > RETENTION_MAX_SEC_PER_TABLE:
+                break
+            time.sleep(pause)
+    finally:
+        conn.close()
+    return removed, time.perf_counter() - t0
+
+
+def run_retention(tables: Optional[List[tuple]] = None) -> Dict[str, dict]:
+    """Prođi kroz sve retention tabele; greška na jednoj tabeli ne zaustavlja ostale.
+    Sweeper radi u svakom workeru – GET_LOCK obezbeđuje da u jednom trenutku radi samo jedan."""
+    report = {}
+    t_all = time.perf_counter()
+    lock_conn = get_mysql_connection()
+    try:
+        lcur = lock_conn.cursor()
+        lcur.execute("SELECT GET_LOCK('statsfk_retention', 0)")
+        if (lcur.fetchone() or [0])[0] != 1:
+            print("[retention] already running in another worker, skip")
+            return report
+        try:
+            report = _run_retention_locked(tables)
+        finally:
+            lcur.execute("SELECT RELEASE_LOCK('statsfk_retention')")
+            lcur.fetchone()
+    finally:
+        lock_conn.close()
+    total = sum(r.get("rows", 0) for r in report.values())
+    print(f"[retention] done: {total} rows in {time.perf_counter() - t_all:.2f}s")
+    return report
+
+
+def _run_retention_locked(tables) -> Dict[str, dict]:
+    report = {}
+    for job in tables or retention_jobs():
+        table, col, hours = job[:3]
+        where = job[3] if len(job) > 3 else None
+        key = f"{table}.{col}" + (f">{hours}h" if where else "")
+        try:
+            removed, secs = purge_table_chunked(table, col, hours, where)
+            report[key] = {"rows": removed, "sec": round(secs, 3)}
+            if removed:
+                print(f"[retention] {key}: -{removed} rows in {secs:.2f}s")
+        except Exception as e:
+            report[key] = {"error": str(e)[:200]}
+            print(f"[retention] {key} failed: {e}")
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Retention engine (batch DELETE)")
+    ap.add_argument("--run", action="store_true", help="pokreni jedan krug retention-a (podrazumevano)")
+    ap.parse_args()
+    apply_migrations()
+    run_retention()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# services/schema.py
+# Registar migracija šeme: svaka migracija ima svoj broj i ime, primenjene se beleže u schema_version.
+#  - apply_migrations() radi jednom po procesu (startup / prepare_worker), pod GET_LOCK-om – ako dva workera
+#    krenu istovremeno, drugi sačeka prvog i zatim samo pročita već upisane verzije
+#  - ostala mesta u kodu NE rade DDL – veruju upisanoj verziji
+#  - izmena šeme = NOVA migracija sa većim brojem (postojeće se ne menjaju, jer se ne izvršavaju ponovo)
+# Migracije su idempotentne (CREATE TABLE IF NOT EXISTS / guarded ALTER), pa je prvo pokretanje na
+# postojećoj bazi bezbedno.
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from mysql_database import (
+    get_mysql_connection, create_all_tables, ensure_match_facts_display_columns,
+    ensure_match_statistics_final_column,
+)
+
+SCHEMA_LOCK_NAME = "statsfk_schema"
+SCHEMA_LOCK_TIMEOUT_SEC = 300
+
+# version -> (ime, funkcija)
+SCHEMA_MIGRATIONS: Dict[int, Tuple[str, Callable[[], None]]] = {}
+
+_APPLIED_LOCK = threading.Lock()
+_KNOWN_APPLIED: set = set()   # verzije za koje ovaj proces već zna da su primenjene
+
+
+def register_migration(version: int, name: str, fn: Callable[[], None]) -> None:
+    prev = SCHEMA_MIGRATIONS.get(version)
+    if prev is not None and prev[0] != name:
+        raise ValueError(f"schema migration {version} already registered as {prev[0]!r}")
+    SCHEMA_MIGRATIONS[version] = (name, fn)
+
+
+def _ensure_version_table(cur) -> None:
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            name VARCHAR(128) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def applied_versions() -> List[int]:
+    conn = get_mysql_connection()
+    try:
+        cur = conn.cursor()
+        _ensure_version_table(cur)
+        cur.execute("SELECT version FROM schema_version ORDER BY version")
+        return [int(r[0]) for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def apply_migrations() -> List[int]:
+    """Primeni sve registrovane migracije koje nisu u schema_version (redom). Vraća nove verzije."""
+    with _APPLIED_LOCK:
+        if _KNOWN_APPLIED and all(v in _KNOWN_APPLIED for v in SCHEMA_MIGRATIONS):
+            return []
+        conn = get_mysql_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT GET_LOCK(%s, %s)", (SCHEMA_LOCK_NAME, SCHEMA_LOCK_TIMEOUT_SEC))
+            if (cur.fetchone() or [0])[0] != 1:
+                raise RuntimeError("schema lock timeout (druga instanca primenjuje migracije?)")
+            try:
+                _ensure_version_table(cur)
+                conn.commit()
+                cur.execute("SELECT version FROM schema_version")
+                done = {int(r[0]) for r in cur.fetchall()}
+                new = []
+                for version in sorted(SCHEMA_MIGRATIONS):
+                    if version in done:
+                        continue
+                    name, fn = SCHEMA_MIGRATIONS[version]
+                    t0 = time.perf_counter()
+                    fn()
+                    cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+                    conn.commit()
+                    done.add(version)
+                    new.append(version)
+                    print(f"[schema] migration {version} ({name}) applied in {time.perf_counter() - t0:.2f}s")
+                _KNOWN_APPLIED.update(done)
+            finally:
+                cur.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_LOCK_NAME,))
+                cur.fetchone()
+        finally:
+            conn.close()
+        print(f"[schema] version={max(_KNOWN_APPLIED) if _KNOWN_APPLIED else 0} ({len(new)} new)")
+        return new
+
+
+# ---------- bazne migracije (ostale registruju moduli koji poseduju tabele) ----------
+register_migration(1, "base_tables", create_all_tables)
+register_migration(8, "match_facts_display_columns", ensure_match_facts_display_columns)
+register_migration(9, "match_statistics_final", ensure_match_statistics_final_column)
@@ -0,0 +1,240 @@
+# services/write_behind.py
+# Write-behind upisi umesto globalnog DB_WRITE_LOCK-a:
+#  - svaka grupa tabela ima SVOJ writer thread koji prazni red i commit-uje u batch-evima (executemany)
+#  - upsert za isti (statement, ključ) koji još čeka u redu se spaja – poslednji pobeđuje
+#  - svaka tabela pripada tačno jednoj grupi (register_write); tabele sa više pisaca (match_facts,
+#    match_statistics, h2h_cache) su registrovane OVDE i svi pisci (appli, DataRepo, db_backend, backfill)
+#    idu kroz enqueue_* – nema sinhronog upisa koji bi stariji payload iz reda kasnije pregazio
+#  - flush_writes() je barijera: vraća se kad je sve što je ubačeno PRE poziva obrađeno
+#    (pozivaoci kojima treba trajnost pre nastavka – npr. pre čitanja iz baze u istom job-u);
+#    False ako je neki od tih upisa odbačen posle iscrpljenih pokušaja (ili timeout)
+#  - flush_if_pending() je barijera za jedan ključ: čitalac koji čita red nazad iz baze čeka samo ako
+#    je baš taj ključ još u redu ili u batch-u koji se upisuje (read-your-writes bez globalnog čekanja)
+# Upisi su idempotentni upsert-i, pa je ponovni pokušaj posle greške bezbedan.
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Hashable, Optional, Tuple
+
+from mysql_database import (
+    get_mysql_connection, match_fact_row, MATCH_FACTS_UPSERT_SQL, MATCH_STATISTICS_UPSERT_SQL,
+)
+
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+# koliko writer čeka da se skupi batch (i spoje ponovljeni ključevi) pre upisa
+WRITE_BEHIND_LINGER_SEC = float(os.getenv("WRITE_BEHIND_LINGER_SEC", "0.2"))
+# backpressure: put() čeka kad u grupi ima ovoliko neupisanih redova
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "20000"))
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "2"))
+
+# statement -> (grupa, SQL)
+WRITE_STATEMENTS: Dict[str, Tuple[str, str]] = {}
+
+
+def register_write(stmt: str, group: str, sql: str) -> None:
+    prev = WRITE_STATEMENTS.get(stmt)
+    if prev is not None and prev[0] != group:
+        raise ValueError(f"write statement {stmt!r} already belongs to group {prev[0]!r}")
+    WRITE_STATEMENTS[stmt] = (group, sql)
+
+
+class _GroupWriter:
+    def __init__(self, group: str):
+        self.group = group
+        self._cv = threading.Condition()
+        self._pending: "OrderedDict[tuple, tuple]" = OrderedDict()   # (stmt, key) -> params
+        self._inflight: "OrderedDict[tuple, tuple]" = OrderedDict()  # batch koji se upravo upisuje
+        self._enqueued = 0      # redni broj poslednjeg put()
+        self._committed = 0     # do ovog broja je sve obrađeno (upisano ili odbačeno posle iscrpljenih pokušaja)
+        self._dropped = deque(maxlen=256)   # (od, do] opsezi rednih brojeva odbačenih batch-eva
+        self._flush_wanted = False
+        self.stats = {"enqueued": 0, "coalesced": 0, "rows": 0, "batches": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name=f"write-behind-{group}", daemon=True)
+        self._thread.start()
+
+    def put(self, stmt: str, key: Hashable, params: tuple) -> None:
+        with self._cv:
+            while len(self._pending) >= WRITE_BEHIND_MAX_PENDING:
+                self._flush_wanted = True
+                self._cv.notify_all()
+                self._cv.wait(0.5)
+            k = (stmt, key)
+            was_empty = not self._pending
+            if k in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[k] = params
+            self._enqueued += 1
+            self.stats["enqueued"] += 1
+            # prvi red budi writer (koji onda čeka linger), pun batch ga budi odmah
+            if was_empty or len(self._pending) >= WRITE_BEHIND_BATCH:
+                self._cv.notify_all()
+
+    def has_pending(self, stmt: str, key: Hashable) -> bool:
+        with self._cv:
+            return (stmt, key) in self._pending or (stmt, key) in self._inflight
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            target = self._enqueued
+            start = self._committed
+            if start >= target:
+                return True
+            self._flush_wanted = True
+            self._cv.notify_all()
+            while self._committed < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cv.wait(remaining)
+            # neki batch sa upisima iz (start, target] je odbačen → barijera nije ispunjena
+            return not any(lo < target and hi > start for lo, hi in self._dropped)
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while not self._pending:
+                    self._cv.wait()
+                if not self._flush_wanted and len(self._pending) < WRITE_BEHIND_BATCH:
+                    self._cv.wait(WRITE_BEHIND_LINGER_SEC)
+                batch, self._pending = self._pending, OrderedDict()
+                self._inflight = batch
+                seq = self._enqueued
+                self._flush_wanted = False
+            try:
+                ok = self._write(batch)
+            except Exception as e:
+                ok = False
+                print(f"[write-behind:{self.group}] unexpected error: {e}")
+            with self._cv:
+                if not ok:
+                    self._dropped.append((self._committed, seq))
+                self._inflight = OrderedDict()
+                self._committed = seq
+                self._cv.notify_all()
+
+    def _write(self, batch: "OrderedDict[tuple, tuple]") -> bool:
+        by_stmt: "OrderedDict[str, list]" = OrderedDict()
+        for (stmt, _key), params in batch.items():
+            by_stmt.setdefault(stmt, []).append(params)
+        for attempt in range(WRITE_BEHIND_RETRIES + 1):
+            conn = None
+            try:
+                conn = get_mysql_connection()
+                cur = conn.cursor()
+                batches = 0
+                for stmt, rows in by_stmt.items():
+                    sql = WRITE_STATEMENTS[stmt][1]
+                    for i in range(0, len(rows), WRITE_BEHIND_BATCH):
+                        cur.executemany(sql, rows[i:i + WRITE_BEHIND_BATCH])
+                        conn.commit()
+                        batches += 1
+                self.stats["rows"] += len(batch)
+                self.stats["batches"] += batches
+                return True
+            except Exception as e:
+                try:
+                    if conn is not None:
+                        conn.rollback()
+                except Exception:
+                    pass
+                if attempt >= WRITE_BEHIND_RETRIES:
+                    self.stats["errors"] += 1
+                    print(f"[write-behind:{self.group}] {len(batch)} rows dropped after {attempt + 1} attempts: {e}")
+                    return False
+                time.sleep(0.5 * (attempt + 1))
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+_WRITERS: Dict[str, _GroupWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def _writer(group: str) -> _GroupWriter:
+    w = _WRITERS.get(group)
+    if w is None:
+        with _WRITERS_LOCK:
+            w = _WRITERS.get(group)
+            if w is None:
+                w = _WRITERS[group] = _GroupWriter(group)
+    return w
+
+
+def enqueue_write(stmt: str, key: Hashable, params: tuple) -> None:
+    """Ubaci upsert u red grupe kojoj statement pripada (ne čeka upis)."""
+    group = WRITE_STATEMENTS[stmt][0]
+    _writer(group).put(stmt, key, params)
+
+
+def flush_writes(group: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+    """Barijera: čekaj da sve ubačeno pre poziva bude commit-ovano (jedna grupa ili sve).
+    False = timeout ili je deo tih upisa odbačen (pozivalac ne sme da računa da su u bazi)."""
+    writers = [_WRITERS[group]] if group in _WRITERS else ([] if group else list(_WRITERS.values()))
+    ok = True
+    for w in writers:
+        if not w.flush(timeout):
+            print(f"[write-behind:{w.group}] flush incomplete (timeout or dropped batch)")
+            ok = False
+    return ok
+
+
+def flush_if_pending(stmt: str, key: Hashable, timeout: Optional[float] = None) -> bool:
+    """Pre čitanja reda nazad iz baze: flush grupe samo ako (stmt, key) još nije commit-ovan."""
+    w = _WRITERS.get(WRITE_STATEMENTS[stmt][0])
+    if w is None or not w.has_pending(stmt, key):
+        return True
+    return w.flush(timeout)
+
+
+def write_behind_stats() -> Dict[str, dict]:
+    return {g: dict(w.stats, pending=len(w._pending)) for g, w in list(_WRITERS.items())}
+
+
+# ---------- zajedničke tabele: jedina putanja upisa za sve module ----------
+register_write("h2h_cache", "history", """
+    INSERT INTO h2h_cache(team1_id,team2_id,last_n,data,updated_at)
+    VALUES(%s,%s,%s,%s,NOW())
+    ON DUPLICATE KEY UPDATE data=VALUES(data), updated_at=NOW()
+""")
+register_write("match_facts", "history", MATCH_FACTS_UPSERT_SQL)
+register_write("match_statistics", "stats", MATCH_STATISTICS_UPSERT_SQL)
+
+
+def enqueue_match_facts(matches) -> int:
+    """match_facts redovi za API mečeve (rekonstruisani iz match_facts se preskaču – već su tamo)."""
+    n = 0
+    for m in matches or []:
+        if not isinstance(m, dict) or m.get("_source") == "match_facts":
+            continue
+        r = match_fact_row(m)
+        if r:
+            enqueue_write("match_facts", r[0], r)
+            n += 1
+    return n
+
+
+def enqueue_match_statistics(fixture_id: int, data_json: Optional[str]) -> None:
+    fid = int(fixture_id)
+    enqueue_write("match_statistics", fid, (fid, data_json, fid))
+
+
+def await_match_statistics(fixture_id: int) -> None:
+    """Čitaoci match_statistics: statistika ovog meča koja još čeka u redu mora prvo u bazu."""
+    flush_if_pending("match_statistics", int(fixture_id))
+
+
+def enqueue_h2h_cache(a: int, b: int, last_n: int, data_json: str) -> None:
+    enqueue_write("h2h_cache", (int(a), int(b), int(last_n)), (int(a), int(b), int(last_n), data_json))
+
+
+# proces se gasi → ne gubi ono što čeka u redu
+atexit.register(flush_writes, None, 30.0)
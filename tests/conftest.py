@@ -0,0 +1,11 @@
+# tests/conftest.py
+# Testovi se pokreću iz korena repoa (python -m pytest -q); appli traži API ključ već pri importu,
+# a testovi ne šalju API pozive.
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault("APIFOOTBALL_KEY", "test")
@@ -0,0 +1,87 @@
+# tests/test_analyze_http_cache.py
+# /api/analyze bajt keš: If-None-Match poređenje (weak, lista, "*") i Accept-Encoding pregovaranje,
+# plus _analyze_bytes_response (304 / gzip / raspakovano) – bez baze i bez mreže.
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+from starlette.requests import Request  # noqa: E402
+
+import appli  # noqa: E402
+
+ETAG = 'W/"abc123"'
+
+
+def _request(**headers):
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/api/analyze", "headers": raw})
+
+
+@pytest.mark.parametrize("inm, expected", [
+    (None, False),
+    ("", False),
+    ('W/"abc123"', True),
+    ('"abc123"', True),                     # weak poređenje: W/ prefiks se ignoriše
+    ('"other", W/"abc123"', True),
+    ('"other" ,  "abc123" ', True),
+    ("*", True),
+    ('"abc1234"', False),
+    ('W/"other"', False),
+])
+def test_etag_matches(inm, expected):
+    assert appli._etag_matches(inm, ETAG) is expected
+
+
+def test_etag_matches_strong_etag():
+    assert appli._etag_matches('W/"s1"', '"s1"') is True
+    assert appli._etag_matches('"s2"', '"s1"') is False
+
+
+@pytest.mark.parametrize("ae, expected", [
+    (None, False),
+    ("", False),
+    ("gzip", True),
+    ("GZIP", True),
+    ("deflate, gzip;q=0.5", True),
+    ("br, *", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.000", False),
+    ("deflate, br", False),
+    ("*;q=0", False),
+    ("*;q=0, gzip", True),                  # eksplicitni gzip pobeđuje "*"
+    ("gzip;q=0, *", False),
+    ("identity", False),
+])
+def test_accepts_gzip(ae, expected):
+    req = _request(accept_encoding=ae) if ae is not None else _request()
+    assert appli._accepts_gzip(req) is expected
+
+
+def _body():
+    return json.dumps({"fixtures": [1, 2, 3]}).encode()
+
+
+def test_bytes_response_not_modified():
+    resp = appli._analyze_bytes_response(_request(if_none_match=ETAG, accept_encoding="gzip"),
+                                         ETAG, gzip.compress(_body()))
+    assert resp.status_code == 304
+    assert resp.body == b""
+    assert resp.headers["etag"] == ETAG
+
+
+def test_bytes_response_gzip_and_plain():
+    gz = gzip.compress(_body())
+    resp = appli._analyze_bytes_response(_request(accept_encoding="gzip"), ETAG, gz)
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(resp.body) == _body()
+
+    plain = appli._analyze_bytes_response(_request(), ETAG, gz)
+    assert "content-encoding" not in plain.headers
+    assert plain.body == _body()
+    assert plain.headers["etag"] == ETAG
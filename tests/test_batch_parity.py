@@ -0,0 +1,172 @@
+# tests/test_batch_parity.py
+# Parity: models/batch_scoring (NumPy) mora da da isto što i skalarni calculate_final_probability*
+# na istim ulazima. Izvori ulaza koji idu u bazu/API (istorija, minute-bucket, forma, trener,
+# feature vektor, predikcija gola) su zamenjeni fiksnim vrednostima – oba puta ih čitaju kroz
+# iste funkcije, pa se poredi samo završna formula (fuzija, logit korekcije, rho, cup, kalibracija).
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+import appli  # noqa: E402
+from models import batch_scoring  # noqa: E402
+
+HOME, AWAY = 1, 2
+
+# po fixture-u: (league name, type, base, team/h2h stopa, minute prior, adj, feats, p_goal/lambda)
+CASES = {
+    101: {
+        "league": ("Premier League", "League"),
+        "rates": {"h": (0.7, 8.0, 11.0), "a": (0.6, 7.0, 11.5), "h2h": (0.5, 3.0, 6.0)},
+        "p_minute": 0.74, "fts_cs": 0.4, "form": -0.3, "coach": 0.2,
+        "feats": {"pace_da_total": 58.0, "lineups_have": True, "lineups_fw_count": 3,
+                  "inj_count": 4, "pace_sot_total": 5.5, "tier_gap_home": 0.5,
+                  "cov_sot": 6.0, "cov_da": 5.0, "cov_pos": 7.0},
+        "p_goal": (0.48, 0.41), "lam": (1.35, 1.05),
+    },
+    102: {
+        # kup → _cup / CUP_MOTIVATION_MULT; H2H ispod praga, bez minute priora
+        "league": ("FA Cup", "Cup"),
+        "rates": {"h": (0.55, 5.0, 9.0), "a": (0.8, 9.5, 12.0), "h2h": (1.0, 1.0, 1.5)},
+        "p_minute": None, "fts_cs": -0.6, "form": 0.5, "coach": -0.1,
+        "feats": {"pace_da_total": 0.0, "lineups_have": False, "lineups_fw_count": None,
+                  "inj_count": None, "pace_sot_total": None, "tier_gap_home": -1.0,
+                  "cov_sot": 2.0, "cov_da": 1.0, "cov_pos": 0.0},
+        "p_goal": (0.37, 0.52), "lam": (0.9, 1.6),
+    },
+    103: {
+        "league": ("Serie B", "League"),
+        "rates": {"h": (0.3, 2.5, 10.0), "a": (0.35, 3.0, 9.0), "h2h": (0.2, 0.8, 4.0)},
+        "p_minute": 0.61, "fts_cs": 0.0, "form": 0.0, "coach": 0.0,
+        "feats": {"pace_da_total": 35.0, "lineups_have": True, "lineups_fw_count": 1,
+                  "inj_count": 12, "pace_sot_total": 2.0, "tier_gap_home": 0.0,
+                  "cov_sot": 10.0, "cov_da": 10.0, "cov_pos": 10.0},
+        "p_goal": (0.22, 0.19), "lam": (0.6, 0.55),
+    },
+}
+
+BASE = {"m1h": 0.71, "mu_da1h": 44.0, "mu_sot1h": 3.6, "sd_sot1h": 1.4, "m2p": 0.74, "mu_da_ft": 92.0}
+
+
+def _fixture(fid):
+    name, ltype = CASES[fid]["league"]
+    return {
+        "fixture": {"id": fid, "date": "2025-03-01T15:00:00+00:00"},
+        "league": {"id": fid, "name": name, "type": ltype, "country": "England"},
+        "teams": {"home": {"id": fid * 10 + HOME, "name": "H"}, "away": {"id": fid * 10 + AWAY, "name": "A"}},
+    }
+
+
+def _side(fixture, side):
+    return "h" if side == "home" else "a"
+
+
+@pytest.fixture
+def inputs(monkeypatch):
+    fixtures = [_fixture(fid) for fid in CASES]
+    by_team = {}
+    for fx in fixtures:
+        fid = fx["fixture"]["id"]
+        by_team[fx["teams"]["home"]["id"]] = (fid, "h")
+        by_team[fx["teams"]["away"]["id"]] = (fid, "a")
+
+    team_last = {tid: [{"_team": tid}] for tid in by_team}
+    h2h = {}
+    for fx in fixtures:
+        a, b = sorted([fx["teams"]["home"]["id"], fx["teams"]["away"]["id"]])
+        h2h[f"{a}-{b}"] = [{"_h2h": fx["fixture"]["id"]}]
+
+    def team_rate(matches, *args, **kwargs):
+        fid, side = by_team[matches[0]["_team"]]
+        return CASES[fid]["rates"][side]
+
+    def h2h_rate(matches, *args, **kwargs):
+        return CASES[matches[0]["_h2h"]]["rates"]["h2h"]
+
+    def case(fixture):
+        return CASES[fixture["fixture"]["id"]]
+
+    for name in ("_weighted_match_over05_rate", "_weighted_match_over15_rate",
+                 "team_1h_gg_stats", "team_ft_over15_stats"):
+        monkeypatch.setattr(appli, name, team_rate)
+    for name in ("_weighted_h2h_over05_rate", "_weighted_h2h_over15_rate",
+                 "h2h_1h_gg_stats", "h2h_ft_over15_stats"):
+        monkeypatch.setattr(appli, name, h2h_rate)
+    monkeypatch.setattr(appli, "_league_base_for_fixture", lambda fx, lb: dict(BASE))
+    monkeypatch.setattr(appli, "_league_base_ft_for_fixture", lambda fx, lb: dict(BASE))
+    monkeypatch.setattr(appli, "_prior_from_minute_buckets", lambda repo, fx, no_api=False: (case(fx)["p_minute"], 5.0))
+    monkeypatch.setattr(appli, "_minute_bucket_prior_ft", lambda repo, fx, no_api=False: (case(fx)["p_minute"], 5.0))
+    monkeypatch.setattr(appli, "_fts_cs_form_coach_adj", lambda repo, fx, no_api=False: case(fx)["fts_cs"])
+    monkeypatch.setattr(appli, "_calculate_form_adjustment", lambda fx, tl, no_api=False: case(fx)["form"])
+    monkeypatch.setattr(appli, "_calculate_coach_adjustment", lambda fx, no_api=False: case(fx)["coach"])
+    monkeypatch.setattr(appli, "get_matchup_features_1h", lambda fx, *a, **k: dict(case(fx)["feats"]))
+    monkeypatch.setattr(appli, "get_matchup_features_ft", lambda fx, *a, **k: dict(case(fx)["feats"]))
+    monkeypatch.setattr(appli, "predict_team_scores1h_enhanced",
+                        lambda fx, feats, lb, ts, side="home": (case(fx)["p_goal"][0 if side == "home" else 1], {}))
+    monkeypatch.setattr(appli, "predict_team_scores_ft_enhanced",
+                        lambda fx, feats, lb, ts, side="home": (case(fx)["lam"][0 if side == "home" else 1], {}))
+    # FT kalibracija i cup multiplier moraju stvarno da deluju na oba puta
+    monkeypatch.setattr(appli, "CALIBRATION_FT", {"TEMP": 1.3, "FLOOR": 0.05, "CEIL": 0.93})
+    monkeypatch.setattr(appli, "CUP_MOTIVATION_MULT", 0.88)
+
+    micro = {tid: {"home": {"used_sot": 4, "used_da": 3, "used_pos": 2},
+                   "away": {"used_sot": 3, "used_da": 5, "used_pos": 1}} for tid in by_team}
+    strengths = {tid: {"eff_n": 6.0 + (tid % 7)} for tid in by_team}
+    profiles = {tid: {"eff_n": 8.0 + (tid % 5), "tier": 2} for tid in by_team}
+    extras = {fx["fixture"]["id"]: {"_": 1} for fx in fixtures}
+    return fixtures, (team_last, h2h, micro, {}, strengths, profiles), extras
+
+
+SCALAR = {
+    "1h_over05": ("calculate_final_probability", "market_odds_over05_1h"),
+    "1h_over15": ("calculate_final_probability_over15", "market_odds_over15_1h"),
+    "gg1h": ("calculate_final_probability_gg", "market_odds_btts_1h"),
+    "ft_over15": ("calculate_final_probability_ft_over15", "market_odds_over15_ft"),
+}
+
+
+def test_every_batch_market_has_a_scalar_reference():
+    assert set(batch_scoring.MARKET_SCORERS) | {"ft_over15"} == set(SCALAR)
+
+
+@pytest.mark.parametrize("odds", [None, 1.6])
+@pytest.mark.parametrize("market", sorted(SCALAR))
+def test_batch_matches_scalar(inputs, market, odds):
+    fixtures, args, extras = inputs
+    batch = appli.score_fixtures_batch(market, fixtures, *args, extras_map=extras, no_api=True, odds=odds)
+    fn_name, odds_kw = SCALAR[market]
+    scalar_fn = getattr(appli, fn_name)
+    for fx in fixtures:
+        fid = fx["fixture"]["id"]
+        ref, _ = scalar_fn(fx, *args, extras=extras[fid], no_api=True, **{odds_kw: odds})
+        assert math.isfinite(batch[fid])
+        assert batch[fid] == pytest.approx(float(ref), abs=1e-9), (market, fid)
+
+
+def test_cup_multiplier_applied_in_1h(inputs):
+    fixtures, args, extras = inputs
+    with_cup = appli.score_fixtures_batch("1h_over05", fixtures, *args, extras_map=extras)
+    appli.CUP_MOTIVATION_MULT = 1.0   # monkeypatch vraća staru vrednost posle testa
+    without = appli.score_fixtures_batch("1h_over05", fixtures, *args, extras_map=extras)
+    assert with_cup[102] == pytest.approx(without[102] * 0.88)
+    assert with_cup[101] == pytest.approx(without[101])
+
+
+def test_ft_calibration_clips_to_floor_and_ceil():
+    c = {k: np.array([v]) for k, v in {
+        "m2p": 0.99, "h_home": 10.0, "w_home": 10.0, "h_away": 10.0, "w_away": 10.0,
+        "h_h2h": 0.0, "w_h2h": 0.0, "p_minute": np.nan, "fts_cs_adj": 0.0, "form_adj": 0.0,
+        "coach_adj": 0.0, "pace_da_total": 0.0, "lineups_have": 0.0, "lineups_fw_count": np.nan,
+        "inj_count": np.nan, "mu_da_ft": 0.0, "lam_home": 4.0, "lam_away": 4.0, "coverage": 8.0,
+    }.items()}
+    out = batch_scoring.score_ft_over15(c, {}, calibration={"TEMP": 1.0, "FLOOR": 0.05, "CEIL": 0.93})
+    assert out[0] == pytest.approx(0.93)
+
+
+def test_unknown_market_is_rejected(inputs):
+    fixtures, args, extras = inputs
+    with pytest.raises(ValueError):
+        appli.score_fixtures_batch("ft_over25", fixtures, *args, extras_map=extras)
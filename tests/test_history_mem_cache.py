@@ -0,0 +1,53 @@
+# tests/test_history_mem_cache.py
+# Procesni keš istorije tima (data_repo._TEAM_HISTORY_MEM): pozivalac dobija kopije, pa izmena
+# vraćenih mečeva (ili originalne liste posle put-a) ne sme da promeni ono što vide sledeći pozivi.
+import time
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from services import data_repo  # noqa: E402
+
+TEAM = 4242
+
+
+@pytest.fixture(autouse=True)
+def _clean_mem():
+    data_repo.invalidate_team_history_mem(TEAM)
+    yield
+    data_repo.invalidate_team_history_mem(TEAM)
+
+
+def _matches():
+    return [{"fixture": {"id": i}, "goals": {"home": 1, "away": 0}} for i in range(5)]
+
+
+def test_get_returns_deep_copy():
+    now = time.time()
+    data_repo._mem_history_put(TEAM, 5, data_repo.datetime.utcnow(), _matches(), now)
+
+    first = data_repo._mem_history_get(TEAM, 3, None, now)
+    assert [m["fixture"]["id"] for m in first] == [0, 1, 2]
+    first[0]["goals"]["home"] = 99
+    first.append({"fixture": {"id": -1}})
+
+    second = data_repo._mem_history_get(TEAM, 3, None, now)
+    assert second[0]["goals"]["home"] == 1
+    assert len(second) == 3
+
+
+def test_put_does_not_share_caller_dicts():
+    now = time.time()
+    src = _matches()
+    data_repo._mem_history_put(TEAM, 5, data_repo.datetime.utcnow(), src, now)
+    src[0]["goals"]["home"] = 7
+
+    hit = data_repo._mem_history_get(TEAM, 5, None, now)
+    assert hit[0]["goals"]["home"] == 1
+
+
+def test_shallower_cache_is_a_miss():
+    now = time.time()
+    data_repo._mem_history_put(TEAM, 5, data_repo.datetime.utcnow(), _matches(), now)
+    assert data_repo._mem_history_get(TEAM, 10, None, now) is None
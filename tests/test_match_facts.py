@@ -0,0 +1,95 @@
+# tests/test_match_facts.py
+# match_facts: API fixture → red (match_fact_row) → API oblik (match_fact_to_api) mora da sačuva
+# sve što history/h2h i prikaz čitaju; drugi krug (api → red) mora da da isti red.
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from mysql_database import match_fact_row, match_fact_to_api  # noqa: E402
+
+# redosled kolona u MATCH_FACTS_UPSERT_SQL (bez updated_at)
+COLS = ("fixture_id", "date", "league_id", "season", "team_home_id", "team_away_id", "home_name", "away_name",
+        "status", "ht_home", "ht_away", "ft_home", "ft_away", "league_name", "country", "home_logo", "away_logo")
+
+
+def _api_match(**over):
+    m = {
+        "fixture": {"id": 1035001, "date": "2024-03-10T15:00:00+01:00", "status": {"short": "FT"}},
+        "league": {"id": 39, "season": 2023, "name": "Premier League", "country": "England"},
+        "teams": {"home": {"id": 50, "name": "Manchester City", "logo": "https://x/50.png"},
+                  "away": {"id": 42, "name": "Arsenal", "logo": "https://x/42.png"}},
+        "goals": {"home": 2, "away": 1},
+        "score": {"halftime": {"home": 1, "away": 1}, "fulltime": {"home": 2, "away": 1}},
+    }
+    m.update(over)
+    return m
+
+
+def _as_db_row(row):
+    return dict(zip(COLS, row))
+
+
+def test_row_columns_and_utc_date():
+    row = _as_db_row(match_fact_row(_api_match()))
+    assert len(row) == len(COLS)
+    assert row["date"] == datetime(2024, 3, 10, 14, 0)   # naive UTC
+    assert (row["ht_home"], row["ht_away"], row["ft_home"], row["ft_away"]) == (1, 1, 2, 1)
+    assert (row["league_name"], row["country"], row["status"]) == ("Premier League", "England", "FT")
+
+
+def test_roundtrip_api_row_api():
+    row = match_fact_row(_api_match())
+    api = match_fact_to_api(_as_db_row(row))
+    assert api["_source"] == "match_facts"
+    assert api["fixture"]["id"] == 1035001
+    assert api["fixture"]["date"] == "2024-03-10T14:00:00+00:00"
+    assert api["fixture"]["timestamp"] == int(datetime(2024, 3, 10, 14, 0, tzinfo=timezone.utc).timestamp())
+    assert api["league"] == {"id": 39, "season": 2023, "name": "Premier League", "country": "England"}
+    assert api["teams"]["home"]["winner"] is True and api["teams"]["away"]["winner"] is False
+    assert api["goals"] == {"home": 2, "away": 1}
+    assert api["score"]["halftime"] == {"home": 1, "away": 1}
+    # drugi krug daje identičan red
+    assert match_fact_row(api) == row
+
+
+def test_roundtrip_unfinished_match_without_optional_fields():
+    m = _api_match(score={}, goals={"home": None, "away": None})
+    m["fixture"]["status"] = {"short": "NS"}
+    del m["teams"]["home"]["logo"], m["league"]["country"]
+    row = match_fact_row(m)
+    d = _as_db_row(row)
+    assert d["ft_home"] is None and d["ht_home"] is None
+    assert d["home_logo"] == "" and d["country"] == ""
+    api = match_fact_to_api(d)
+    assert api["teams"]["home"]["logo"] is None and api["league"]["country"] is None
+    assert api["teams"]["home"]["winner"] is None and api["teams"]["away"]["winner"] is None
+    assert match_fact_row(api) == row
+
+
+def test_draw_has_no_winner_and_goals_fallback():
+    # bez score.fulltime → ft iz goals
+    row = _as_db_row(match_fact_row(_api_match(score={}, goals={"home": 1, "away": 1})))
+    assert (row["ft_home"], row["ft_away"]) == (1, 1)
+    api = match_fact_to_api(row)
+    assert api["teams"]["home"]["winner"] is None and api["teams"]["away"]["winner"] is None
+
+
+@pytest.mark.parametrize("bad", [
+    None,
+    "x",
+    {"fixture": {"id": 1}, "teams": {"home": {"id": 2}}},
+    {"fixture": {"id": "abc"}, "teams": {"home": {"id": 2}, "away": {"id": 3}}},
+])
+def test_incomplete_match_has_no_row(bad):
+    assert match_fact_row(bad) is None
+
+
+def test_bad_date_is_kept_as_null():
+    m = _api_match()
+    m["fixture"]["date"] = "not a date"
+    d = _as_db_row(match_fact_row(m))
+    assert d["date"] is None
+    api = match_fact_to_api(d)
+    assert api["fixture"]["date"] is None and api["fixture"]["timestamp"] is None
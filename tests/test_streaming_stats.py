@@ -0,0 +1,99 @@
+# tests/test_streaming_stats.py
+# models/streaming_stats: spajanje Welford momenata (Chan et al.) mora da da isto što i jedan prolaz
+# kroz sve vrednosti, a QuantileSketch kvantili moraju da ostanu u relativnoj grešci ~alpha.
+import random
+
+import numpy as np
+import pytest
+
+from models.streaming_stats import BaselineAccumulator, QuantileSketch, RunningMoments
+
+
+def _moments(xs):
+    rm = RunningMoments()
+    for x in xs:
+        rm.add(x)
+    return rm
+
+
+def test_running_moments_match_numpy():
+    rng = random.Random(7)
+    xs = [rng.gauss(5.0, 2.0) for _ in range(500)]
+    rm = _moments(xs)
+    assert rm.n == 500
+    assert rm.mu() == pytest.approx(np.mean(xs), rel=1e-12)
+    assert rm.sd() == pytest.approx(np.std(xs, ddof=1), rel=1e-10)
+
+
+@pytest.mark.parametrize("split", [0, 1, 137, 499, 500])
+def test_running_moments_merge_equals_single_pass(split):
+    rng = random.Random(11)
+    xs = [rng.uniform(0.0, 30.0) for _ in range(500)]
+    left, right = _moments(xs[:split]), _moments(xs[split:])
+    left.merge(right)
+    whole = _moments(xs)
+    assert left.n == whole.n
+    assert left.mean == pytest.approx(whole.mean, rel=1e-12)
+    assert left.m2 == pytest.approx(whole.m2, rel=1e-9)
+
+
+def test_running_moments_empty_and_single():
+    rm = RunningMoments()
+    assert rm.mu() is None and rm.sd() is None
+    rm.add(3.0)
+    assert rm.mu() == 3.0 and rm.sd() is None
+
+
+def test_running_moments_dict_roundtrip():
+    rm = _moments([1.0, 2.0, 4.0])
+    back = RunningMoments.from_dict(rm.to_dict())
+    assert (back.n, back.mean, back.m2) == (rm.n, rm.mean, rm.m2)
+
+
+@pytest.mark.parametrize("q", [0.05, 0.5, 0.9, 0.95, 0.99])
+def test_quantile_sketch_relative_error(q):
+    rng = random.Random(3)
+    xs = [rng.lognormvariate(1.5, 0.6) for _ in range(5000)]
+    sk = QuantileSketch(alpha=0.01)
+    for x in xs:
+        sk.add(x)
+    exact = float(np.quantile(xs, q, method="lower"))
+    # rang-greška pored bucket-greške: poređenje sa susednim tačnim kvantilima
+    lo = float(np.quantile(xs, max(0.0, q - 0.002), method="lower"))
+    hi = float(np.quantile(xs, min(1.0, q + 0.002), method="higher"))
+    got = sk.quantile(q)
+    assert lo * (1 - 0.011) <= got <= hi * (1 + 0.011), (exact, got)
+
+
+def test_quantile_sketch_merge_equals_single_sketch():
+    rng = random.Random(5)
+    xs = [rng.uniform(0.0, 20.0) for _ in range(2000)] + [0.0] * 50
+    a, b, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, x in enumerate(xs):
+        (a if i % 2 else b).add(x)
+        whole.add(x)
+    a.merge(b)
+    assert a.count == whole.count and a.zero == whole.zero
+    for q in (0.0, 0.01, 0.5, 0.95, 1.0):
+        assert a.quantile(q) == whole.quantile(q)
+
+
+def test_quantile_sketch_edges():
+    sk = QuantileSketch()
+    assert sk.quantile(0.5) is None
+    for _ in range(10):
+        sk.add(0.0)
+    assert sk.quantile(0.95) == 0.0
+    back = QuantileSketch.from_dict(sk.to_dict())
+    assert back.count == 10 and back.quantile(0.5) == 0.0
+
+
+def test_baseline_accumulator_merge_roundtrip():
+    a, b = BaselineAccumulator(), BaselineAccumulator()
+    a.add(4.0, 50.0, True)
+    a.add(None, 40.0, False)
+    b.add(6.0, None, True)
+    a.merge(BaselineAccumulator.from_dict(b.to_dict()))
+    assert (a.hits, a.tot) == (2.0, 3.0)
+    assert a.sot.n == 2 and a.sot.mu() == pytest.approx(5.0)
+    assert a.da.n == 2 and a.da.mu() == pytest.approx(45.0)
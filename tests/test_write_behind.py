@@ -0,0 +1,125 @@
+# tests/test_write_behind.py
+# services/write_behind bez MySQL-a: get_mysql_connection je zamenjen lažnom konekcijom koja beleži
+# executemany pozive. Svaki test ima svoju grupu (writer thread-ovi su procesni i ne gase se).
+import itertools
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from services import write_behind as wb  # noqa: E402
+
+_SEQ = itertools.count()
+
+
+class FakeConn:
+    def __init__(self, log, gate=None, fail=False):
+        self.log, self.gate, self.fail = log, gate, fail
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, rows):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("db down")
+        self.log.append((sql, list(rows)))
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def group(monkeypatch):
+    """Nova grupa sa jednim statement-om; vraća (ime statement-a, log upisa, podešavanje konekcije)."""
+    n = next(_SEQ)
+    grp, stmt = f"test-group-{n}", f"test_stmt_{n}"
+    wb.register_write(stmt, grp, f"UPSERT {n}")
+    log, conn = [], {"gate": None, "fail": False}
+    monkeypatch.setattr(wb, "get_mysql_connection", lambda: FakeConn(log, conn["gate"], conn["fail"]))
+    monkeypatch.setattr(wb, "WRITE_BEHIND_RETRIES", 0)
+    yield stmt, grp, log, conn
+    wb.WRITE_STATEMENTS.pop(stmt, None)
+
+
+def _rows(log):
+    return [r for _sql, rows in log for r in rows]
+
+
+def test_same_key_coalesces_last_wins(group, monkeypatch):
+    stmt, grp, log, _conn = group
+    monkeypatch.setattr(wb, "WRITE_BEHIND_LINGER_SEC", 10.0)   # writer čeka flush, ne istek linger-a
+    wb.enqueue_write(stmt, 1, (1, "a"))
+    wb.enqueue_write(stmt, 2, (2, "x"))
+    wb.enqueue_write(stmt, 1, (1, "b"))
+    wb.enqueue_write(stmt, 1, (1, "c"))
+    assert wb.flush_writes(grp, timeout=5) is True
+    assert _rows(log) == [(1, "c"), (2, "x")]
+    stats = wb.write_behind_stats()[grp]
+    assert stats["enqueued"] == 4 and stats["coalesced"] == 2 and stats["rows"] == 2
+    assert stats["pending"] == 0
+
+
+def test_rows_are_written_without_explicit_flush(group, monkeypatch):
+    stmt, _grp, log, _conn = group
+    monkeypatch.setattr(wb, "WRITE_BEHIND_LINGER_SEC", 0.01)
+    wb.enqueue_write(stmt, 7, (7,))
+    deadline = time.monotonic() + 5
+    while not log and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _rows(log) == [(7,)]
+
+
+def test_flush_is_a_barrier_for_inflight_batch(group):
+    stmt, grp, log, conn = group
+    conn["gate"] = threading.Event()
+    wb.enqueue_write(stmt, 1, (1,))
+    # writer je uzeo batch i blokiran je u upisu → ključ je i dalje "pending" (inflight)
+    assert wb.flush_writes(grp, timeout=0.3) is False
+    assert wb._WRITERS[grp].has_pending(stmt, 1)
+    assert log == []
+
+    done = {}
+    t = threading.Thread(target=lambda: done.setdefault("ok", wb.flush_writes(grp, timeout=5)))
+    t.start()
+    time.sleep(0.05)
+    assert "ok" not in done          # barijera čeka commit
+    conn["gate"].set()
+    t.join(5)
+    assert done["ok"] is True
+    assert _rows(log) == [(1,)]
+    assert not wb._WRITERS[grp].has_pending(stmt, 1)
+    assert wb.flush_if_pending(stmt, 1, timeout=0.1) is True
+
+
+def test_flush_reports_dropped_batch_only_once(group):
+    stmt, grp, log, conn = group
+    conn["fail"] = True
+    wb.enqueue_write(stmt, 1, (1,))
+    assert wb.flush_writes(grp, timeout=5) is False
+    assert wb.write_behind_stats()[grp]["errors"] == 1
+
+    # novi upisi posle odbačenog batch-a: barijera važi samo za ono ubačeno pre poziva
+    conn["fail"] = False
+    wb.enqueue_write(stmt, 2, (2,))
+    assert wb.flush_writes(grp, timeout=5) is True
+    assert _rows(log) == [(2,)]
+
+
+def test_flush_of_unknown_group_is_noop():
+    assert wb.flush_writes("no-such-group", timeout=0.1) is True
+
+
+def test_statement_cannot_change_group(group):
+    stmt, _grp, _log, _conn = group
+    with pytest.raises(ValueError):
+        wb.register_write(stmt, "other-group", "UPSERT")